@@ -1,3 +1,347 @@
-from django.contrib import admin
+# core/admin.py
+"""
+Admin for the core models, usable at millions of rows.
 
-# Register your models here.
+* Changelists never run a full ``COUNT(*)``: ``show_full_result_count`` is
+  off and EstimatedCountPaginator counts at most COUNT_LIMIT rows (or reads
+  the planner's estimate on PostgreSQL).
+* Searches go through core/search.py's index, never an ``icontains`` scan.
+* Product and supplier foreign keys use autocomplete widgets, so no form
+  renders a ``<select>`` of the whole catalogue.
+* Each list is ordered by, and drills down dates along, an index.
+* Stock only changes through core/services.py: stock quantities are
+  read-only, new movements and the order actions call the service, and the
+  ledger (movements, orders) cannot be edited or deleted here.
+"""
+from django import forms
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.http import HttpResponseRedirect
+from django.utils.functional import cached_property
+
+from . import search, services
+from .forms import StockMovementForm
+from .models import (
+    LowercaseKeyField,
+    Location,
+    Product,
+    SaleOrder,
+    SaleOrderLine,
+    StockLevel,
+    StockMovement,
+    Supplier,
+)
+
+# Rows counted before a changelist stops counting; past it, narrow the list
+# with the search box, filters or dates.
+COUNT_LIMIT = 10_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Paginator whose count costs at most COUNT_LIMIT rows. Unfiltered
+    lists on PostgreSQL use the table's row estimate instead, so every page
+    stays reachable there.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = _estimated_rows(queryset)
+            if estimate > COUNT_LIMIT:
+                return estimate
+        return queryset.order_by()[:COUNT_LIMIT].count()
+
+
+def _estimated_rows(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings shared by every core admin. ``search_model`` and
+    ``search_prefix`` point the search box at an indexed model, e.g.
+    StockMovement searches ``Product`` through ``product__``.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_model = None
+    search_prefix = ""
+
+    def get_search_results(self, request, queryset, search_term):
+        model = self.search_model or self.model
+        term = search_term.strip()
+        if not term or model not in search.INDEXED:
+            return super().get_search_results(request, queryset, search_term)
+        if self.search_model is not None and term.lstrip("#").isdigit():
+            # Rows searched through a related index can also be found by id.
+            return queryset.filter(pk=int(term.lstrip("#"))), False
+        queryset = search.filter_queryset(
+            queryset, term, model=model, prefix=self.search_prefix
+        )
+        return queryset, False
+
+
+class LowercaseKeyForm(forms.ModelForm):
+    """
+    Reports a case-insensitive clash with one lookup on the unique key
+    column instead of an IntegrityError on save. The views skip this check
+    (see forms.UniqueKeyFormMixin); admin edits are few enough to afford it.
+    """
+
+    key_field = None
+    message = None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        field = self.instance._meta.get_field(self.key_field)
+        value = cleaned_data.get(field.source)
+        if value is not None:
+            clashes = self.instance.__class__.objects.filter(
+                **{self.key_field: LowercaseKeyField.normalize(value)}
+            ).exclude(pk=self.instance.pk)
+            if clashes.exists():
+                self.add_error(field.source, self.message)
+        return cleaned_data
+
+
+class SupplierAdminForm(LowercaseKeyForm):
+    key_field = "email_key"
+    message = "A supplier with this email already exists."
+
+
+class ProductAdminForm(LowercaseKeyForm):
+    key_field = "name_key"
+    message = "A product with this name already exists."
+
+
+@admin.register(Supplier)
+class SupplierAdmin(ScalableAdmin):
+    form = SupplierAdminForm
+    list_display = ("id", "name", "email", "phone")
+    search_fields = ("name", "email")
+    ordering = ("id",)
+
+    def has_delete_permission(self, request, obj=None):
+        # Deleting a supplier cascades through its products' ledgers.
+        return False
+
+
+@admin.register(Location)
+class LocationAdmin(ScalableAdmin):
+    list_display = ("id", "name", "is_default")
+    # A handful of rows: the default search is fine.
+    search_fields = ("name",)
+    ordering = ("name",)
+
+
+class StockLevelInline(admin.TabularInline):
+    model = StockLevel
+    fields = ("location", "quantity")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("location")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Product)
+class ProductAdmin(ScalableAdmin):
+    form = ProductAdminForm
+    list_display = (
+        "id",
+        "name",
+        "category",
+        "supplier",
+        "price",
+        "stock_quantity",
+    )
+    list_select_related = ("supplier",)
+    search_fields = ("name",)
+    autocomplete_fields = ("supplier",)
+    inlines = (StockLevelInline,)
+    ordering = ("id",)
+
+    def get_readonly_fields(self, request, obj=None):
+        # After the opening stock, stock only changes through movements.
+        return ("stock_quantity",) if obj is not None else ()
+
+    def has_delete_permission(self, request, obj=None):
+        # Deleting a product cascades through its ledger.
+        return False
+
+
+@admin.register(StockLevel)
+class StockLevelAdmin(ScalableAdmin):
+    list_display = ("id", "product", "location", "quantity")
+    list_select_related = ("product", "location")
+    list_filter = ("location",)
+    search_fields = ("product__name",)
+    search_model = Product
+    search_prefix = "product__"
+    ordering = ("location", "quantity", "id")
+
+    # Levels change through stock movements and transfers only.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class StockMovementAdminForm(StockMovementForm):
+    """The view's form and stock checks, with the admin's own widgets."""
+
+    class Meta(StockMovementForm.Meta):
+        field_classes = {}
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(ScalableAdmin):
+    form = StockMovementAdminForm
+    list_display = (
+        "id",
+        "product",
+        "movement_type",
+        "quantity",
+        "location",
+        "to_location",
+        "movement_date",
+    )
+    list_select_related = ("product", "location", "to_location")
+    list_filter = ("movement_type",)
+    search_fields = ("product__name",)
+    search_model = Product
+    search_prefix = "product__"
+    autocomplete_fields = ("product",)
+    date_hierarchy = "movement_date"
+    ordering = ("-movement_date", "-id")
+
+    # The ledger is append-only.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_form(self, request, obj=None, **kwargs):
+        if obj is not None:
+            # Shown read-only; the stock checks only apply to new movements.
+            kwargs["form"] = forms.ModelForm
+        return super().get_form(request, obj, **kwargs)
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        try:
+            if obj.movement_type == "Transfer":
+                movement = services.transfer(
+                    obj.product,
+                    obj.quantity,
+                    obj.location,
+                    obj.to_location,
+                    notes=obj.notes,
+                )
+            else:
+                movement = services.record_movement(
+                    obj.product,
+                    obj.quantity,
+                    obj.movement_type,
+                    notes=obj.notes,
+                    location=obj.location,
+                )
+        except services.InsufficientStock:
+            # Stock ran out after the form checked it; response_add reports it.
+            return
+        obj.pk = movement.pk
+        obj.movement_date = movement.movement_date
+
+    def log_addition(self, request, obj, message):
+        if obj.pk is not None:
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if obj.pk is None:
+            self.message_user(
+                request, "Insufficient stock for this product.", messages.ERROR
+            )
+            return HttpResponseRedirect(request.get_full_path())
+        return super().response_add(request, obj, post_url_continue)
+
+
+class SaleOrderLineInline(admin.TabularInline):
+    model = SaleOrderLine
+    fields = ("product", "quantity", "unit_price", "line_total")
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaleOrder)
+class SaleOrderAdmin(ScalableAdmin):
+    list_display = (
+        "id",
+        "product",
+        "quantity",
+        "total_price",
+        "location",
+        "status",
+        "sale_date",
+    )
+    list_select_related = ("product", "location")
+    list_filter = ("status",)
+    search_fields = ("product__name",)
+    search_model = Product
+    search_prefix = "product__"
+    date_hierarchy = "sale_date"
+    ordering = ("-sale_date", "-id")
+    inlines = (SaleOrderLineInline,)
+    actions = ("cancel_orders", "complete_orders")
+
+    # Orders are placed from the sale views and move on through the
+    # actions, which keep stock and the sales rollups in step.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def _apply(self, request, queryset, service, verb):
+        done = sum(
+            service(order) for order in queryset.filter(status="Pending").iterator()
+        )
+        self.message_user(request, f"{done} pending order(s) {verb}.")
+
+    @admin.action(description="Cancel selected pending orders (restocks them)")
+    def cancel_orders(self, request, queryset):
+        self._apply(request, queryset, services.cancel_sale_order, "cancelled")
+
+    @admin.action(description="Complete selected pending orders")
+    def complete_orders(self, request, queryset):
+        self._apply(request, queryset, services.complete_sale_order, "completed")
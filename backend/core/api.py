@@ -0,0 +1,348 @@
+# core/api.py
+"""
+Read-only JSON API under /api/.
+
+Each resource serializes straight from a ``.values()`` projection (no model
+instances, no templates), accepts the same filters as its HTML page, is
+keyset-paginated with the same cursors, and supports ``?fields=a,b`` to
+select columns and ``?limit=n`` for the page size.
+
+Responses carry an ``ETag`` built from the versions of the tables they read
+(core/versioning.py) plus the query string, and a ``Last-Modified`` from the
+time of the latest write, so a poller sending ``If-None-Match`` or
+``If-Modified-Since`` gets an empty 304 without any database work until
+something actually changes.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+
+from . import repository, search, stockqueue, versioning
+from .forms import StockLevelFilterForm
+from .models import Product, ReorderAlert, SaleOrder, StockMovement, Supplier
+from .pagination import CursorPaginator
+from .repository import filter_stock_levels
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+class ApiError(Exception):
+    pass
+
+
+class Resource:
+    """
+    ``fields`` maps each public field name to the ORM path it is read from.
+    ``filter`` takes (queryset, request.GET) and returns the filtered
+    queryset, raising ApiError for bad input.
+    """
+
+    def __init__(self, name, model, versions, fields, ordering, filter=None):
+        self.name = name
+        self.model = model
+        self.versions = versions
+        self.fields = fields
+        self.ordering = ordering
+        self.filter = filter
+
+    def paths(self, params):
+        """Public field name -> ORM path, for this request."""
+        return self.fields
+
+    def select(self, params):
+        """The public fields to return for the request's ``?fields=``."""
+        available = self.paths(params)
+        requested = params.get("fields")
+        if not requested:
+            return list(available)
+        names = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ApiError(
+                f"Unknown field(s): {', '.join(unknown)}. "
+                f"Available: {', '.join(available)}."
+            )
+        return names
+
+    def queryset(self, params, names):
+        queryset = self.model.objects.all()
+        if self.filter:
+            queryset = self.filter(queryset, params)
+        return queryset
+
+    def paginator(self, params, names, limit):
+        queryset = self.queryset(params, names)
+        return self._project(queryset, params, names, self.ordering, limit)
+
+    def _project(self, queryset, params, names, ordering, limit):
+        # The cursor needs the ordering columns even if they were not asked for.
+        fields = self.paths(params)
+        paths = {fields[name] for name in names}
+        paths.update(field.lstrip("-") for field in ordering)
+        return CursorPaginator(queryset.values(*sorted(paths)), limit, ordering=ordering)
+
+
+class StockLevelResource(Resource):
+    """
+    The stock level check. With ``location`` it pages that location's
+    StockLevel rows through repository.stock_levels, as the HTML page does,
+    so the stock filters, the ordering and the queued units apply to the
+    location's quantity (``location_quantity``); every other field is read
+    through the row's product.
+    """
+
+    # Paths on StockLevel for the fields that are not the product's own
+    LEVEL_PATHS = {
+        "id": "product_id",
+        "location_quantity": "quantity",
+        "pending_quantity": "pending_quantity",
+        "exact_stock_quantity": "exact_stock_quantity",
+        "reorder_threshold": "reorder_threshold",
+    }
+
+    def _filters(self, params):
+        data = params.copy()
+        for name in ("cursor", "fields", "limit"):
+            data.pop(name, None)
+        form = StockLevelFilterForm(data)
+        if not form.is_valid():
+            raise ApiError(
+                "; ".join(
+                    f"{field}: {' '.join(errors)}"
+                    for field, errors in form.errors.items()
+                )
+            )
+        return form.cleaned_data
+
+    def paths(self, params):
+        if not params.get("location"):
+            return self.fields
+        paths = {
+            name: self.LEVEL_PATHS.get(name, f"product__{path}")
+            for name, path in self.fields.items()
+        }
+        paths["location_quantity"] = self.LEVEL_PATHS["location_quantity"]
+        return paths
+
+    def paginator(self, params, names, limit):
+        filters = self._filters(params)
+        if not filters.get("location"):
+            products = stockqueue.with_pending(filter_stock_levels(filters))
+            return self._project(products, params, names, self.ordering, limit)
+        levels = repository.stock_levels(filters, limit)
+        return self._project(
+            stockqueue.with_pending(levels.queryset),
+            params,
+            names,
+            levels.ordering,
+            limit,
+        )
+
+
+# ----- filters (mirroring the HTML list views) -----
+
+
+def _search(model=None, prefix=""):
+    def apply(queryset, params):
+        term = params.get("search", "")
+        if term:
+            queryset = search.filter_queryset(
+                queryset, term, model=model, prefix=prefix
+            )
+        return queryset
+
+    return apply
+
+
+def _status(queryset, params):
+    status = params.get("status", "All")
+    if status == "All":
+        return queryset
+    if status not in dict(SaleOrder.STATUS_CHOICES):
+        raise ApiError(f"Unknown status '{status}'.")
+    return queryset.filter(status=status)
+
+
+def _open_alerts(queryset, params):
+    return queryset.filter(state=ReorderAlert.OPEN)
+
+
+RESOURCES = {
+    resource.name: resource
+    for resource in [
+        Resource(
+            "products",
+            Product,
+            ("product", "supplier"),
+            {
+                "id": "id",
+                "name": "name",
+                "description": "description",
+                "category": "category",
+                "price": "price",
+                "stock_quantity": "stock_quantity",
+                "reorder_point": "reorder_point",
+                "safety_stock": "safety_stock",
+                "supplier": "supplier_id",
+                "supplier_name": "supplier__name",
+            },
+            ("id",),
+            _search(),
+        ),
+        Resource(
+            "suppliers",
+            Supplier,
+            ("supplier",),
+            {
+                "id": "id",
+                "name": "name",
+                "email": "email",
+                "phone": "phone",
+                "address": "address",
+            },
+            ("id",),
+            _search(),
+        ),
+        StockLevelResource(
+            "stock-levels",
+            Product,
+            (
+                "product",
+                "supplier",
+                "categoryreorderdefault",
+                "forecast",
+                "stockqueue",
+                "location",
+            ),
+            {
+                "id": "id",
+                "name": "name",
+                "stock_quantity": "stock_quantity",
+                # Queued 'In' units not applied yet, and stock including them
+                "pending_quantity": "pending_quantity",
+                "exact_stock_quantity": "exact_stock_quantity",
+                "reorder_threshold": "reorder_threshold",
+                "days_of_cover": "forecast__days_of_cover",
+                "supplier": "supplier_id",
+                "supplier_name": "supplier__name",
+            },
+            ("stock_quantity", "id"),
+        ),
+        Resource(
+            "orders",
+            SaleOrder,
+            ("saleorder", "product"),
+            {
+                "id": "id",
+                "product": "product_id",
+                "product_name": "product__name",
+                "quantity": "quantity",
+                "total_price": "total_price",
+                "sale_date": "sale_date",
+                "status": "status",
+            },
+            ("-id",),
+            _status,
+        ),
+        Resource(
+            "movements",
+            StockMovement,
+            ("stockmovement", "product", "location"),
+            {
+                "id": "id",
+                "product": "product_id",
+                "product_name": "product__name",
+                "movement_type": "movement_type",
+                "quantity": "quantity",
+                "location": "location_id",
+                # Set on transfers only
+                "to_location": "to_location_id",
+                "movement_date": "movement_date",
+                "notes": "notes",
+            },
+            ("-movement_date", "-id"),
+            _search(model=Product, prefix="product__"),
+        ),
+        Resource(
+            "needs-reorder",
+            ReorderAlert,
+            ("reorderalert", "product"),
+            {
+                "id": "id",
+                "product": "product_id",
+                "product_name": "product__name",
+                "stock_quantity": "product__stock_quantity",
+                "threshold": "threshold",
+                "opened_at": "opened_at",
+            },
+            ("id",),
+            _open_alerts,
+        ),
+    ]
+}
+
+
+# ----- conditional GET -----
+
+
+def _etag(request, resource):
+    versions = versioning.get_versions(*RESOURCES[resource].versions)
+    query = request.GET.urlencode()
+    return hashlib.md5(f"{resource}|{versions}|{query}".encode()).hexdigest()
+
+
+def _last_modified(request, resource):
+    stamp = versioning.get_last_modified(*RESOURCES[resource].versions)
+    return datetime.fromtimestamp(int(stamp), tz=timezone.utc)
+
+
+# ----- views -----
+
+
+def _limit(params):
+    try:
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError("limit must be an integer.")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f"limit must be between 1 and {MAX_LIMIT}.")
+    return limit
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params["cursor"] = cursor
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+
+@require_safe
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def api_list(request, resource):
+    params = request.GET
+    spec = RESOURCES[resource]
+    try:
+        names = spec.select(params)
+        limit = _limit(params)
+        paginator = spec.paginator(params, names, limit)
+    except ApiError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    page = paginator.get_page(params.get("cursor"))
+    paths = spec.paths(params)
+    results = [{name: row[paths[name]] for name in names} for row in page]
+    response = JsonResponse(
+        {
+            "results": results,
+            "next": _page_url(request, page.next_cursor),
+            "previous": _page_url(request, page.previous_cursor),
+        }
+    )
+    # Let clients and proxies keep the body but revalidate every time.
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,389 @@
+# core/benchmark.py
+"""
+Seeded performance benchmark for every core view.
+
+``seed`` fills the database with a deterministic catalogue and ledger using
+``bulk_create``; ``run`` requests every scenario with the test client and
+records latency and SQL query counts; ``check_budgets`` compares the result
+with the stored per-scenario budgets. Driven by ``manage.py bench``.
+"""
+import datetime
+import itertools
+import random
+import statistics
+import time
+from collections import namedtuple
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import forecasting, reorder, rollups, sales, services
+from .models import Product, SaleOrder, StockMovement, Supplier
+from .pagination import CursorPaginator
+
+SCALES = {
+    "small": {"suppliers": 20, "products": 1_000, "orders": 500, "movements": 1_000},
+    "medium": {"suppliers": 200, "products": 20_000, "orders": 20_000, "movements": 100_000},
+    "large": {"suppliers": 2_000, "products": 100_000, "orders": 500_000, "movements": 10_000_000},
+}
+
+Result = namedtuple("Result", ["name", "p50_ms", "p95_ms", "queries"])
+
+
+# ----- seeding -----
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _spread_dates(model, date_field, days):
+    """
+    auto_now_add stamps every seeded row with today; spread them evenly over
+    the last ``days`` days by primary-key range (one UPDATE per day).
+    """
+    ids = model.objects.order_by("pk").values_list("pk", flat=True)
+    first, last = ids.first(), ids.last()
+    if first is None or days <= 1:
+        return
+    step = max(1, (last - first + 1) // days)
+    today = datetime.date.today()
+    for day in range(days):
+        low = first + day * step
+        if low > last:
+            break
+        high = last if day == days - 1 else low + step - 1
+        model.objects.filter(pk__range=(low, high)).update(
+            **{date_field: today - datetime.timedelta(days=days - day - 1)}
+        )
+
+
+def seed(suppliers, products, orders, movements, days=365, seed=0, batch_size=5000, log=None):
+    """Insert a deterministic data set. Returns the number of rows written."""
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+
+    log(f"Seeding {suppliers} suppliers")
+    for batch in _batched(
+        (
+            Supplier(
+                name=f"Supplier {i}",
+                email=f"supplier{i}@bench.example",
+                phone=f"{i:010d}",
+                address=f"{i} Bench Street",
+            )
+            for i in range(suppliers)
+        ),
+        batch_size,
+    ):
+        Supplier.objects.bulk_create(batch)
+    supplier_ids = list(Supplier.objects.values_list("pk", flat=True))
+
+    log(f"Seeding {products} products")
+    for batch in _batched(
+        (
+            Product(
+                name=f"Product {i:07d}",
+                description="Seeded by manage.py bench",
+                category=f"Category {i % 50}",
+                price=f"{rng.randint(100, 100_000) / 100:.2f}",
+                stock_quantity=rng.randint(0, 1_000),
+                reorder_point=rng.randint(0, 50),
+                supplier_id=rng.choice(supplier_ids),
+            )
+            for i in range(products)
+        ),
+        batch_size,
+    ):
+        Product.objects.bulk_create(batch)
+    seeded = Product.objects.only("pk", "stock_quantity").iterator()
+    for batch in _batched(seeded, batch_size):
+        services.open_stock_levels(batch)
+    product_ids = list(Product.objects.values_list("pk", flat=True))
+
+    log(f"Seeding {orders} sale orders")
+    statuses = ["Pending", "Completed", "Completed", "Cancelled"]
+    for batch in _batched(
+        (
+            SaleOrder(
+                product_id=rng.choice(product_ids),
+                quantity=rng.randint(1, 10),
+                total_price=f"{rng.randint(100, 100_000) / 100:.2f}",
+                status=rng.choice(statuses),
+            )
+            for _ in range(orders)
+        ),
+        batch_size,
+    ):
+        SaleOrder.objects.bulk_create(batch)
+
+    log(f"Seeding {movements} stock movements")
+    for batch in _batched(
+        (
+            StockMovement(
+                product_id=rng.choice(product_ids),
+                quantity=rng.randint(1, 100),
+                movement_type=rng.choice(["In", "Out"]),
+            )
+            for _ in range(movements)
+        ),
+        batch_size,
+    ):
+        StockMovement.objects.bulk_create(batch)
+
+    log(f"Spreading dates over {days} days and rebuilding rollups")
+    _spread_dates(SaleOrder, "sale_date", days)
+    _spread_dates(StockMovement, "movement_date", days)
+    rollups.rebuild()
+    sales.rebuild()
+    reorder.evaluate_all()
+    forecasting.run()
+    return suppliers + products + orders + movements
+
+
+# ----- scenarios -----
+
+
+class Scenario:
+    """
+    One timed request. ``prepare`` runs untimed before every iteration and
+    returns ``(url, data, is_post)``; ``data`` is the query string for GETs
+    and the form body for POSTs.
+    """
+
+    def __init__(self, name, url_name, prepare):
+        self.name = name
+        self.url_name = url_name
+        self.prepare = prepare
+
+
+def _first(model, **filters):
+    return model.objects.filter(**filters).order_by("pk").first()
+
+
+def _deep_cursor(queryset, ordering):
+    """Cursor pointing ~90% of the way through ``queryset``."""
+    count = queryset.count()
+    if not count:
+        return ""
+    obj = queryset.order_by(*ordering)[int(count * 0.9)]
+    return CursorPaginator(queryset, 10, ordering=ordering).cursor_after(obj)
+
+
+def build_scenarios():
+    counter = itertools.count()
+    product = _first(Product)
+    supplier = _first(Supplier)
+    search_term = product.name[-4:] if product else "prod"
+
+    def pending_order():
+        target = Product.objects.filter(stock_quantity__gt=0).order_by("pk").first()
+        return services.place_sale_order(target, 1)
+
+    def add_product():
+        n = next(counter)
+        return reverse("add_product"), {
+            "name": f"Bench new product {n}",
+            "description": "bench",
+            "category": "bench",
+            "price": "1.00",
+            "stock_quantity": 1,
+            "supplier": supplier.pk,
+        }
+
+    def add_supplier():
+        n = next(counter)
+        return reverse("add_supplier"), {
+            "name": f"Bench supplier {n}",
+            "email": f"new{n}@bench.example",
+            "phone": f"9{n:09d}",
+            "address": "bench",
+        }
+
+    def add_movement():
+        return reverse("add_stock_movement"), {
+            "product": product.pk,
+            "movement_type": "In",
+            "quantity": 1,
+        }
+
+    def create_order():
+        target = Product.objects.filter(stock_quantity__gt=0).order_by("pk").first()
+        return reverse("create_sale_order"), {"product": target.pk, "quantity": 1}
+
+    def checkout():
+        targets = Product.objects.filter(stock_quantity__gt=0).order_by("pk")[:10]
+        data = {
+            "form-TOTAL_FORMS": len(targets),
+            "form-INITIAL_FORMS": 0,
+            "form-MIN_NUM_FORMS": 1,
+            "form-MAX_NUM_FORMS": 200,
+        }
+        for i, target in enumerate(targets):
+            data[f"form-{i}-product"] = target.pk
+            data[f"form-{i}-quantity"] = 1
+        return reverse("checkout_sale_order"), data
+
+    def cancel_order():
+        return reverse("cancel_sale_order", args=[pending_order().pk]), {}
+
+    def complete_order():
+        return reverse("complete_sale_order", args=[pending_order().pk]), {}
+
+    def import_catalog():
+        n = next(counter)
+        rows = "".join(
+            f"Bench import {n}-{i},d,c,1.00,1,{supplier.pk}\n" for i in range(20)
+        )
+        upload = SimpleUploadedFile(
+            "bench.csv",
+            ("name,description,category,price,stock_quantity,supplier\n" + rows).encode(),
+        )
+        return reverse("import_catalog"), {"kind": "product", "file": upload}
+
+    movement_cursor = _deep_cursor(
+        StockMovement.objects.all(), ("-movement_date", "-id")
+    )
+    product_cursor = _deep_cursor(Product.objects.all(), ("id",))
+    order_cursor = _deep_cursor(SaleOrder.objects.all(), ("-id",))
+
+    def reads(name, url_name, params=None):
+        return Scenario(name, url_name, lambda: (reverse(url_name), params or {}, False))
+
+    def writes(name, url_name, make):
+        def prepare():
+            url, data = make()
+            return url, data, True
+
+        return Scenario(name, url_name, prepare)
+
+    return [
+        reads("home", "home"),
+        reads("list_products", "list_products"),
+        reads("list_products:search", "list_products", {"search": search_term}),
+        reads("list_products:deep", "list_products", {"cursor": product_cursor}),
+        reads("list_suppliers", "list_suppliers"),
+        reads("list_suppliers:search", "list_suppliers", {"search": "bench"}),
+        reads("list_stock_movements", "list_stock_movements"),
+        reads("list_stock_movements:search", "list_stock_movements", {"search": search_term}),
+        reads("list_stock_movements:deep", "list_stock_movements", {"cursor": movement_cursor}),
+        reads("list_sale_orders", "list_sale_orders"),
+        reads("list_sale_orders:pending", "list_sale_orders", {"status": "Pending"}),
+        reads("list_sale_orders:deep", "list_sale_orders", {"cursor": order_cursor}),
+        reads("stock_level_check", "stock_level_check"),
+        reads(
+            "stock_level_check:filtered",
+            "stock_level_check",
+            {"supplier": supplier.pk if supplier else "", "max_stock": 100},
+        ),
+        reads("stock_level_check:reorder", "stock_level_check", {"below_reorder_point": "on"}),
+        reads("stock_level_check:cover", "stock_level_check", {"sort": "cover"}),
+        reads("export_stock_movements", "export_stock_movements", {"date_from": datetime.date.today()}),
+        reads("export_sale_orders", "export_sale_orders", {"status": "Pending"}),
+        reads("add_product:form", "add_product"),
+        reads("add_supplier:form", "add_supplier"),
+        reads("add_stock_movement:form", "add_stock_movement"),
+        reads("create_sale_order:form", "create_sale_order"),
+        reads("checkout_sale_order:form", "checkout_sale_order"),
+        reads("import_catalog:form", "import_catalog"),
+        reads("api_products", "api_products"),
+        reads("api_products:fields", "api_products", {"fields": "id,name,stock_quantity"}),
+        reads("api_suppliers", "api_suppliers"),
+        reads("api_stock_levels", "api_stock_levels", {"below_reorder_point": "on"}),
+        reads("api_orders", "api_orders", {"status": "Pending"}),
+        reads("api_movements", "api_movements"),
+        reads("needs_reorder", "needs_reorder"),
+        reads("api_needs_reorder", "api_needs_reorder"),
+        writes("add_product", "add_product", add_product),
+        writes("add_supplier", "add_supplier", add_supplier),
+        writes("add_stock_movement", "add_stock_movement", add_movement),
+        writes("create_sale_order", "create_sale_order", create_order),
+        writes("checkout_sale_order", "checkout_sale_order", checkout),
+        writes("cancel_sale_order", "cancel_sale_order", cancel_order),
+        writes("complete_sale_order", "complete_sale_order", complete_order),
+        writes("import_catalog", "import_catalog", import_catalog),
+    ]
+
+
+def uncovered_urls(scenarios):
+    """Names in core/urls.py that no scenario exercises."""
+    from .urls import urlpatterns
+
+    covered = {scenario.url_name for scenario in scenarios}
+    return sorted(p.name for p in urlpatterns if p.name not in covered)
+
+
+# ----- running -----
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run(scenarios, iterations=20, warmup=2, cold_cache=False, only=None):
+    client = Client()
+    results = []
+    for scenario in scenarios:
+        if only and scenario.name not in only:
+            continue
+        timings, queries = [], []
+        for i in range(warmup + iterations):
+            url, data, is_post = scenario.prepare()
+            if cold_cache:
+                for store in caches.all():
+                    store.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                if is_post:
+                    response = client.post(url, data)
+                else:
+                    response = client.get(url, data)
+                if response.streaming:
+                    for _chunk in response.streaming_content:
+                        pass
+                elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f"{scenario.name}: {url} returned {response.status_code}"
+                )
+            if i >= warmup:
+                timings.append(elapsed * 1000)
+                queries.append(len(captured.captured_queries))
+        results.append(
+            Result(
+                scenario.name,
+                round(statistics.median(timings), 2),
+                round(_percentile(timings, 95), 2),
+                max(queries),
+            )
+        )
+    return results
+
+
+def check_budgets(results, budgets):
+    """Return a list of human-readable budget violations."""
+    failures = []
+    for result in results:
+        budget = budgets.get(result.name)
+        if not budget:
+            continue
+        if "queries" in budget and result.queries > budget["queries"]:
+            failures.append(
+                f"{result.name}: {result.queries} queries > budget {budget['queries']}"
+            )
+        if "p95_ms" in budget and result.p95_ms > budget["p95_ms"]:
+            failures.append(
+                f"{result.name}: p95 {result.p95_ms}ms > budget {budget['p95_ms']}ms"
+            )
+    return failures
@@ -0,0 +1,44 @@
+# core/cache_backends.py
+"""
+File-based cache with least-recently-used eviction.
+
+Django's FileBasedCache culls a random sample of files once MAX_ENTRIES is
+reached. This backend refreshes a file's modification time on every hit and
+culls the least recently used files instead, so hot pages survive culling.
+Per-entry TTLs work exactly as in FileBasedCache.
+"""
+import os
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+_MISSING = object()
+
+
+class LRUFileBasedCache(FileBasedCache):
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def last_used(fname):
+            try:
+                return os.path.getmtime(fname)
+            except FileNotFoundError:
+                return 0
+
+        filelist.sort(key=last_used)
+        for fname in filelist[: max(1, num_entries // self._cull_frequency)]:
+            self._delete(fname)
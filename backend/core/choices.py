@@ -0,0 +1,102 @@
+# core/choices.py
+"""
+Cached (id, label) lists for the product and supplier dropdowns.
+
+Rendering a ModelChoiceField normally reads the whole table on every GET.
+CachedModelChoiceField renders from a compact list kept in the Django cache
+under a per-model version that core/signals.py bumps whenever a row is
+saved or deleted. Submitted values are still checked with a single
+primary-key lookup (ModelChoiceField.to_python), never the full queryset.
+
+Product lists are too long to render as options at all, so product fields
+use AutocompleteSelect: only the selected option is rendered and a script
+in base.html searches the JSON API as the user types, like the admin's
+``autocomplete_fields``.
+"""
+from django import forms
+from django.core.cache import cache
+from django.forms.models import ModelChoiceIterator, ModelChoiceIteratorValue
+from django.urls import reverse
+
+from . import versioning
+
+CHOICES_TIMEOUT = 60 * 60
+
+
+def version_name(model):
+    return f"{model._meta.model_name}_choices"
+
+
+def get_choices(model):
+    """[(pk, name), ...] for ``model`` ordered by name, served from the cache."""
+    key = "core:choices:{}:{}".format(
+        model._meta.model_name, versioning.get_version(version_name(model))
+    )
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(model.objects.order_by("name").values_list("pk", "name"))
+        cache.set(key, choices, CHOICES_TIMEOUT)
+    return choices
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    """
+    Yields the cached list when the field is rendered. Like Django's own
+    iterator it is only created on access, so building a form class (at
+    import time, possibly before ``migrate``) runs no query.
+    """
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        yield from get_choices(self.queryset.model)
+
+    def __len__(self):
+        return len(get_choices(self.queryset.model)) + (
+            self.field.empty_label is not None
+        )
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(
+            get_choices(self.queryset.model)
+        )
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    iterator = CachedChoiceIterator
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    A select holding just the empty choice and the current value, which
+    base.html's script fills from ``url_name`` (a JSON API list endpoint
+    with ``search``, ``id`` and ``name``) one page of matches at a time.
+    """
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        attrs = {**(attrs or {}), "data-autocomplete-url": reverse(self.url_name)}
+        return super().get_context(name, value, attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        wanted = {str(v) for v in value if v not in (None, "")}
+        groups = []
+        for index, (option_value, label) in enumerate(self.choices):
+            if isinstance(option_value, ModelChoiceIteratorValue):
+                key = str(option_value.value)
+            else:
+                key = "" if option_value is None else str(option_value)
+            if key == "" or key in wanted:
+                option = self.create_option(
+                    name, option_value, label, key in wanted, index, attrs=attrs
+                )
+                groups.append((None, [option], index))
+                wanted.discard(key)
+            if not wanted:
+                # Nothing (more) to show; an unbound form stops at the
+                # empty choice without reading the list.
+                break
+        return groups
@@ -0,0 +1,246 @@
+# core/events.py
+"""
+Live stock notifications over Server-Sent Events.
+
+The stock service calls ``publish_stock_changes`` for every stock write. Once
+the transaction commits, the new levels are read with one query (only when
+someone is listening) and an event per product goes to ``broker``, an
+in-process fan-out that copies each event onto every subscriber's queue.
+
+``stream_stock_events`` is a bare ASGI app mounted at STREAM_PATH by
+inventory_project/asgi.py, outside Django's request cycle: an idle stream is
+just a coroutine parked on its queue, holding no thread and no database
+connection, so hundreds of open dashboards cost nothing until stock moves.
+
+Events::
+
+    event: stock       data: {"product": 3, "name": ..., "stock_quantity": 7,
+                              "delta": -2}
+    event: low_stock   data: {"product": 3, "name": ..., "stock_quantity": 7,
+                              "threshold": 10}
+                       sent when the reorder engine (core/reorder.py) opens
+                       an alert
+    event: restocked   same payload, sent when it resolves one
+
+``?product=<id>`` (repeatable) limits a stream to some products and
+``?type=low_stock`` (repeatable) to some event types.
+
+The broker only sees writes made by the same process, so run the ASGI server
+with a single worker process (async code scales within it) or put a shared
+pub/sub in front of ``broker.publish``.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from urllib.parse import parse_qs
+
+from django.db import transaction
+
+from .models import Product
+
+STREAM_PATH = "/events/stock/"
+
+# Events buffered per subscriber; a slow client loses the oldest first.
+QUEUE_SIZE = 100
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT = 15
+
+
+class Subscription:
+    def __init__(self, broker, loop, predicate):
+        self.broker = broker
+        self.loop = loop
+        self.predicate = predicate
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.dropped = 0
+
+    def _deliver(self, event):
+        # Runs on the subscriber's own event loop.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """The next event, or None if ``timeout`` seconds pass first."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """
+    Thread-safe in-process fan-out. ``publish`` may be called from any thread
+    (sync views run in a thread pool under ASGI); each subscriber receives the
+    event on its own event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, predicate=None):
+        """Subscribe from a coroutine; ``predicate(event)`` filters events."""
+        subscription = Subscription(
+            self, asyncio.get_running_loop(), predicate or (lambda event: True)
+        )
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def publish(self, event_type, data):
+        event = {"id": next(self._ids), "type": event_type, "data": data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if not subscription.predicate(event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:  # loop closed under us
+                self.unsubscribe(subscription)
+        return event
+
+
+broker = Broker()
+
+
+# ----- publishing -----
+
+
+def publish_stock_changes(deltas):
+    """
+    Publish ``{product_id: signed delta}`` once the current transaction
+    commits.
+    """
+    transaction.on_commit(lambda: _publish(dict(deltas)))
+
+
+def _publish(deltas):
+    if not broker.has_subscribers():
+        return
+    rows = Product.objects.filter(pk__in=list(deltas)).values(
+        "id", "name", "stock_quantity"
+    )
+    for row in rows:
+        broker.publish(
+            "stock",
+            {
+                "product": row["id"],
+                "name": row["name"],
+                "stock_quantity": row["stock_quantity"],
+                "delta": deltas[row["id"]],
+            },
+        )
+
+
+def publish_reorder_transitions(opened, resolved):
+    """
+    Publish alert transitions from core/reorder.py once the current
+    transaction commits. Rows carry id, name, stock_quantity and
+    reorder_threshold, so this costs no query.
+    """
+
+    def publish():
+        for event_type, rows in (("low_stock", opened), ("restocked", resolved)):
+            for row in rows:
+                broker.publish(
+                    event_type,
+                    {
+                        "product": row["id"],
+                        "name": row["name"],
+                        "stock_quantity": row["stock_quantity"],
+                        "threshold": row["reorder_threshold"],
+                    },
+                )
+
+    transaction.on_commit(publish)
+
+
+# ----- ASGI endpoint -----
+
+
+def _predicate(query_string):
+    params = parse_qs(query_string.decode())
+    try:
+        products = {int(value) for value in params.get("product", [])}
+    except ValueError:
+        products = set()
+    types = set(params.get("type", []))
+
+    def matches(event):
+        if types and event["type"] not in types:
+            return False
+        return not products or event["data"]["product"] in products
+
+    return matches
+
+
+def format_event(event):
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(event['data'])}\n\n"
+    ).encode()
+
+
+async def stream_stock_events(scope, receive, send):
+    """ASGI app streaming broker events to one client until it disconnects."""
+    if scope["method"] != "GET":
+        await send({"type": "http.response.start", "status": 405, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    subscription = broker.subscribe(_predicate(scope.get("query_string", b"")))
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send(
+            {"type": "http.response.body", "body": b": connected\n\n", "more_body": True}
+        )
+        while not disconnected.is_set():
+            getter = asyncio.ensure_future(subscription.get(HEARTBEAT))
+            await asyncio.wait(
+                [getter, watcher], return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected.is_set():
+                getter.cancel()
+                break
+            event = getter.result()
+            body = format_event(event) if event else b": keep-alive\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        subscription.close()
+        watcher.cancel()
@@ -0,0 +1,103 @@
+# core/exporters.py
+"""
+Streaming CSV / JSON-lines export of the stock movement ledger and sale orders.
+
+Rows are projected with ``values_list`` and read with
+``QuerySet.iterator(chunk_size=...)``, then encoded one line at a time, so
+memory use stays flat no matter how many rows are exported.
+"""
+import csv
+import datetime
+import decimal
+import json
+
+from .models import SaleOrder, StockMovement
+
+CHUNK_SIZE = 2000
+
+MOVEMENT_COLUMNS = [
+    ("id", "id"),
+    ("movement_date", "movement_date"),
+    ("product_id", "product_id"),
+    ("product", "product__name"),
+    ("movement_type", "movement_type"),
+    ("quantity", "quantity"),
+    ("notes", "notes"),
+]
+
+ORDER_COLUMNS = [
+    ("id", "id"),
+    ("sale_date", "sale_date"),
+    ("product_id", "product_id"),
+    ("product", "product__name"),
+    ("quantity", "quantity"),
+    ("total_price", "total_price"),
+    ("status", "status"),
+]
+
+
+def stock_movement_rows(search="", date_from=None, date_to=None):
+    """Header and row iterator for StockMovement, using the list view's filters."""
+    movements = StockMovement.objects.all()
+    if search:
+        movements = movements.filter(product__name__icontains=search)
+    if date_from:
+        movements = movements.filter(movement_date__gte=date_from)
+    if date_to:
+        movements = movements.filter(movement_date__lte=date_to)
+    return _project(movements, MOVEMENT_COLUMNS)
+
+
+def sale_order_rows(status="All", date_from=None, date_to=None):
+    """Header and row iterator for SaleOrder, using the list view's filters."""
+    orders = SaleOrder.objects.all()
+    if status and status != "All":
+        orders = orders.filter(status=status)
+    if date_from:
+        orders = orders.filter(sale_date__gte=date_from)
+    if date_to:
+        orders = orders.filter(sale_date__lte=date_to)
+    return _project(orders, ORDER_COLUMNS)
+
+
+def _project(queryset, columns):
+    header = [name for name, _lookup in columns]
+    rows = (
+        queryset.order_by("pk")
+        .values_list(*[lookup for _name, lookup in columns])
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return header, rows
+
+
+class _Echo:
+    """File-like object whose write() hands the line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def iter_jsonl(header, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(header, row)), default=_json_default) + "\n"
+
+
+FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "jsonl": (iter_jsonl, "application/x-ndjson"),
+}
@@ -1,9 +1,94 @@
 # core/forms.py
 from django import forms
-from .models import Product, Supplier, StockMovement, SaleOrder
+from django.db import IntegrityError, transaction
 
+from .choices import AutocompleteSelect, CachedModelChoiceField, get_choices
+from .models import (
+    Location,
+    Product,
+    Supplier,
+    StockLevel,
+    StockMovement,
+    SaleOrder,
+    UNIQUE_KEY_INDEXES,
+    default_location,
+)
+
+
+def _location_stock(product, location):
+    """Units of ``product`` at ``location`` (None: the default location)."""
+    quantity = (
+        StockLevel.objects.filter(
+            product=product,
+            location_id=location.pk if location else default_location(),
+        )
+        .values_list("quantity", flat=True)
+        .first()
+    )
+    return quantity or 0
+
+
+def _error_chain(exc):
+    """``exc`` and the driver errors it was raised from."""
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def violated_key(exc, table, columns):
+    """
+    Which of ``columns`` (LowercaseKeyField columns of ``table``) the
+    IntegrityError ``exc`` violated, or None if it was something else.
+    PostgreSQL names the constraint and MongoDB the index, which are the
+    unique indexes migration 0014 created; SQLite names only the column.
+    """
+    for error in _error_chain(exc):
+        constraint = getattr(getattr(error, "diag", None), "constraint_name", None)
+        details = getattr(error, "details", None) or {}
+        message = str(error)
+        for column in columns:
+            index = UNIQUE_KEY_INDEXES[table, column]
+            if (
+                constraint == index
+                or list(details.get("keyPattern", ())) == [column]
+                or f"index: {index} " in message
+                or message == f"UNIQUE constraint failed: {table}.{column}"
+            ):
+                return column
+    return None
+
+
+class UniqueKeyFormMixin:
+    """
+    Case-insensitive uniqueness is enforced by the database through the
+    model's LowercaseKeyField columns, so instead of checking with a query
+    first, ``save()`` turns the IntegrityError into the usual field error
+    and returns None. ``unique_keys`` maps each key column to the form field
+    and message to report.
+    """
+
+    unique_keys = {}
+
+    def save(self, commit=True):
+        if not commit:
+            return super().save(commit=False)
+        try:
+            with transaction.atomic():
+                return super().save()
+        except IntegrityError as exc:
+            column = violated_key(exc, self._meta.model._meta.db_table, self.unique_keys)
+            if column is None:
+                raise
+            field, message = self.unique_keys[column]
+            self.add_error(field, message)
+            return None
+
+
+class ProductForm(UniqueKeyFormMixin, forms.ModelForm):
+    unique_keys = {"name_key": ("name", "A product with this name already exists.")}
 
-class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
         fields = [
@@ -12,26 +97,23 @@ class ProductForm(forms.ModelForm):
             "category",
             "price",
             "stock_quantity",
+            "reorder_point",
+            "safety_stock",
             "supplier",
         ]
         labels = {
             "stock_quantity": "Stock Quantity",
+            "reorder_point": "Reorder Point",
+            "safety_stock": "Safety Stock",
+        }
+        help_texts = {
+            "reorder_point": "Leave blank to use the category default.",
+            "safety_stock": "Leave blank to use the category default.",
         }
         widgets = {
             "description": forms.Textarea(attrs={"rows": 3}),
         }
-
-    def clean_name(self):
-        """
-        Ensure no duplicates by name. This is helpful if the database hasn't saved
-        or if we want to raise a nicer error before the DB constraint kicks in.
-        """
-        name = self.cleaned_data.get("name")
-        if Product.objects.filter(name__iexact=name).exists():
-            raise forms.ValidationError(
-                "A product with this name already exists."
-            )
-        return name
+        field_classes = {"supplier": CachedModelChoiceField}
 
     def clean_price(self):
         price = self.cleaned_data.get("price")
@@ -46,7 +128,11 @@ class ProductForm(forms.ModelForm):
         return stock_quantity
 
 
-class SupplierForm(forms.ModelForm):
+class SupplierForm(UniqueKeyFormMixin, forms.ModelForm):
+    unique_keys = {
+        "email_key": ("email", "A supplier with this email already exists.")
+    }
+
     class Meta:
         model = Supplier
         fields = ["name", "email", "phone", "address"]
@@ -73,31 +159,134 @@ class SupplierForm(forms.ModelForm):
             )
         return phone
 
-    def clean_email(self):
-        """
-        The model enforces uniqueness, but we can provide a friendlier message if a duplicate is found.
-        """
-        email = self.cleaned_data.get("email")
-        if Supplier.objects.filter(email__iexact=email).exists():
-            raise forms.ValidationError(
-                "A supplier with this email already exists."
-            )
-        return email
+
+class ProductImportForm(ProductForm):
+    """
+    ProductForm rules for one row of a catalogue import. Name uniqueness and
+    supplier existence are checked by the importer for a whole batch at once,
+    so this form runs no queries of its own.
+    """
+
+    supplier = forms.IntegerField(min_value=1)
+
+    class Meta(ProductForm.Meta):
+        fields = [
+            "name",
+            "description",
+            "category",
+            "price",
+            "stock_quantity",
+            "reorder_point",
+            "safety_stock",
+        ]
+
+    def __init__(self, *args, known_suppliers=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.known_suppliers = known_suppliers
+
+    def clean_supplier(self):
+        supplier = self.cleaned_data.get("supplier")
+        if self.known_suppliers is not None and supplier not in self.known_suppliers:
+            raise forms.ValidationError("Supplier does not exist.")
+        return supplier
+
+    def validate_unique(self):
+        pass
+
+
+class SupplierImportForm(SupplierForm):
+    """SupplierForm rules for one row of a catalogue import, without queries."""
+
+    def validate_unique(self):
+        pass
+
+
+class CatalogUploadForm(forms.Form):
+    kind = forms.ChoiceField(
+        choices=[("product", "Products"), ("supplier", "Suppliers")],
+        label="File contains",
+    )
+    file = forms.FileField(
+        label="CSV or JSON-lines file",
+        help_text="Column names must match the add form fields; "
+        "products reference their supplier by id.",
+    )
+
+
+class LedgerExportForm(forms.Form):
+    """Filters accepted by the stock movement and sale order exports."""
+
+    search = forms.CharField(required=False)
+    status = forms.ChoiceField(
+        required=False,
+        choices=[("All", "All")] + list(SaleOrder.STATUS_CHOICES),
+    )
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    format = forms.ChoiceField(
+        required=False, choices=[("csv", "CSV"), ("jsonl", "JSON lines")]
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("date_from must not be after date_to.")
+        cleaned_data["format"] = cleaned_data.get("format") or "csv"
+        cleaned_data["status"] = cleaned_data.get("status") or "All"
+        return cleaned_data
 
 
 class StockMovementForm(forms.ModelForm):
     class Meta:
         model = StockMovement
-        fields = ["product", "movement_type", "quantity", "notes"]
+        # Locations come before quantity so clean_quantity can see them
+        fields = [
+            "product",
+            "movement_type",
+            "location",
+            "to_location",
+            "quantity",
+            "notes",
+        ]
         labels = {
             "movement_type": "Movement Type",
+            "location": "Location",
+            "to_location": "Transfer To",
         }
         widgets = {
+            "product": AutocompleteSelect("api_products"),
             "notes": forms.Textarea(attrs={"rows": 3}),
         }
+        field_classes = {
+            "product": CachedModelChoiceField,
+            "location": CachedModelChoiceField,
+            "to_location": CachedModelChoiceField,
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Left blank, the movement happens at the default location.
+        self.fields["location"].required = False
+
+    def clean_to_location(self):
+        """A transfer needs somewhere else to go; other movements ignore it."""
+        to_location = self.cleaned_data.get("to_location")
+        if self.cleaned_data.get("movement_type") != "Transfer":
+            return None
+        if to_location is None:
+            raise forms.ValidationError("Choose the location to transfer to.")
+        location = self.cleaned_data.get("location")
+        if to_location.pk == (location.pk if location else default_location()):
+            raise forms.ValidationError("Choose a different location to transfer to.")
+        return to_location
 
     def clean_quantity(self):
-        """Ensure quantity is positive, and if 'Out', ensure product has enough stock."""
+        """
+        Ensure quantity is positive, and if 'Out' or 'Transfer', ensure the
+        location has enough stock.
+        """
         quantity = self.cleaned_data.get("quantity")
         movement_type = self.cleaned_data.get("movement_type")
         product = self.cleaned_data.get("product")
@@ -107,11 +296,12 @@ class StockMovementForm(forms.ModelForm):
                 "Quantity must be a positive integer."
             )
 
-        # If movement is 'Out', check product stock
-        if movement_type == "Out" and product is not None:
-            if product.stock_quantity < quantity:
+        # If stock leaves the location, check what it holds
+        if movement_type in ("Out", "Transfer") and product is not None:
+            available = _location_stock(product, self.cleaned_data.get("location"))
+            if available < quantity:
                 raise forms.ValidationError(
-                    f"Insufficient stock. Currently {product.stock_quantity} in stock."
+                    f"Insufficient stock. Currently {available} in stock."
                 )
 
         return quantity
@@ -120,8 +310,22 @@ class StockMovementForm(forms.ModelForm):
 class SaleOrderForm(forms.ModelForm):
     class Meta:
         model = SaleOrder
-        # We only allow the user to pick a product and quantity
-        fields = ["product", "quantity"]
+        # We only allow the user to pick a product, quantity and location
+        fields = ["product", "quantity", "location"]
+        labels = {"location": "Ship From"}
+        widgets = {"product": AutocompleteSelect("api_products")}
+        field_classes = {
+            "product": CachedModelChoiceField,
+            "location": CachedModelChoiceField,
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # product is optional on the model (multi-line orders leave it empty),
+        # but a single-product order must have one.
+        self.fields["product"].required = True
+        # Left blank, stock is allocated from the default location.
+        self.fields["location"].required = False
 
     def clean_quantity(self):
         quantity = self.cleaned_data["quantity"]
@@ -139,20 +343,81 @@ class SaleOrderForm(forms.ModelForm):
         return product
 
 
+class CheckoutLineForm(forms.Form):
+    """
+    One line of a multi-line order. Product choices are supplied by
+    BaseCheckoutFormSet from the choice cache, so a 30-line order does not
+    read the product list once per line; only the chosen product is rendered.
+    """
+
+    # Existence is checked by services.checkout under lock, so a briefly
+    # stale cached list never rejects a valid product.
+    product = forms.IntegerField(widget=AutocompleteSelect("api_products"))
+    quantity = forms.IntegerField(min_value=1)
+
+    def __init__(self, *args, product_choices=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["product"].widget.choices = [("", "---------")] + list(
+            product_choices
+        )
+
+
+class BaseCheckoutFormSet(forms.BaseFormSet):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only a submitted order has chosen products to render again.
+        if self.is_bound:
+            self.form_kwargs = {
+                **self.form_kwargs, "product_choices": get_choices(Product)
+            }
+
+    def lines(self):
+        """(product_id, quantity) for every filled-in line, in form order."""
+        return [
+            (form.cleaned_data["product"], form.cleaned_data["quantity"])
+            for form in self.forms
+            if form.cleaned_data
+        ]
+
+    def line_forms(self):
+        """Forms matching lines(), so errors can be mapped back by index."""
+        return [form for form in self.forms if form.cleaned_data]
+
+
+CheckoutFormSet = forms.formset_factory(
+    CheckoutLineForm,
+    formset=BaseCheckoutFormSet,
+    extra=5,
+    max_num=200,
+    validate_max=True,
+    min_num=1,
+    validate_min=True,
+)
+
+
 class StockLevelFilterForm(forms.Form):
     """
     A simple form allowing users to filter products by:
     - Partial/Full Name
     - Supplier
-    - Minimum Stock
+    - Minimum / Maximum Stock
+    - Stock at or below the product's reorder point
+    - Maximum days of cover (see core/forecasting.py)
+    - Location (stock filters then apply to that location's stock)
+    and to sort by stock or by days of cover.
     """
 
+    SORT_CHOICES = (
+        ("stock", "Lowest stock first"),
+        ("cover", "Fewest days of cover first"),
+    )
+
     name = forms.CharField(
         required=False,
         label="Product Name",
         widget=forms.TextInput(attrs={"placeholder": "e.g. iPhone"}),
     )
-    supplier = forms.ModelChoiceField(
+    supplier = CachedModelChoiceField(
         queryset=Supplier.objects.all(),
         required=False,
         label="Supplier",
@@ -164,3 +429,60 @@ class StockLevelFilterForm(forms.Form):
         min_value=0,
         widget=forms.NumberInput(attrs={"placeholder": "e.g. 10"}),
     )
+    max_stock = forms.IntegerField(
+        required=False,
+        label="Maximum Stock",
+        min_value=0,
+        widget=forms.NumberInput(attrs={"placeholder": "e.g. 100"}),
+    )
+    below_reorder_point = forms.BooleanField(
+        required=False, label="Only items at or below reorder point"
+    )
+    max_days_of_cover = forms.FloatField(
+        required=False,
+        label="Max Days of Cover",
+        min_value=0,
+        widget=forms.NumberInput(attrs={"placeholder": "e.g. 14"}),
+    )
+    sort = forms.ChoiceField(choices=SORT_CHOICES, required=False, label="Sort")
+    location = CachedModelChoiceField(
+        queryset=Location.objects.all(),
+        required=False,
+        label="Location",
+        empty_label="-- All Locations --",
+    )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        min_stock = cleaned_data.get("min_stock")
+        max_stock = cleaned_data.get("max_stock")
+        if min_stock is not None and max_stock is not None and min_stock > max_stock:
+            raise forms.ValidationError(
+                "Minimum stock cannot be greater than maximum stock."
+            )
+        return cleaned_data
+
+    def cache_key(self):
+        """
+        A stable key for the cleaned filters, independent of parameter order,
+        blank values or formatting differences such as '010' vs '10'.
+        """
+        data = self.cleaned_data
+        supplier = data.get("supplier")
+        location = data.get("location")
+        parts = [
+            ("name", (data.get("name") or "").strip().lower()),
+            ("supplier", supplier.pk if supplier else ""),
+            ("min", "" if data.get("min_stock") is None else data["min_stock"]),
+            ("max", "" if data.get("max_stock") is None else data["max_stock"]),
+            ("reorder", int(bool(data.get("below_reorder_point")))),
+            (
+                "cover",
+                ""
+                if data.get("max_days_of_cover") is None
+                else data["max_days_of_cover"],
+            ),
+            ("sort", data.get("sort") or "stock"),
+            ("location", location.pk if location else ""),
+        ]
+        return "&".join(f"{key}={value}" for key, value in parts)
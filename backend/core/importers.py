@@ -0,0 +1,216 @@
+# core/importers.py
+"""
+Streaming catalogue import for products and suppliers.
+
+Rows are read lazily from CSV or JSON-lines files and processed in batches of
+``batch_size``: each batch is validated with the same rules as the add forms,
+checked for duplicates with one set-based query per unique field, and written
+with ``bulk_create``. Only the current batch is held in memory.
+"""
+import csv
+import json
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+
+from . import choices, ledger, reorder, search, services, versioning
+from .forms import ProductImportForm, SupplierImportForm
+from .models import LowercaseKeyField, Product, Supplier
+
+DEFAULT_BATCH_SIZE = 500
+
+RowError = namedtuple("RowError", ["row", "field", "message"])
+
+
+def iter_rows(fileobj, fmt):
+    """Yield one dict per record from a text file in 'csv' or 'jsonl' format."""
+    if fmt == "csv":
+        yield from csv.DictReader(fileobj)
+    elif fmt == "jsonl":
+        for line in fileobj:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else {}
+    else:
+        raise ValueError(f"Unsupported import format: {fmt!r}")
+
+
+def guess_format(filename):
+    """Pick the format from a file name, defaulting to CSV."""
+    if filename.lower().endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    return "csv"
+
+
+class CatalogImporter:
+    """
+    Import rows for one model. Rejected rows are yielded as RowError tuples
+    while the import runs; ``created`` counts the rows written so far.
+    """
+
+    def __init__(self, kind, batch_size=DEFAULT_BATCH_SIZE):
+        if kind not in ("product", "supplier"):
+            raise ValueError(f"Unknown catalogue kind: {kind!r}")
+        self.kind = kind
+        self.batch_size = max(1, batch_size)
+        self.created = 0
+
+    def run(self, rows):
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            batch.append((number, row))
+            if len(batch) >= self.batch_size:
+                yield from self._import_batch(batch)
+                batch = []
+        if batch:
+            yield from self._import_batch(batch)
+
+    # ----- batch processing -----
+
+    def _import_batch(self, batch):
+        errors = []
+        valid = []
+        for number, form in self._validate(batch):
+            if form.is_valid():
+                valid.append((number, form))
+            else:
+                for field, messages in form.errors.items():
+                    errors.extend(RowError(number, field, m) for m in messages)
+
+        valid, duplicates = self._drop_duplicates(valid)
+        yield from sorted(errors + duplicates)
+
+        instances = [(number, self._build(form)) for number, form in valid]
+        yield from self._write(instances)
+
+    def _validate(self, batch):
+        if self.kind == "product":
+            supplier_ids = set()
+            for _number, row in batch:
+                try:
+                    supplier_ids.add(int(row.get("supplier")))
+                except (TypeError, ValueError):
+                    pass
+            known = set(
+                Supplier.objects.filter(pk__in=supplier_ids).values_list(
+                    "pk", flat=True
+                )
+            )
+            return [
+                (number, ProductImportForm(row, known_suppliers=known))
+                for number, row in batch
+            ]
+        return [(number, SupplierImportForm(row)) for number, row in batch]
+
+    def _unique_fields(self):
+        """(field, column holding its unique value, friendly message) per unique field."""
+        if self.kind == "product":
+            return [("name", "name_key", "A product with this name already exists.")]
+        return [
+            ("email", "email_key", "A supplier with this email already exists."),
+            ("phone", "phone", "A supplier with this phone already exists."),
+        ]
+
+    def _drop_duplicates(self, valid):
+        """
+        Reject rows that collide with existing records or with an earlier row
+        in the same batch, using one indexed query per unique field for the
+        batch. Names and emails compare by their lower-cased key columns.
+        """
+        model = Product if self.kind == "product" else Supplier
+        duplicates = []
+        for field, column, message in self._unique_fields():
+            # LowercaseKeyField columns hold normalized values
+            normalize = getattr(model._meta.get_field(column), "normalize", None)
+
+            def key(form):
+                value = form.cleaned_data[field]
+                return normalize(value) if normalize else value
+
+            keys = {key(form) for _number, form in valid}
+            existing = set(
+                model.objects.filter(**{f"{column}__in": keys}).values_list(
+                    column, flat=True
+                )
+            )
+
+            kept = []
+            for number, form in valid:
+                value = key(form)
+                if value in existing:
+                    duplicates.append(RowError(number, field, message))
+                else:
+                    existing.add(value)
+                    kept.append((number, form))
+            valid = kept
+        return valid, duplicates
+
+    def _build(self, form):
+        instance = form.instance
+        if self.kind == "product":
+            instance.supplier_id = form.cleaned_data["supplier"]
+        return instance
+
+    def _write(self, instances):
+        if not instances:
+            return
+        model = Product if self.kind == "product" else Supplier
+        try:
+            # The rows and their ledger, levels and alerts commit together.
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [instance for _number, instance in instances],
+                    batch_size=self.batch_size,
+                )
+                self._reindex(instances)
+            self.created += len(instances)
+            versioning.bump_on_commit(self.kind, choices.version_name(model))
+            return
+        except IntegrityError:
+            pass
+
+        # A concurrent writer beat us to some row: retry one by one so only
+        # the conflicting rows are rejected.
+        for number, instance in instances:
+            try:
+                with transaction.atomic():
+                    instance.save(force_insert=True)
+            except IntegrityError as exc:
+                yield RowError(number, "__all__", str(exc))
+            else:
+                self.created += 1
+                if not search.uses_fts():
+                    search.index_object(instance)
+
+    def _reindex(self, instances):
+        """
+        bulk_create skips post_save, so open the new products' stock ledgers
+        and stock levels, check them against their reorder points and update
+        the trigram index. The new rows are found through the index on their
+        lower-cased unique key. SQLite's FTS triggers need no reindexing.
+        """
+        if self.kind == "product":
+            keys = [
+                LowercaseKeyField.normalize(instance.name)
+                for _number, instance in instances
+            ]
+            created = Product.objects.filter(name_key__in=keys)
+            opened = list(created.only("pk", "stock_quantity"))
+            ledger.open_snapshots(opened)
+            services.open_stock_levels(opened)
+            reorder.evaluate_queryset(created)
+        if search.uses_fts():
+            return
+        if self.kind == "product":
+            search.rebuild(Product, created)
+        else:
+            keys = [
+                LowercaseKeyField.normalize(instance.email)
+                for _number, instance in instances
+            ]
+            search.rebuild(Supplier, Supplier.objects.filter(email_key__in=keys))
@@ -0,0 +1,194 @@
+# core/ledger.py
+"""
+Stock computed from the StockMovement ledger.
+
+StockMovement rows are only ever appended. A product's stock is its latest
+StockSnapshot plus the net of its movements after that snapshot's
+``last_movement_id``; ``as_of(date)`` does the same with the latest snapshot
+on or before ``date`` and the movements dated up to it. Every product gets
+an opening snapshot when it is created, and ``snapshot()`` (run nightly via
+``manage.py snapshot_stock``) writes a new one for every product that moved,
+so a read only ever sums the movements since the last run, however long the
+history.
+
+``Product.stock_quantity`` is kept as a cache of the same figure: the stock
+service updates it in the transaction that appends the movement. Transfers
+between locations count for nothing here, as they leave the total alone.
+The StockLevel rows of a product's locations must add up to it as well.
+``check()`` lists products whose counter or location total disagrees with
+the ledger (e.g. after a raw SQL fix) and ``rebuild_counters()`` resets the
+counters from it.
+"""
+import datetime
+
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from . import reorder, versioning
+from .models import Product, StockLevel, StockMovement, StockSnapshot
+
+
+def _signed_quantity():
+    return Case(
+        When(movement_type="In", then=F("quantity")),
+        When(movement_type="Out", then=-F("quantity")),
+        # Transfers move stock between locations without changing the total
+        default=0,
+        output_field=IntegerField(),
+    )
+
+
+def with_ledger_stock(queryset, date=None):
+    """
+    Annotate a Product queryset with ``ledger_stock``: stock now, or at the
+    end of ``date``. One query, with two correlated subqueries per product.
+    """
+    snapshots = StockSnapshot.objects.filter(product=OuterRef("pk"))
+    if date is not None:
+        snapshots = snapshots.filter(date__lte=date)
+    latest = snapshots.order_by("-date", "-last_movement_id")
+    queryset = queryset.annotate(
+        snapshot_quantity=Coalesce(Subquery(latest.values("quantity")[:1]), 0),
+        snapshot_mark=Coalesce(Subquery(latest.values("last_movement_id")[:1]), 0),
+    )
+
+    later = StockMovement.objects.filter(
+        product=OuterRef("pk"), pk__gt=OuterRef("snapshot_mark")
+    )
+    if date is not None:
+        later = later.filter(movement_date__lte=date)
+    net = later.values("product").annotate(net=Sum(_signed_quantity())).values("net")
+    return queryset.annotate(
+        ledger_stock=F("snapshot_quantity")
+        + Coalesce(Subquery(net, output_field=IntegerField()), 0)
+    )
+
+
+def stock(product_ids):
+    """{product_id: current stock according to the ledger}."""
+    return dict(
+        with_ledger_stock(Product.objects.filter(pk__in=list(product_ids)))
+        .values_list("pk", "ledger_stock")
+    )
+
+
+def as_of(date, product_ids=None):
+    """{product_id: stock at the end of ``date``}, for all products by default."""
+    products = Product.objects.all()
+    if product_ids is not None:
+        products = products.filter(pk__in=list(product_ids))
+    return dict(with_ledger_stock(products, date).values_list("pk", "ledger_stock"))
+
+
+def open_snapshots(products, using=None):
+    """Opening snapshots for new products: the stock they were created with."""
+    today = datetime.date.today()
+    StockSnapshot.objects.using(using).bulk_create(
+        StockSnapshot(product_id=product.pk, date=today, quantity=product.stock_quantity)
+        for product in products
+    )
+
+
+def _chunks(chunk_size):
+    product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+    last_id = 0
+    while True:
+        chunk = list(product_ids.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1]
+        yield chunk
+
+
+def snapshot(date=None, chunk_size=1000):
+    """
+    Snapshot every product with movements since its last snapshot, as of the
+    end of ``date`` (default yesterday, when no more movements can arrive for
+    it). Returns the number of snapshots written.
+    """
+    if date is None:
+        date = datetime.date.today() - datetime.timedelta(days=1)
+    last_movement = (
+        StockMovement.objects.filter(product=OuterRef("pk"), movement_date__lte=date)
+        .values("product")
+        .annotate(mark=Max("pk"))
+        .values("mark")
+    )
+    written = 0
+    for chunk in _chunks(chunk_size):
+        rows = (
+            with_ledger_stock(Product.objects.filter(pk__in=chunk), date)
+            .annotate(mark=Subquery(last_movement))
+            .filter(mark__gt=F("snapshot_mark"))
+            .values_list("pk", "ledger_stock", "mark")
+        )
+        created = StockSnapshot.objects.bulk_create(
+            StockSnapshot(product_id=pk, date=date, quantity=quantity, last_movement_id=mark)
+            for pk, quantity, mark in rows
+        )
+        written += len(created)
+    return written
+
+
+def check(chunk_size=1000):
+    """
+    Yield ``(product_id, counter, ledger, levels)`` for every product whose
+    ``stock_quantity`` counter or StockLevel total (``levels``, over all
+    locations) disagrees with its ledger stock.
+    """
+    levels = (
+        StockLevel.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    for chunk in _chunks(chunk_size):
+        yield from (
+            with_ledger_stock(Product.objects.filter(pk__in=chunk))
+            .annotate(
+                level_stock=Coalesce(Subquery(levels, output_field=IntegerField()), 0)
+            )
+            .filter(
+                ~Q(stock_quantity=F("ledger_stock")) | ~Q(level_stock=F("ledger_stock"))
+            )
+            .values_list("pk", "stock_quantity", "ledger_stock", "level_stock")
+        )
+
+
+def rebuild_counters(chunk_size=1000):
+    """
+    Reset drifted ``Product.stock_quantity`` counters from the ledger, one
+    UPDATE per chunk. Returns the number of products corrected.
+    """
+    corrected = 0
+    for chunk in _chunks(chunk_size):
+        with transaction.atomic():
+            products = Product.objects.select_for_update().filter(pk__in=chunk)
+            drifted = dict(
+                with_ledger_stock(products)
+                .exclude(stock_quantity=F("ledger_stock"))
+                .values_list("pk", "ledger_stock")
+            )
+            if not drifted:
+                continue
+            Product.objects.filter(pk__in=list(drifted)).update(
+                stock_quantity=Case(
+                    *[When(pk=pk, then=quantity) for pk, quantity in drifted.items()],
+                    output_field=IntegerField(),
+                )
+            )
+            versioning.bump_on_commit("product")
+            reorder.evaluate(list(drifted))
+        corrected += len(drifted)
+    return corrected
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyStockBalance rollup from the StockMovement ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Products aggregated per chunk (default: 1000).",
+        )
+        parser.add_argument(
+            "--since",
+            help="Only rebuild days on or after this date (YYYY-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        written = rollups.rebuild(
+            chunk_size=options["chunk_size"], since=options["since"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote {written} daily balance row(s).")
+        )
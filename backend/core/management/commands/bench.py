@@ -0,0 +1,138 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from core import benchmark
+
+DEFAULT_BUDGETS = Path(benchmark.__file__).with_name("bench_budgets.json")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a deterministic data set, time every core view and fail if any "
+        "exceeds its query-count or latency budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            choices=sorted(benchmark.SCALES),
+            default="small",
+            help="Preset data volumes (default: small).",
+        )
+        for name in ("suppliers", "products", "orders", "movements"):
+            parser.add_argument(
+                f"--{name}", type=int, help=f"Override the number of {name}."
+            )
+        parser.add_argument(
+            "--days", type=int, default=365, help="Spread seeded dates over N days."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--cold-cache",
+            action="store_true",
+            help="Clear the cache before every request.",
+        )
+        parser.add_argument(
+            "--only", nargs="+", help="Run only these scenario names."
+        )
+        parser.add_argument(
+            "--budgets",
+            default=str(DEFAULT_BUDGETS),
+            help="JSON file of per-scenario budgets.",
+        )
+        parser.add_argument(
+            "--write-budgets",
+            action="store_true",
+            help="Store this run's query counts (and p95 x 2) as the new budgets.",
+        )
+        parser.add_argument(
+            "--use-current-db",
+            action="store_true",
+            help="Seed and run against the configured database instead of a "
+            "throwaway test database.",
+        )
+
+    def handle(self, *args, **options):
+        volumes = dict(benchmark.SCALES[options["scale"]])
+        for name in volumes:
+            if options[name] is not None:
+                volumes[name] = options[name]
+
+        try:
+            setup_test_environment()
+            own_environment = True
+        except RuntimeError:
+            # Already inside a test run.
+            own_environment = False
+
+        old_config = None
+        if not options["use_current_db"]:
+            old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = self._bench(volumes, options)
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+            if own_environment:
+                teardown_test_environment()
+
+        self._report(results)
+        self._enforce(results, options)
+
+    def _bench(self, volumes, options):
+        benchmark.seed(
+            days=options["days"],
+            seed=options["seed"],
+            log=lambda message: self.stdout.write(message),
+            **volumes,
+        )
+        scenarios = benchmark.build_scenarios()
+        missing = benchmark.uncovered_urls(scenarios)
+        if missing:
+            self.stderr.write(f"No scenario for: {', '.join(missing)}")
+        return benchmark.run(
+            scenarios,
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            cold_cache=options["cold_cache"],
+            only=options["only"],
+        )
+
+    def _report(self, results):
+        width = max((len(r.name) for r in results), default=10)
+        self.stdout.write(
+            f"{'scenario'.ljust(width)}  {'p50 ms':>9}  {'p95 ms':>9}  {'queries':>7}"
+        )
+        for r in results:
+            self.stdout.write(
+                f"{r.name.ljust(width)}  {r.p50_ms:>9.2f}  {r.p95_ms:>9.2f}  {r.queries:>7}"
+            )
+
+    def _enforce(self, results, options):
+        path = Path(options["budgets"])
+        if options["write_budgets"]:
+            budgets = {
+                r.name: {"queries": r.queries, "p95_ms": round(r.p95_ms * 2, 1)}
+                for r in results
+            }
+            path.write_text(json.dumps(budgets, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote budgets to {path}"))
+            return
+
+        if not path.exists():
+            self.stdout.write(f"No budget file at {path}; nothing enforced.")
+            return
+        failures = benchmark.check_budgets(results, json.loads(path.read_text()))
+        if failures:
+            raise CommandError("Budget exceeded:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("All scenarios within budget."))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import stockqueue
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply queued 'In' movements (STOCK_QUEUE) in batches. Exits once the "
+        "queue is empty unless --forever is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Movements applied per transaction (default: STOCK_QUEUE['BATCH_SIZE']).",
+        )
+        parser.add_argument(
+            "--forever",
+            action="store_true",
+            help="Keep polling the queue instead of exiting when it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between polls of an empty queue (default: 1).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            applied = stockqueue.drain_all(options["batch_size"])
+            if applied:
+                self.stdout.write(f"Applied {applied} queued movement(s).")
+            if not options["forever"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS("Stock queue is empty."))
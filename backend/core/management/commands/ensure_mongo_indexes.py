@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import mongo
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the MongoDB indexes used by the native list and stock level "
+        "pipelines (core/mongo.py). Only for the djongo backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database", default="default", help="Database alias (default: default)."
+        )
+
+    def handle(self, *args, **options):
+        if not mongo.is_active(options["database"]):
+            raise CommandError("The database is not a djongo (MongoDB) database.")
+        names = mongo.ensure_indexes(mongo.get_database(options["database"]))
+        self.stdout.write(self.style.SUCCESS(f"Ensured {len(names)} index(es)."))
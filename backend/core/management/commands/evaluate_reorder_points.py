@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core import reorder
+from core.models import ReorderAlert
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-check every product against its reorder point and open/resolve "
+        "alerts. Only needed after loads that bypass the stock service."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Products checked per query (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        checked = reorder.evaluate_all(chunk_size=options["chunk_size"])
+        open_alerts = ReorderAlert.objects.filter(state=ReorderAlert.OPEN).count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Checked {checked} product(s); {open_alerts} need reordering."
+            )
+        )
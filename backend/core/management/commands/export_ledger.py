@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import exporters, routing
+from core.forms import LedgerExportForm
+
+
+class Command(BaseCommand):
+    help = "Stream stock movements or sale orders to CSV or JSON lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=["movements", "orders"])
+        parser.add_argument("--format", default="csv", choices=["csv", "jsonl"])
+        parser.add_argument(
+            "--search", default="", help="Product name filter (movements)."
+        )
+        parser.add_argument(
+            "--status", default="All", help="Order status filter (orders)."
+        )
+        parser.add_argument("--from", dest="date_from", help="YYYY-MM-DD")
+        parser.add_argument("--to", dest="date_to", help="YYYY-MM-DD")
+        parser.add_argument(
+            "--output", help="Write to this file instead of stdout."
+        )
+
+    def handle(self, *args, **options):
+        form = LedgerExportForm(
+            {
+                "search": options["search"],
+                "status": options["status"],
+                "date_from": options["date_from"],
+                "date_to": options["date_to"],
+                "format": options["format"],
+            }
+        )
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        # A long report: read it from a replica when there is one
+        with routing.reading_from_replica():
+            self.export(options, form.cleaned_data)
+
+    def export(self, options, data):
+        if options["kind"] == "movements":
+            header, rows = exporters.stock_movement_rows(
+                data["search"], data["date_from"], data["date_to"]
+            )
+        else:
+            header, rows = exporters.sale_order_rows(
+                data["status"], data["date_from"], data["date_to"]
+            )
+        encode, _content_type = exporters.FORMATS[data["format"]]
+
+        if not options["output"]:
+            for line in encode(header, rows):
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", encoding="utf-8", newline="") as out:
+            for line in encode(header, rows):
+                out.write(line)
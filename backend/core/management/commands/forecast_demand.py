@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import forecasting
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every product's demand forecast and days of cover from the "
+        "stock and sales rollups. Meant to run nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window",
+            type=int,
+            default=forecasting.WINDOW_DAYS,
+            help=f"Days of history to use (default: {forecasting.WINDOW_DAYS}).",
+        )
+        parser.add_argument(
+            "--alpha",
+            type=float,
+            default=forecasting.ALPHA,
+            help=f"Exponential smoothing factor (default: {forecasting.ALPHA}).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Products processed per batch (default: 5000).",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options["alpha"] <= 1:
+            raise CommandError("--alpha must be in (0, 1].")
+        try:
+            count = forecasting.run(
+                window=options["window"],
+                alpha=options["alpha"],
+                chunk_size=options["chunk_size"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Forecast {count} product(s)."))
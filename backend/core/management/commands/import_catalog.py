@@ -0,0 +1,72 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import DEFAULT_BATCH_SIZE, CatalogImporter, guess_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Stream products or suppliers from a CSV or JSON-lines file into the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            "--kind",
+            choices=["product", "supplier"],
+            default="product",
+            help="What the file contains (default: product).",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="File format (default: guessed from the file name).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Rows validated and inserted per batch (default: {DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--report",
+            help="Write rejected rows to this CSV file instead of stderr.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        importer = CatalogImporter(options["kind"], options["batch_size"])
+
+        try:
+            source = sys.stdin if path == "-" else open(
+                path, encoding="utf-8-sig", errors="replace", newline=""
+            )
+        except OSError as exc:
+            raise CommandError(f"Cannot open {path}: {exc}")
+
+        report_file = (
+            open(options["report"], "w", encoding="utf-8", newline="")
+            if options["report"]
+            else self.stderr
+        )
+        report = csv.writer(report_file)
+        report.writerow(["row", "field", "message"])
+
+        rejected = 0
+        try:
+            for error in importer.run(iter_rows(source, fmt)):
+                rejected += 1
+                report.writerow(error)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if options["report"]:
+                report_file.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {importer.created} {options['kind']}(s); "
+                f"{rejected} error(s)."
+            )
+        )
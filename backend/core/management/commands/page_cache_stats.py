@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import pagecache
+
+
+class Command(BaseCommand):
+    help = "Print page cache hit/miss counts per view."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Zero the counters afterwards."
+        )
+
+    def handle(self, *args, **options):
+        # Views register themselves with the page cache on import.
+        from core import views  # noqa: F401
+
+        if not pagecache.stats_are_shared():
+            raise CommandError(
+                "The page cache uses local memory, so the counters live in each "
+                "server process and this command cannot see them. Set "
+                "PAGE_CACHE_BACKEND=file or point the 'pages' cache at memcached "
+                "or redis."
+            )
+        total_hits = total_misses = 0
+        self.stdout.write(f"{'view':<24}{'hits':>10}{'misses':>10}{'hit rate':>10}")
+        for name, counts in pagecache.stats().items():
+            hits, misses = counts["hits"], counts["misses"]
+            total_hits += hits
+            total_misses += misses
+            self.stdout.write(f"{name:<24}{hits:>10}{misses:>10}{_rate(hits, misses):>10}")
+        self.stdout.write(
+            f"{'total':<24}{total_hits:>10}{total_misses:>10}"
+            f"{_rate(total_hits, total_misses):>10}"
+        )
+        if options["reset"]:
+            pagecache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
+
+
+def _rate(hits, misses):
+    requests = hits + misses
+    return f"{100 * hits / requests:.1f}%" if requests else "-"
@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the daily sales rollups behind the home dashboard from "
+        "SaleOrder and SaleOrderLine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Products (and categories) rebuilt per transaction (default: 1000).",
+        )
+        parser.add_argument(
+            "--since",
+            help="Only rebuild order dates from this day on (YYYY-MM-DD).",
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            try:
+                since = datetime.date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since must be a date in YYYY-MM-DD format.")
+        written = sales.rebuild(since=since, chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} rollup row(s)."))
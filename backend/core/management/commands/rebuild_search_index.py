@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import search
+from core.models import Product, Supplier
+
+
+class Command(BaseCommand):
+    help = "Recreate the product/supplier search index from scratch."
+
+    def handle(self, *args, **options):
+        if search.uses_fts():
+            with connection.schema_editor() as schema_editor:
+                search.install_fts(schema_editor)
+        else:
+            for model in (Product, Supplier):
+                search.rebuild(model)
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
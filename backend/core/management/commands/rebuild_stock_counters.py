@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Reset Product.stock_quantity from the stock ledger wherever the two "
+        "disagree."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Products checked per query (default: 1000).",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the products whose counter or location total has drifted.",
+        )
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            drifted = 0
+            for product_id, counter, stock, levels in ledger.check(
+                options["chunk_size"]
+            ):
+                drifted += 1
+                self.stdout.write(
+                    f"Product #{product_id}: counter {counter}, ledger {stock}, "
+                    f"locations {levels}"
+                )
+            self.stdout.write(f"{drifted} product(s) differ from the ledger.")
+            return
+        corrected = ledger.rebuild_counters(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Corrected {corrected} counter(s)."))
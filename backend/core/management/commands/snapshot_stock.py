@@ -0,0 +1,34 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot the stock of every product that moved since its last "
+        "snapshot, so ledger reads only sum the movements after it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Snapshot as of the end of this day (YYYY-MM-DD; default: yesterday).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Products snapshotted per query (default: 1000).",
+        )
+
+    def handle(self, *args, **options):
+        date = None
+        if options["date"]:
+            try:
+                date = datetime.date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("--date must be a date in YYYY-MM-DD format.")
+        written = ledger.snapshot(date=date, chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} snapshot(s)."))
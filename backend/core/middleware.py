@@ -0,0 +1,161 @@
+# core/middleware.py
+"""
+Opt-in per-request SQL instrumentation.
+
+Enable with ``SQL_INSTRUMENTATION["ENABLED"] = True`` (or the
+``SQL_INSTRUMENTATION=1`` environment variable, see settings.py). Every query
+is timed through ``connection.execute_wrapper`` without needing DEBUG. Each
+response gets a ``Server-Timing`` header, and one structured log line is
+written to the ``core.sql`` logger with the query count, total DB time, the
+slowest statements and any query shape repeated often enough to look like an
+N+1.
+
+Streaming responses run most of their queries while the body is sent, after
+the headers: they get no ``Server-Timing`` header, and their log line is
+written when the stream closes so it counts the body's queries too.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("core.sql")
+
+DEFAULTS = {
+    "ENABLED": False,
+    # How many of the slowest statements to report
+    "SLOW_QUERIES": 3,
+    # A query shape seen this many times in one request is flagged as N+1
+    "N_PLUS_ONE_THRESHOLD": 5,
+    # Truncate logged SQL to this many characters
+    "MAX_SQL_LENGTH": 300,
+}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)|\((?:\s*%s\s*,)+\s*%s\s*\)")
+
+
+def query_shape(sql):
+    """SQL with literals and IN-lists collapsed, so N+1 variants compare equal."""
+    shape = _LITERALS.sub("?", sql)
+    return _IN_LISTS.sub("(...)", shape)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "SQL_INSTRUMENTATION", {}))
+    return config
+
+
+class QueryRecorder:
+    """
+    Context manager recording every query on every database connection.
+    """
+
+    def __init__(self):
+        self.queries = []  # (alias, sql, duration in seconds)
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(
+                connection.execute_wrapper(self._wrapper(connection.alias))
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stack.__exit__(*exc_info)
+
+    def _wrapper(self, alias):
+        def record(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                self.queries.append((alias, sql, time.perf_counter() - start))
+
+        return record
+
+    @property
+    def total_time(self):
+        return sum(duration for _alias, _sql, duration in self.queries)
+
+    def slowest(self, count):
+        return sorted(self.queries, key=lambda q: q[2], reverse=True)[:count]
+
+    def repeated_shapes(self, threshold):
+        """[(count, shape)] for shapes seen at least ``threshold`` times."""
+        shapes = Counter(query_shape(sql) for _alias, sql, _duration in self.queries)
+        return [
+            (count, shape)
+            for shape, count in shapes.most_common()
+            if count >= threshold
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.config = get_config()
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        recorder = QueryRecorder()
+        with recorder:
+            response = self.get_response(request)
+
+        if response.streaming and getattr(response, "file_to_stream", None) is None:
+            response.streaming_content = self._record_stream(
+                response.streaming_content, request, response, recorder, start
+            )
+            return response
+
+        total = time.perf_counter() - start
+        db_ms = recorder.total_time * 1000
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{len(recorder.queries)} queries", '
+            f"total;dur={total * 1000:.1f}"
+        )
+        self._log(request, response, recorder, db_ms, total * 1000)
+        return response
+
+    def _record_stream(self, content, request, response, recorder, start):
+        """Yield ``content`` with ``recorder`` active, then log the whole request."""
+        try:
+            with recorder:
+                yield from content
+        finally:
+            total_ms = (time.perf_counter() - start) * 1000
+            self._log(request, response, recorder, recorder.total_time * 1000, total_ms)
+
+    def _log(self, request, response, recorder, db_ms, total_ms):
+        limit = self.config["MAX_SQL_LENGTH"]
+        suspects = recorder.repeated_shapes(self.config["N_PLUS_ONE_THRESHOLD"])
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": len(recorder.queries),
+            "db_ms": round(db_ms, 2),
+            "total_ms": round(total_ms, 2),
+            "slowest": [
+                {"db": alias, "ms": round(duration * 1000, 2), "sql": sql[:limit]}
+                for alias, sql, duration in recorder.slowest(
+                    self.config["SLOW_QUERIES"]
+                )
+            ],
+            "n_plus_one": [
+                {"count": count, "sql": shape[:limit]} for count, shape in suspects
+            ],
+        }
+        level = logging.WARNING if suspects else logging.INFO
+        logger.log(level, json.dumps(record), extra={"sql_stats": record})
@@ -0,0 +1,31 @@
+# Generated by Django 3.2 on 2026-10-18 03:15
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_auto_20250107_0458'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='saleorder',
+            name='product',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.product'),
+        ),
+        migrations.CreateModel(
+            name='SaleOrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('unit_price', core.models.CustomDecimalField(decimal_places=2, max_digits=10)),
+                ('line_total', core.models.CustomDecimalField(decimal_places=2, max_digits=10)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='core.saleorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_saleorderline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleorder',
+            index=models.Index(fields=['status', 'id'], name='core_saleor_status_a3198c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['movement_date', 'id'], name='core_stockm_movemen_285fe7_idx'),
+        ),
+    ]
@@ -0,0 +1,107 @@
+# Generated by Django 3.2 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+# The search DDL is frozen here rather than imported from core.search, so
+# later edits to that module cannot change what this migration (and the
+# migrations that reinstall the triggers after a table rebuild) executed.
+FTS_TABLES = (
+    ("core_product_fts", "core_product", ("name",)),
+    ("core_supplier_fts", "core_supplier", ("name", "email")),
+)
+
+
+def trigrams(text):
+    text = (text or "").lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def fts_statements(table, source, fields):
+    cols = ", ".join(fields)
+    new_vals = ", ".join(f"new.{f}" for f in fields)
+    old_vals = ", ".join(f"old.{f}" for f in fields)
+    delete = (
+        f"INSERT INTO {table}({table}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_vals});"
+    )
+    insert = f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_vals});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} "
+        f"ON {source} BEGIN {delete} {insert} END",
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+def install_fts(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table, source, fields in FTS_TABLES:
+        for statement in fts_statements(table, source, fields):
+            schema_editor.execute(statement)
+
+
+def uninstall_fts(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table, _source, _fields in FTS_TABLES:
+        for suffix in ("_ai", "_ad", "_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def install_search(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        install_fts(schema_editor)
+        return
+    # Populate the trigram index for existing rows.
+    SearchTrigram = apps.get_model("core", "SearchTrigram")
+    db_alias = schema_editor.connection.alias
+    for model_name, fields in (("product", ["name"]), ("supplier", ["name", "email"])):
+        model = apps.get_model("core", model_name)
+        for obj in model.objects.using(db_alias).only("pk", *fields).iterator():
+            grams = set()
+            for field in fields:
+                grams |= trigrams(getattr(obj, field))
+            SearchTrigram.objects.using(db_alias).bulk_create(
+                SearchTrigram(model=model_name, object_id=obj.pk, trigram=g)
+                for g in grams
+            )
+
+
+def uninstall_search(apps, schema_editor):
+    uninstall_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('trigram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchtrigram',
+            index=models.Index(fields=['model', 'trigram', 'object_id'], name='core_search_model_b34fc1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchtrigram',
+            index=models.Index(fields=['model', 'object_id'], name='core_search_model_7ab1c7_idx'),
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
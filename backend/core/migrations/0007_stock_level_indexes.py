@@ -0,0 +1,36 @@
+# Generated by Django 3.2 on 2026-10-18 03:22
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+def reinstall_search(apps, schema_editor):
+    # Adding a column rebuilds core_product on SQLite, dropping its FTS triggers.
+    search_index = import_module("core.migrations.0005_search_index")
+
+    search_index.install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_dailystockbalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='reorder_point',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_quantity', 'id'], name='core_produc_stock_q_86ef8f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['supplier', 'stock_quantity', 'id'], name='core_produc_supplie_a87ebd_idx'),
+        ),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+    ]
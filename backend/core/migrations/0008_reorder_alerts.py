@@ -0,0 +1,102 @@
+# Generated by Django 3.2 on 2026-10-18 03:34
+
+from importlib import import_module
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Coalesce
+
+
+def reinstall_search(apps, schema_editor):
+    # Altering a column rebuilds core_product on SQLite, dropping its FTS triggers.
+    search_index = import_module("core.migrations.0005_search_index")
+
+    search_index.install_fts(schema_editor)
+
+
+def open_initial_alerts(apps, schema_editor):
+    Product = apps.get_model("core", "Product")
+    ReorderAlert = apps.get_model("core", "ReorderAlert")
+    db_alias = schema_editor.connection.alias
+    # 0 was the old "not set" default; blank now means "use the category default".
+    Product.objects.using(db_alias).filter(reorder_point=0).update(reorder_point=None)
+    low = (
+        Product.objects.using(db_alias).annotate(threshold=Coalesce("reorder_point", models.Value(0)))
+        .filter(stock_quantity__lte=models.F("threshold"))
+        .values_list("pk", "stock_quantity", "threshold")
+        .order_by("pk")
+    )
+    batch = []
+    for pk, stock_quantity, threshold in low.iterator():
+        batch.append(
+            ReorderAlert(product_id=pk, stock_quantity=stock_quantity, threshold=threshold)
+        )
+        if len(batch) == 1000:
+            ReorderAlert.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    ReorderAlert.objects.using(db_alias).bulk_create(batch)
+
+
+def restore_reorder_points(apps, schema_editor):
+    Product = apps.get_model("core", "Product")
+    db_alias = schema_editor.connection.alias
+    Product.objects.using(db_alias).filter(reorder_point=None).update(reorder_point=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_stock_level_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryReorderDefault',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(max_length=100, unique=True)),
+                ('reorder_point', models.PositiveIntegerField(default=0)),
+                ('safety_stock', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReorderAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.CharField(choices=[('Open', 'Open'), ('Resolved', 'Resolved')], default='Open', max_length=10)),
+                ('stock_quantity', models.IntegerField()),
+                ('threshold', models.IntegerField()),
+                ('opened_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='safety_stock',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='reorder_point',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'id'], name='core_produc_categor_f0a090_idx'),
+        ),
+        migrations.AddField(
+            model_name='reorderalert',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reorder_alerts', to='core.product'),
+        ),
+        migrations.AddIndex(
+            model_name='reorderalert',
+            index=models.Index(fields=['state', 'id'], name='core_reorde_state_b7918b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reorderalert',
+            constraint=models.UniqueConstraint(condition=models.Q(state='Open'), fields=('product',), name='one_open_reorder_alert'),
+        ),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+        migrations.RunPython(open_initial_alerts, restore_reorder_points),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2 on 2026-10-18 03:37
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_reorder_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', core.models.CustomDecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('completed_orders', models.IntegerField(default=0)),
+                ('completed_quantity', models.IntegerField(default=0)),
+                ('completed_revenue', core.models.CustomDecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cancelled_orders', models.IntegerField(default=0)),
+                ('cancelled_quantity', models.IntegerField(default=0)),
+                ('cancelled_revenue', core.models.CustomDecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', core.models.CustomDecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('completed_orders', models.IntegerField(default=0)),
+                ('completed_quantity', models.IntegerField(default=0)),
+                ('completed_revenue', core.models.CustomDecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cancelled_orders', models.IntegerField(default=0)),
+                ('cancelled_quantity', models.IntegerField(default=0)),
+                ('cancelled_revenue', core.models.CustomDecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='dailycategorysales',
+            index=models.Index(fields=['date', 'category'], name='core_dailyc_date_721029_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('category', 'date'), name='unique_daily_category_sales'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductsales',
+            index=models.Index(fields=['date', 'product'], name='core_dailyp_date_d58939_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('product', 'date'), name='unique_daily_product_sales'),
+        ),
+    ]
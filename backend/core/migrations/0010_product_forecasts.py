@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 03:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='core.product')),
+                ('average_daily_demand', models.FloatField(default=0)),
+                ('recent_daily_demand', models.FloatField(default=0)),
+                ('smoothed_daily_demand', models.FloatField(default=0)),
+                ('trend', models.FloatField(default=0)),
+                ('days_of_cover', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='productforecast',
+            index=models.Index(fields=['days_of_cover', 'product'], name='core_produc_days_of_de82b9_idx'),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Store every amount of money as integer cents (core.models.MoneyField).
+
+from decimal import Decimal
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models.functions import Cast, Round
+
+import core.models
+
+# (model, field, max_digits, default)
+MONEY_FIELDS = [
+    ("product", "price", 10, None),
+    ("saleorder", "total_price", 10, None),
+    ("saleorderline", "unit_price", 10, None),
+    ("saleorderline", "line_total", 10, None),
+    ("dailyproductsales", "revenue", 14, 0),
+    ("dailyproductsales", "completed_revenue", 14, 0),
+    ("dailyproductsales", "cancelled_revenue", 14, 0),
+    ("dailycategorysales", "revenue", 14, 0),
+    ("dailycategorysales", "completed_revenue", 14, 0),
+    ("dailycategorysales", "cancelled_revenue", 14, 0),
+]
+
+
+def _defaults(default):
+    return {} if default is None else {"default": default}
+
+
+def to_cents(apps, schema_editor):
+    for model_name, name, _digits, _default in MONEY_FIELDS:
+        model = apps.get_model("core", model_name)
+        db_alias = schema_editor.connection.alias
+        cents = models.ExpressionWrapper(
+            models.F(name) * 100, output_field=models.DecimalField()
+        )
+        model.objects.using(db_alias).update(
+            **{f"{name}_cents": Cast(Round(cents), models.BigIntegerField())}
+        )
+
+
+def from_cents(apps, schema_editor):
+    for model_name, name, _digits, _default in MONEY_FIELDS:
+        model = apps.get_model("core", model_name)
+        model.objects.using(schema_editor.connection.alias).update(
+            **{
+                name: models.ExpressionWrapper(
+                    models.F(f"{name}_cents") * models.Value(Decimal("0.01")),
+                    output_field=models.DecimalField(),
+                )
+            }
+        )
+
+
+def reinstall_search(apps, schema_editor):
+    # Each step rebuilds core_product on SQLite, dropping its FTS triggers.
+    search_index = import_module("core.migrations.0005_search_index")
+
+    search_index.install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_product_forecasts'),
+    ]
+
+    operations = (
+        [
+            migrations.AddField(
+                model_name=model_name,
+                name=f"{name}_cents",
+                field=core.models.MoneyField(max_digits=digits, null=True),
+            )
+            for model_name, name, digits, _default in MONEY_FIELDS
+        ]
+        # Nullable so that re-adding the old columns on the way back works.
+        + [
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=core.models.CustomDecimalField(
+                    max_digits=digits, decimal_places=2, null=True, **_defaults(default)
+                ),
+            )
+            for model_name, name, digits, default in MONEY_FIELDS
+        ]
+        + [migrations.RunPython(to_cents, from_cents)]
+        + [
+            migrations.RemoveField(model_name=model_name, name=name)
+            for model_name, name, _digits, _default in MONEY_FIELDS
+        ]
+        + [
+            migrations.RenameField(
+                model_name=model_name, old_name=f"{name}_cents", new_name=name
+            )
+            for model_name, name, _digits, _default in MONEY_FIELDS
+        ]
+        + [
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=core.models.MoneyField(max_digits=digits, **_defaults(default)),
+            )
+            for model_name, name, digits, default in MONEY_FIELDS
+        ]
+        + [migrations.RunPython(reinstall_search, migrations.RunPython.noop)]
+    )
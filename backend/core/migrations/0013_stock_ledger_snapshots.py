@@ -0,0 +1,78 @@
+# Generated by Django 3.2 on 2026-10-18 03:56
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def open_ledger(apps, schema_editor):
+    """
+    Give every product an opening snapshot: its current stock minus the net
+    of all its movements, dated the day before its first movement, so the
+    ledger reproduces today's counters and earlier history.
+    """
+    Product = apps.get_model("core", "Product")
+    StockMovement = apps.get_model("core", "StockMovement")
+    StockSnapshot = apps.get_model("core", "StockSnapshot")
+    db_alias = schema_editor.connection.alias
+    signed = models.Case(
+        models.When(movement_type="In", then=models.F("quantity")),
+        default=-models.F("quantity"),
+    )
+    history = {
+        row["product_id"]: row
+        for row in StockMovement.objects.using(db_alias)
+        .values("product_id")
+        .annotate(net=models.Sum(signed), first=models.Min("movement_date"))
+        .order_by()
+    }
+    today = datetime.date.today()
+    batch = []
+    for pk, stock in Product.objects.using(db_alias).values_list("pk", "stock_quantity").iterator():
+        row = history.get(pk)
+        batch.append(
+            StockSnapshot(
+                product_id=pk,
+                date=row["first"] - datetime.timedelta(days=1) if row else today,
+                quantity=stock - (row["net"] if row else 0),
+                last_movement_id=0,
+            )
+        )
+        if len(batch) == 1000:
+            StockSnapshot.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    StockSnapshot.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_queued_stock_movements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('last_movement_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['product', 'id'], name='core_stockm_product_471523_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='core.product'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['product', 'date', 'last_movement_id'], name='core_stocks_product_5e56fe_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Enforce case-insensitive uniqueness of Product.name and Supplier.email in the
+# database, through lower-cased key columns (core.models.LowercaseKeyField).
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+import core.models
+
+# (model, source field, key field, max_length)
+KEYS = [
+    ("product", "name", "name_key", 100),
+    ("supplier", "email", "email_key", 254),
+]
+
+
+def fill_keys(apps, schema_editor):
+    """
+    Fill the key columns in Python, as LowercaseKeyField does on save (SQL
+    LOWER() only folds ASCII on SQLite), then refuse to continue if existing
+    rows differ only by case: which one to keep is for a person to decide.
+    """
+    db_alias = schema_editor.connection.alias
+    collisions = []
+    for model_name, source, key, _max_length in KEYS:
+        model = apps.get_model("core", model_name)
+        rows = model.objects.using(db_alias).only("pk", source).order_by("pk")
+        seen = {}
+        batch = []
+        for obj in rows.iterator():
+            value = core.models.LowercaseKeyField.normalize(getattr(obj, source))
+            setattr(obj, key, value)
+            seen.setdefault(value, []).append(obj.pk)
+            batch.append(obj)
+            if len(batch) == 1000:
+                model.objects.using(db_alias).bulk_update(batch, [key])
+                batch = []
+        model.objects.using(db_alias).bulk_update(batch, [key])
+        collisions += [
+            f"{model_name}.{source} {value!r}: ids {', '.join(map(str, pks))}"
+            for value, pks in seen.items()
+            if len(pks) > 1
+        ]
+    if collisions:
+        raise RuntimeError(
+            "These rows differ only by letter case; rename or merge them, then "
+            "migrate again:\n  " + "\n  ".join(collisions)
+        )
+
+
+def reinstall_search(apps, schema_editor):
+    # Altering core_product rebuilds it on SQLite, dropping its FTS triggers.
+    search_index = import_module("core.migrations.0005_search_index")
+
+    search_index.install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_stock_ledger_snapshots'),
+    ]
+
+    operations = (
+        [
+            migrations.AddField(
+                model_name=model_name,
+                name=key,
+                field=core.models.LowercaseKeyField(
+                    max_length=max_length, null=True, source=source
+                ),
+            )
+            for model_name, source, key, max_length in KEYS
+        ]
+        + [migrations.RunPython(fill_keys, migrations.RunPython.noop)]
+        + [
+            migrations.AlterField(
+                model_name=model_name,
+                name=key,
+                field=core.models.LowercaseKeyField(
+                    max_length=max_length, unique=True, source=source
+                ),
+            )
+            for model_name, source, key, max_length in KEYS
+        ]
+        + [
+            # The key's unique index replaces the case-sensitive one.
+            migrations.AlterField(
+                model_name='product',
+                name='name',
+                field=models.CharField(max_length=100),
+            ),
+            migrations.AlterField(
+                model_name='supplier',
+                name='email',
+                field=models.EmailField(max_length=254),
+            ),
+            migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+        ]
+    )
@@ -0,0 +1,110 @@
+# Generated by Django 3.2 on 2026-10-18 04:04
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+# (model, related_name) of every FK to the location stock is taken from
+LOCATED = [
+    ("queuedstockmovement", None),
+    ("saleorder", None),
+    ("stockmovement", "+"),
+]
+
+
+def open_main_location(apps, schema_editor):
+    """
+    Everything so far happened in one place: call it "Main", make it the
+    default, give it each product's whole stock and file every existing
+    movement, order and queued scan under it.
+    """
+    Location = apps.get_model("core", "Location")
+    Product = apps.get_model("core", "Product")
+    StockLevel = apps.get_model("core", "StockLevel")
+    db_alias = schema_editor.connection.alias
+    main = Location.objects.using(db_alias).create(name="Main", is_default=True)
+    batch = []
+    for pk, stock in Product.objects.using(db_alias).values_list("pk", "stock_quantity").iterator():
+        batch.append(StockLevel(product_id=pk, location=main, quantity=stock))
+        if len(batch) == 1000:
+            StockLevel.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    StockLevel.objects.using(db_alias).bulk_create(batch)
+    for model_name, _related_name in LOCATED:
+        apps.get_model("core", model_name).objects.using(db_alias).update(location=main)
+
+
+def _location(null, related_name):
+    options = {"related_name": related_name} if related_name else {}
+    if null:
+        options["null"] = True
+    else:
+        options["default"] = core.models.default_location
+    return models.ForeignKey(
+        on_delete=django.db.models.deletion.PROTECT, to='core.location', **options
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_case_insensitive_keys'),
+    ]
+
+    operations = (
+        [
+            migrations.CreateModel(
+                name='Location',
+                fields=[
+                    ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('name', models.CharField(max_length=100, unique=True)),
+                    ('is_default', models.BooleanField(default=False)),
+                ],
+            ),
+            migrations.AddConstraint(
+                model_name='location',
+                constraint=models.UniqueConstraint(condition=models.Q(is_default=True), fields=('is_default',), name='one_default_location'),
+            ),
+            migrations.CreateModel(
+                name='StockLevel',
+                fields=[
+                    ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                    ('quantity', models.IntegerField(default=0)),
+                    ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='core.location')),
+                    ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='core.product')),
+                ],
+            ),
+            migrations.AddIndex(
+                model_name='stocklevel',
+                index=models.Index(fields=['location', 'quantity', 'id'], name='core_stockl_locatio_f4ae28_idx'),
+            ),
+            migrations.AddConstraint(
+                model_name='stocklevel',
+                constraint=models.UniqueConstraint(fields=('product', 'location'), name='unique_stock_level'),
+            ),
+            migrations.AlterField(
+                model_name='stockmovement',
+                name='movement_type',
+                field=models.CharField(choices=[('In', 'In'), ('Out', 'Out'), ('Transfer', 'Transfer')], max_length=8),
+            ),
+            migrations.AddField(
+                model_name='stockmovement',
+                name='to_location',
+                field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.location'),
+            ),
+        ]
+        # Nullable until the existing rows point at "Main"
+        + [
+            migrations.AddField(
+                model_name=model_name, name='location', field=_location(True, related_name)
+            )
+            for model_name, related_name in LOCATED
+        ]
+        + [migrations.RunPython(open_main_location, migrations.RunPython.noop)]
+        + [
+            migrations.AlterField(
+                model_name=model_name, name='location', field=_location(False, related_name)
+            )
+            for model_name, related_name in LOCATED
+        ]
+    )
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_stock_locations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleorder',
+            index=models.Index(fields=['sale_date', 'id'], name='core_saleor_sale_da_17706d_idx'),
+        ),
+    ]
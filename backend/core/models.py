@@ -1,17 +1,152 @@
+import decimal
+
+from django import forms
+from django.core import validators
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.db import models
 from bson.decimal128 import Decimal128
 
 
 class CustomDecimalField(models.DecimalField):
+    """Only referenced by migrations that predate MoneyField."""
+
     def to_python(self, value):
         if isinstance(value, Decimal128):
             return value.to_decimal()
         return super().to_python(value)
 
 
+class MoneyField(models.BigIntegerField):
+    """
+    An amount of money stored as an integer number of cents on every backend,
+    and exposed in Python as a ``Decimal`` with two places.
+
+    Conversions happen only at the edges (loading, saving, forms), so sums and
+    arithmetic run in the database on plain integers: ``Sum("total_price")``
+    comes back as an exact Decimal, and ``F("price") * F("stock_quantity")``
+    only needs ``output_field=MoneyField()``. Amounts with fractions of a cent
+    are rejected rather than rounded.
+    """
+
+    description = "Amount of money stored in cents"
+    CENT = decimal.Decimal("0.01")
+    default_error_messages = {
+        "invalid": "“%(value)s” value must be an amount of money.",
+    }
+
+    def __init__(self, *args, max_digits=None, **kwargs):
+        self.max_digits = max_digits
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs["max_digits"] = self.max_digits
+        return name, path, args, kwargs
+
+    @property
+    def validators(self):
+        # BigIntegerField's range validators would compare against cents.
+        if self.max_digits is None:
+            return list(self._validators)
+        return [*self._validators, validators.DecimalValidator(self.max_digits, 2)]
+
+    def to_python(self, value):
+        if value is None:
+            return None
+        if isinstance(value, Decimal128):
+            value = value.to_decimal()
+        try:
+            amount = decimal.Decimal(
+                value if isinstance(value, (decimal.Decimal, int, str)) else str(value)
+            )
+        except (decimal.InvalidOperation, TypeError, ValueError):
+            amount = None
+        if amount is None or not amount.is_finite():
+            raise ValidationError(
+                self.error_messages["invalid"], code="invalid", params={"value": value}
+            )
+        # Normalise to two places unless that would lose fractions of a cent.
+        cents = amount.quantize(self.CENT)
+        return cents if cents == amount else amount
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else self.from_cents(value)
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, "resolve_expression"):
+            return value
+        cents = self.to_python(value).scaleb(2)
+        if cents != cents.to_integral_value():
+            raise ValueError(f"{value} is not a whole number of cents.")
+        return int(cents)
+
+    @classmethod
+    def from_cents(cls, cents):
+        return decimal.Decimal(int(cents)).scaleb(-2)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return "" if value is None else str(self.to_python(value))
+
+    def formfield(self, **kwargs):
+        # Skip IntegerField.formfield, which would offer an integer input.
+        return models.Field.formfield(
+            self,
+            **{
+                "form_class": forms.DecimalField,
+                "max_digits": self.max_digits,
+                "decimal_places": 2,
+                **kwargs,
+            },
+        )
+
+
+class LowercaseKeyField(models.CharField):
+    """
+    A lower-cased copy of the ``source`` field, refreshed whenever the row is
+    saved or bulk-created. With ``unique=True`` its index makes the database
+    itself enforce case-insensitive uniqueness of the source, which Django
+    3.2 cannot express as a constraint on ``Lower(source)``, and it serves
+    exact lookups on the lower-cased value. ``QuerySet.update()`` of the
+    source does not refresh it.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["source"] = self.source
+        kwargs.pop("editable", None)
+        return name, path, args, kwargs
+
+    @staticmethod
+    def normalize(value):
+        return None if value is None else value.lower()
+
+    def pre_save(self, model_instance, add):
+        key = self.normalize(getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, key)
+        return key
+
+
+# Names Django gave the key columns' unique indexes in migration 0014, as
+# PostgreSQL and MongoDB report them when a row violates one.
+UNIQUE_KEY_INDEXES = {
+    ("core_product", "name_key"): "core_product_name_key_04ed20cc_uniq",
+    ("core_supplier", "email_key"): "core_supplier_email_key_c4c70991_uniq",
+}
+
+
 class Supplier(models.Model):
     name = models.CharField(max_length=100)
-    email = models.EmailField(unique=True)
+    email = models.EmailField()
+    # Case-insensitive uniqueness of email
+    email_key = LowercaseKeyField(max_length=254, unique=True, source="email")
     phone = models.CharField(max_length=10, unique=True)
     address = models.TextField()
 
@@ -19,43 +154,388 @@ class Supplier(models.Model):
         return self.name
 
 
-class Product(models.Model):
+class Location(models.Model):
+    """A warehouse or store holding stock (see StockLevel)."""
+
     name = models.CharField(max_length=100, unique=True)
+    # Where stock goes when a movement or order names no location
+    is_default = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["is_default"],
+                condition=models.Q(is_default=True),
+                name="one_default_location",
+            )
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+DEFAULT_LOCATION_KEY = "core:default_location"
+
+
+def default_location():
+    """Primary key of the default Location (created on first use), cached."""
+    pk = cache.get(DEFAULT_LOCATION_KEY)
+    if pk is None:
+        pk = Location.objects.get_or_create(
+            is_default=True, defaults={"name": "Main"}
+        )[0].pk
+        cache.set(DEFAULT_LOCATION_KEY, pk, None)
+    return pk
+
+
+class Product(models.Model):
+    name = models.CharField(max_length=100)
+    # Case-insensitive uniqueness of name
+    name_key = LowercaseKeyField(max_length=100, unique=True, source="name")
     description = models.TextField()
     category = models.CharField(max_length=100)
-    price = CustomDecimalField(max_digits=10, decimal_places=2)
+    price = MoneyField(max_digits=10)
     stock_quantity = models.IntegerField()
+    # Blank reorder settings fall back to the category's CategoryReorderDefault
+    reorder_point = models.PositiveIntegerField(null=True, blank=True)
+    safety_stock = models.PositiveIntegerField(null=True, blank=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # Stock level check: filter/sort by stock, optionally per supplier
+            models.Index(fields=["stock_quantity", "id"]),
+            models.Index(fields=["supplier", "stock_quantity", "id"]),
+            # Re-evaluating a category after its reorder defaults change
+            models.Index(fields=["category", "id"]),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class StockLevel(models.Model):
+    """
+    Stock of a product at one location. ``Product.stock_quantity`` caches
+    the total over all locations; core/services.py updates both together.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="stock_levels"
+    )
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, related_name="stock_levels"
+    )
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "location"], name="unique_stock_level"
+            ),
+        ]
+        indexes = [
+            # One location's stock level check, lowest stock first
+            models.Index(fields=["location", "quantity", "id"]),
+        ]
+
+    def __str__(self):
+        return f"Product #{self.product_id} at #{self.location_id}: {self.quantity}"
+
+
+class CategoryReorderDefault(models.Model):
+    """Reorder settings for products of a category that do not set their own."""
+
+    category = models.CharField(max_length=100, unique=True)
+    reorder_point = models.PositiveIntegerField(default=0)
+    safety_stock = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.category
+
+
+class ReorderAlert(models.Model):
+    """
+    One low-stock episode of a product: opened when its stock falls to or
+    below reorder point + safety stock, resolved when it climbs back above.
+    Maintained by core/reorder.py; the open rows are the "needs reorder" list.
+    """
+
+    OPEN = "Open"
+    RESOLVED = "Resolved"
+    STATE_CHOICES = ((OPEN, "Open"), (RESOLVED, "Resolved"))
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reorder_alerts"
+    )
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=OPEN)
+    # Stock and threshold when the alert opened
+    stock_quantity = models.IntegerField()
+    threshold = models.IntegerField()
+    opened_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Needs-reorder list, oldest first
+            models.Index(fields=["state", "id"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product"],
+                condition=models.Q(state="Open"),
+                name="one_open_reorder_alert",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.state} reorder alert - product #{self.product_id}"
+
+
 class SaleOrder(models.Model):
     STATUS_CHOICES = (
         ("Pending", "Pending"),
         ("Completed", "Completed"),
         ("Cancelled", "Cancelled"),
     )
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Single-product orders set product/quantity directly. Multi-line orders
+    # leave product empty, keep the total units in quantity and hold their
+    # items in SaleOrderLine.
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, null=True, blank=True
+    )
     quantity = models.IntegerField()
-    total_price = CustomDecimalField(max_digits=10, decimal_places=2)
+    total_price = MoneyField(max_digits=10)
     sale_date = models.DateField(auto_now_add=True)
+    # Where the order's stock is allocated from
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, default=default_location
+    )
     status = models.CharField(
         max_length=10, choices=STATUS_CHOICES, default="Pending"
     )
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of the order list, optionally by status
+            models.Index(fields=["status", "id"]),
+            # The admin's date drill-down, newest first
+            models.Index(fields=["sale_date", "id"]),
+        ]
+
     def __str__(self):
+        if self.product_id is None:
+            return f"Order #{self.pk}"
         return f"Order #{self.pk} - {self.product.name}"
 
 
+class SaleOrderLine(models.Model):
+    order = models.ForeignKey(
+        SaleOrder, on_delete=models.CASCADE, related_name="lines"
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    unit_price = MoneyField(max_digits=10)
+    line_total = MoneyField(max_digits=10)
+
+    def __str__(self):
+        return f"Order #{self.order_id} - {self.quantity} x product #{self.product_id}"
+
+
 class StockMovement(models.Model):
-    MOVEMENT_TYPES = (("In", "In"), ("Out", "Out"))
+    # A transfer moves stock from ``location`` to ``to_location``; it leaves
+    # the product's total, and so the In/Out rollups, unchanged.
+    MOVEMENT_TYPES = (("In", "In"), ("Out", "Out"), ("Transfer", "Transfer"))
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
-    movement_type = models.CharField(max_length=3, choices=MOVEMENT_TYPES)
+    movement_type = models.CharField(max_length=8, choices=MOVEMENT_TYPES)
     movement_date = models.DateField(auto_now_add=True)
     notes = models.TextField(blank=True)
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, default=default_location, related_name="+"
+    )
+    to_location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, null=True, blank=True, related_name="+"
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the ledger, newest first
+            models.Index(fields=["movement_date", "id"]),
+            # A product's movements after its latest snapshot (core/ledger.py)
+            models.Index(fields=["product", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.movement_type} - {self.product.name}"
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's stock at the end of ``date``, counting every one of its
+    StockMovement rows up to ``last_movement_id``. Stock at any later point
+    is the latest snapshot plus the movements after it (see core/ledger.py).
+    A product's first snapshot, with ``last_movement_id`` 0, holds the stock
+    it was created with.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="snapshots"
+    )
+    date = models.DateField()
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Latest snapshot of a product on or before a date
+            models.Index(fields=["product", "date", "last_movement_id"]),
+        ]
+
+    def __str__(self):
+        return f"Product #{self.product_id}: {self.quantity} on {self.date}"
+
+
+class SearchTrigram(models.Model):
+    """
+    Inverted trigram index used for product/supplier search on databases
+    without SQLite FTS5. See core/search.py.
+    """
+
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["model", "trigram", "object_id"]),
+            models.Index(fields=["model", "object_id"]),
+        ]
+
+
+class DailyStockBalance(models.Model):
+    """
+    Per-product, per-day movement totals, maintained as movements are
+    recorded (see core/rollups.py). Lets historical stock questions be
+    answered without aggregating the whole StockMovement table.
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    date = models.DateField()
+    quantity_in = models.IntegerField(default=0)
+    quantity_out = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "date"], name="unique_daily_stock_balance"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - product #{self.product_id}"
+
+
+class SalesTotals(models.Model):
+    """
+    Orders, units and revenue placed on one day, and the parts of them later
+    completed or cancelled. Maintained by core/sales.py.
+    """
+
+    date = models.DateField()
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = MoneyField(max_digits=14, default=0)
+    completed_orders = models.IntegerField(default=0)
+    completed_quantity = models.IntegerField(default=0)
+    completed_revenue = MoneyField(max_digits=14, default=0)
+    cancelled_orders = models.IntegerField(default=0)
+    cancelled_quantity = models.IntegerField(default=0)
+    cancelled_revenue = MoneyField(max_digits=14, default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(SalesTotals):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["product", "date"], name="unique_daily_product_sales"
+            ),
+        ]
+        indexes = [
+            # Dashboard date-range reads
+            models.Index(fields=["date", "product"]),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - product #{self.product_id}"
+
+
+class DailyCategorySales(SalesTotals):
+    category = models.CharField(max_length=100)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "date"], name="unique_daily_category_sales"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date", "category"]),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.category}"
+
+
+class ProductForecast(models.Model):
+    """
+    Demand forecast per product, rewritten by the nightly batch job in
+    core/forecasting.py. Demand figures are units per day.
+    """
+
+    product = models.OneToOneField(
+        Product, on_delete=models.CASCADE, primary_key=True, related_name="forecast"
+    )
+    average_daily_demand = models.FloatField(default=0)
+    recent_daily_demand = models.FloatField(default=0)
+    smoothed_daily_demand = models.FloatField(default=0)
+    # Change in daily demand per day over the window (least-squares slope)
+    trend = models.FloatField(default=0)
+    # Stock / smoothed demand, capped for products with no demand
+    days_of_cover = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Stock level check sorted by days of cover
+            models.Index(fields=["days_of_cover", "product"]),
+        ]
+
+    def __str__(self):
+        return f"Forecast for product #{self.product_id}"
+
+
+class QueuedStockMovement(models.Model):
+    """
+    An 'In' movement accepted but not applied yet. With STOCK_QUEUE enabled,
+    scans are only appended here; core/stockqueue.py's worker turns them into
+    StockMovement rows and stock updates in batches.
+    """
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="queued_movements"
+    )
+    quantity = models.IntegerField()
+    notes = models.TextField(blank=True)
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, default=default_location
+    )
+    queued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Queued In {self.quantity} for product #{self.product_id}"
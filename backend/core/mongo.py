@@ -0,0 +1,368 @@
+# core/mongo.py
+"""
+Native MongoDB reads for the hottest pages.
+
+djongo turns every ORM query into SQL and then into Mongo operations, which
+copes badly with joins (``select_related``), ``icontains`` and annotations.
+When the default database is djongo, core/repository.py sends the stock level
+check, the product/supplier lists and the sale order list here instead. Each
+runs as one aggregation pipeline straight through pymongo:
+
+    $match (filters)  ->  $match (keyset)  ->  $sort  ->  $limit
+                      ->  $lookup / $addFields for the rows on the page only
+
+djongo stores a table as a collection of the same name with one field per
+column (``supplier_id``, cents for MoneyField, ...), so the documents map
+back onto model instances without going through the ORM. Cursors are
+encoded exactly like CursorPaginator's. Run ``manage.py ensure_mongo_indexes``
+once to create the indexes these pipelines sort and filter on.
+
+Every function takes a pymongo ``Database``; tests pass a mongomock one.
+"""
+import hashlib
+import json
+import re
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+from . import search
+from .models import (
+    CategoryReorderDefault,
+    Product,
+    ProductForecast,
+    SaleOrder,
+    SaleOrderLine,
+    SearchTrigram,
+    Supplier,
+)
+from .pagination import COUNT_CACHE_TIMEOUT, CursorPaginator
+
+ENGINE = "djongo"
+
+# collection -> compound indexes, as create_index() key lists
+INDEXES = {
+    Product._meta.db_table: [
+        [("id", 1)],
+        [("stock_quantity", 1), ("id", 1)],
+        [("supplier_id", 1), ("stock_quantity", 1), ("id", 1)],
+    ],
+    Supplier._meta.db_table: [[("id", 1)]],
+    SaleOrder._meta.db_table: [[("id", -1)], [("status", 1), ("id", -1)]],
+    SaleOrderLine._meta.db_table: [[("order_id", 1)]],
+    ProductForecast._meta.db_table: [
+        [("product_id", 1)],
+        [("days_of_cover", 1), ("product_id", 1)],
+    ],
+    CategoryReorderDefault._meta.db_table: [[("category", 1)]],
+    SearchTrigram._meta.db_table: [[("model", 1), ("trigram", 1), ("object_id", 1)]],
+}
+
+
+def is_active(using=DEFAULT_DB_ALIAS):
+    return connections[using].settings_dict["ENGINE"] == ENGINE
+
+
+def get_database(using=None):
+    """
+    The pymongo Database behind a djongo connection: by default the one the
+    routers read from, so replica_reads views query a replica.
+    """
+    connection = connections[using or router.db_for_read(Product)]
+    connection.ensure_connection()
+    return connection.connection
+
+
+def ensure_indexes(db):
+    """Create every index in INDEXES (a no-op for those that exist)."""
+    return [
+        db[collection].create_index(keys)
+        for collection, indexes in INDEXES.items()
+        for keys in indexes
+    ]
+
+
+# ----- documents -> model instances -----
+
+
+def _instance(model, doc):
+    """A model instance from a djongo document, converting like the ORM."""
+    names, values = [], []
+    for field in model._meta.concrete_fields:
+        value = doc.get(field.column)
+        if value is not None:
+            if hasattr(field, "from_db_value"):
+                value = field.from_db_value(value, None, None)
+            else:
+                value = field.to_python(value)
+        names.append(field.attname)
+        values.append(value)
+    return model.from_db(DEFAULT_DB_ALIAS, names, values)
+
+
+def _first(docs):
+    return docs[0] if docs else None
+
+
+def _set_related(instance, field_name, model, doc):
+    """Cache a related object (or its absence) so templates never query."""
+    descriptor = getattr(type(instance), field_name)
+    related = _instance(model, doc) if doc is not None else None
+    field = getattr(descriptor, "related", None) or descriptor.field
+    field.set_cached_value(instance, related)
+
+
+# ----- paginator -----
+
+
+class MongoPaginator(CursorPaginator):
+    """
+    CursorPaginator over an aggregation pipeline. ``paths`` are the document
+    fields behind ``ordering``; ``stages`` filter, ``page_stages`` run on the
+    page's rows only, and ``build`` turns each document into a row.
+    """
+
+    def __init__(
+        self, collection, model, per_page, ordering, paths, stages, page_stages,
+        build, count=None,
+    ):
+        super().__init__(None, per_page, ordering=ordering, count=count)
+        self.model = model
+        self.collection = collection
+        self.paths = list(paths)
+        self.stages = list(stages)
+        self.page_stages = list(page_stages)
+        self.build = build
+
+    def _keyset(self, values, forward):
+        operator = "$lt" if forward == self.descending else "$gt"
+        values = [
+            self._field(name).get_prep_value(value)
+            for name, value in zip(self.fields, values)
+        ]
+        conditions = []
+        for i, path in enumerate(self.paths):
+            condition = dict(zip(self.paths[:i], values[:i]))
+            condition[path] = {operator: values[i]}
+            conditions.append(condition)
+        return {"$or": conditions}
+
+    def _fetch(self, values, forward, limit):
+        direction = 1 if forward != self.descending else -1
+        pipeline = list(self.stages)
+        if values is not None:
+            pipeline.append({"$match": self._keyset(values, forward)})
+        pipeline += [
+            {"$sort": {path: direction for path in self.paths}},
+            {"$limit": limit},
+            *self.page_stages,
+        ]
+        return [self.build(doc) for doc in self.collection.aggregate(pipeline)]
+
+    def _count(self):
+        if self.count != "cached":
+            return None
+        digest = hashlib.md5(
+            json.dumps([self.collection.name, self.stages], default=str).encode()
+        ).hexdigest()
+
+        def count():
+            result = list(self.collection.aggregate(self.stages + [{"$count": "n"}]))
+            return result[0]["n"] if result else 0
+
+        return cache.get_or_set(f"core:mongo_count:{digest}", count, COUNT_CACHE_TIMEOUT)
+
+
+# ----- filters -----
+
+
+def _trigram_ids(db, model, term):
+    """Primary keys whose SearchTrigram rows hold every trigram of ``term``."""
+    grams = sorted(search.trigrams(term))
+    rows = db[SearchTrigram._meta.db_table].aggregate(
+        [
+            {"$match": {"model": model._meta.model_name, "trigram": {"$in": grams}}},
+            {"$group": {"_id": "$object_id", "hits": {"$addToSet": "$trigram"}}},
+            {"$match": {"$expr": {"$eq": [{"$size": "$hits"}, len(grams)]}}},
+        ]
+    )
+    return [row["_id"] for row in rows]
+
+
+def _search(db, model, term, prefix=""):
+    """Case-insensitive substring match on the model's search fields."""
+    _table, fields = search.INDEXED[model]
+    pattern = {"$regex": re.escape(term), "$options": "i"}
+    condition = {"$or": [{f"{prefix}{field}": pattern} for field in fields]}
+    if len(term) >= 3 and not search.uses_fts():
+        # The trigram index narrows the candidates; the regex confirms them.
+        ids = _trigram_ids(db, model, term)
+        condition = {"$and": [{f"{prefix}id": {"$in": ids}}, condition]}
+    return condition
+
+
+def _product_filters(db, filters, prefix=""):
+    conditions = []
+    if filters.get("name"):
+        conditions.append(_search(db, Product, filters["name"], prefix))
+    if filters.get("supplier"):
+        conditions.append({f"{prefix}supplier_id": filters["supplier"].pk})
+    stock = {}
+    if filters.get("min_stock") is not None:
+        stock["$gte"] = filters["min_stock"]
+    if filters.get("max_stock") is not None:
+        stock["$lte"] = filters["max_stock"]
+    if stock:
+        conditions.append({f"{prefix}stock_quantity": stock})
+    return conditions
+
+
+def _threshold_stages(prefix=""):
+    """Effective reorder settings, as core.reorder.with_thresholds."""
+
+    def effective(column):
+        default = {"$arrayElemAt": [f"$category_default.{column}", 0]}
+        return {"$ifNull": [f"${prefix}{column}", {"$ifNull": [default, 0]}]}
+
+    return [
+        {
+            "$lookup": {
+                "from": CategoryReorderDefault._meta.db_table,
+                "localField": f"{prefix}category",
+                "foreignField": "category",
+                "as": "category_default",
+            }
+        },
+        {
+            "$addFields": {
+                "effective_reorder_point": effective("reorder_point"),
+                "effective_safety_stock": effective("safety_stock"),
+            }
+        },
+        {
+            "$addFields": {
+                "reorder_threshold": {
+                    "$add": ["$effective_reorder_point", "$effective_safety_stock"]
+                }
+            }
+        },
+    ]
+
+
+def _lookup(model, local_field, foreign_field, name):
+    return {
+        "$lookup": {
+            "from": model._meta.db_table,
+            "localField": local_field,
+            "foreignField": foreign_field,
+            "as": name,
+        }
+    }
+
+
+def _match(conditions):
+    if not conditions:
+        return []
+    return [{"$match": conditions[0] if len(conditions) == 1 else {"$and": conditions}}]
+
+
+# ----- pages -----
+
+
+def stock_levels(db, filters, per_page):
+    """The stock level check: see core.repository.stock_levels."""
+    by_cover = filters.get("sort") == "cover"
+    # Sorting by cover walks the forecast index and joins each product.
+    prefix = "product." if by_cover else ""
+    stages = []
+    if by_cover:
+        if filters.get("max_days_of_cover") is not None:
+            stages.append(
+                {"$match": {"days_of_cover": {"$lte": filters["max_days_of_cover"]}}}
+            )
+        stages += [
+            _lookup(Product, "product_id", "id", "product"),
+            {"$unwind": "$product"},
+        ]
+    stages += _match(_product_filters(db, filters, prefix))
+
+    page_stages = [_lookup(Supplier, f"{prefix}supplier_id", "id", "supplier")]
+    if filters.get("below_reorder_point"):
+        stages += _threshold_stages(prefix)
+        stages.append(
+            {"$match": {"$expr": {"$lte": [f"${prefix}stock_quantity", "$reorder_threshold"]}}}
+        )
+    else:
+        page_stages += _threshold_stages(prefix)
+    if not by_cover:
+        forecast = _lookup(ProductForecast, "id", "product_id", "forecast")
+        if filters.get("max_days_of_cover") is not None:
+            stages += [
+                forecast,
+                {"$match": {"forecast.days_of_cover": {"$lte": filters["max_days_of_cover"]}}},
+            ]
+        else:
+            page_stages.append(forecast)
+
+    def build(doc):
+        product = _instance(Product, doc["product"] if by_cover else doc)
+        for name in ("effective_reorder_point", "effective_safety_stock", "reorder_threshold"):
+            setattr(product, name, doc[name])
+        _set_related(product, "supplier", Supplier, _first(doc["supplier"]))
+        _set_related(
+            product, "forecast", ProductForecast, doc if by_cover else _first(doc["forecast"])
+        )
+        return product
+
+    if by_cover:
+        collection, ordering = ProductForecast._meta.db_table, ("forecast__days_of_cover", "id")
+        paths = ("days_of_cover", "product_id")
+    else:
+        collection, ordering = Product._meta.db_table, ("stock_quantity", "id")
+        paths = ("stock_quantity", "id")
+    return MongoPaginator(
+        db[collection], Product, per_page, ordering, paths, stages, page_stages, build
+    )
+
+
+def products(db, term, per_page):
+    stages = [{"$match": _search(db, Product, term)}] if term else []
+
+    def build(doc):
+        product = _instance(Product, doc)
+        _set_related(product, "supplier", Supplier, _first(doc["supplier"]))
+        return product
+
+    return MongoPaginator(
+        db[Product._meta.db_table], Product, per_page, ("id",), ("id",), stages,
+        [_lookup(Supplier, "supplier_id", "id", "supplier")], build, count="cached",
+    )
+
+
+def suppliers(db, term, per_page):
+    stages = [{"$match": _search(db, Supplier, term)}] if term else []
+    return MongoPaginator(
+        db[Supplier._meta.db_table], Supplier, per_page, ("id",), ("id",), stages,
+        [], lambda doc: _instance(Supplier, doc), count="cached",
+    )
+
+
+def sale_orders(db, status, per_page):
+    stages = [{"$match": {"status": status}}] if status else []
+    page_stages = [
+        _lookup(Product, "product_id", "id", "product"),
+        _lookup(SaleOrderLine, "id", "order_id", "lines"),
+        {"$addFields": {"line_count": {"$size": "$lines"}}},
+        {"$project": {"lines": 0}},
+    ]
+
+    def build(doc):
+        order = _instance(SaleOrder, doc)
+        order.line_count = doc["line_count"]
+        _set_related(order, "product", Product, _first(doc["product"]))
+        return order
+
+    return MongoPaginator(
+        db[SaleOrder._meta.db_table], SaleOrder, per_page, ("-id",), ("id",), stages,
+        page_stages, build, count="cached",
+    )
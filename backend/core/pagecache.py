@@ -0,0 +1,158 @@
+# core/pagecache.py
+"""
+Versioned cache for rendered read pages.
+
+``cache_page_versioned("product", "supplier")`` stores a view's rendered
+response under a key built from the view name, its query string and the
+current version of every listed table (see core/versioning.py), and whether
+it was read from a replica (see core/routing.py; replica pages are not
+stored just after a write, while the replica may lag). Writes bump
+those versions on commit, so a cached page is never served after the data it
+shows has changed; older entries simply age out of the cache via its LRU and
+TTL eviction.
+
+Pages are stored in the cache alias named by ``PAGE_CACHE["ALIAS"]``:
+local memory by default, or the LRU file cache in core/cache_backends.py.
+Hits and misses are counted per view, in the same alias, and every cached
+view sets an ``X-Page-Cache: hit|miss`` header. ``manage.py page_cache_stats``
+prints the counts; it needs an alias shared between processes (the file
+cache, memcached, redis), since each process has its own local memory.
+"""
+import functools
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+from . import routing, versioning
+
+DEFAULTS = {
+    "ENABLED": True,
+    "ALIAS": "default",
+    "TIMEOUT": 300,
+}
+
+STATS_KEY = "core:page_stats:{}:{}"
+
+# Names of every view wrapped by cache_page_versioned, for stats()
+cached_views = set()
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PAGE_CACHE", {}))
+    return config
+
+
+def get_cache():
+    return caches[get_config()["ALIAS"]]
+
+
+def stats_are_shared():
+    """False when each process counts its own hits and misses (local memory)."""
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def page_key(view_name, request, version_names):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.md5(query.encode()).hexdigest()
+    versions = versioning.get_versions(*version_names)
+    # Replica pages may lag the primary: keep them apart (see core/routing.py)
+    source = routing.read_source()
+    return f"core:page:{view_name}:{source}:{versions}:{digest}"
+
+
+def _cacheable_request(request):
+    # A page may render this user's pending flash messages: never serve it from
+    # (or, if it did show them, store it in) the shared cache.
+    return request.method in ("GET", "HEAD") and not len(get_messages(request))
+
+
+def _cacheable_response(request, response):
+    return (
+        response.status_code == 200
+        and not get_messages(request).used
+        and not response.streaming
+        and not response.has_header("Set-Cookie")
+        and not request.META.get("CSRF_COOKIE_USED")
+    )
+
+
+def _count(view_name, outcome):
+    store = get_cache()
+    key = STATS_KEY.format(view_name, outcome)
+    try:
+        store.incr(key)
+    except ValueError:
+        store.add(key, 0, timeout=None)
+        store.incr(key)
+
+
+def cache_page_versioned(*version_names, timeout=None):
+    """
+    Cache a GET view's response until one of ``version_names`` is bumped or
+    ``timeout`` (default ``PAGE_CACHE["TIMEOUT"]``) seconds pass.
+    """
+
+    def decorator(view):
+        view_name = view.__name__
+        cached_views.add(view_name)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            config = get_config()
+            if not config["ENABLED"] or not _cacheable_request(request):
+                return view(request, *args, **kwargs)
+
+            store = get_cache()
+            key = page_key(view_name, request, version_names)
+            cached = store.get(key)
+            if cached is not None:
+                _count(view_name, "hits")
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+                response["X-Page-Cache"] = "hit"
+                return response
+
+            _count(view_name, "misses")
+            response = view(request, *args, **kwargs)
+            cacheable = _cacheable_response(request, response)
+            if cacheable and not routing.replica_may_lag(*version_names):
+                store.set(
+                    key,
+                    (response.content, response["Content-Type"]),
+                    config["TIMEOUT"] if timeout is None else timeout,
+                )
+            response["X-Page-Cache"] = "miss"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def stats():
+    """{view name: {"hits": n, "misses": n}} for every cached view."""
+    store = get_cache()
+    keys = {
+        (name, outcome): STATS_KEY.format(name, outcome)
+        for name in cached_views
+        for outcome in ("hits", "misses")
+    }
+    values = store.get_many(keys.values())
+    result = {}
+    for (name, outcome), key in sorted(keys.items()):
+        result.setdefault(name, {})[outcome] = values.get(key, 0)
+    return result
+
+
+def reset_stats():
+    get_cache().delete_many(
+        STATS_KEY.format(name, outcome)
+        for name in cached_views
+        for outcome in ("hits", "misses")
+    )
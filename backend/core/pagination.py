@@ -0,0 +1,194 @@
+# core/pagination.py
+"""
+Keyset (cursor) pagination.
+
+Unlike django.core.paginator.Paginator this never runs COUNT(*) and never uses
+OFFSET: each page is fetched with a ``WHERE (key) < (last key seen)`` filter
+on an indexed ordering, so page 10,000 costs the same as page 1. Cursors are
+opaque, URL-safe strings encoding the boundary row's key values.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """One page of results. Iterate it like a django Page."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, total_count):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_count = total_count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` by ``ordering``, a tuple of field names that must
+    end in a unique field (normally ``id``) and share one direction, e.g.
+    ``("-movement_date", "-id")``. Back it with a matching index. Fields may
+    follow relations (``"forecast__days_of_cover"``) if they are never NULL
+    in the queryset, or name one of its annotations (``"search_rank"``). A
+    ``.values()`` queryset works too if it selects the ordering fields.
+
+    ``count`` may be ``"cached"`` to show a total that is recomputed at most
+    every COUNT_CACHE_TIMEOUT seconds per distinct query, or None to skip it.
+    """
+
+    def __init__(self, queryset, per_page, ordering=("id",), count=None):
+        descending = {field.startswith("-") for field in ordering}
+        if len(descending) != 1:
+            raise ValueError("All ordering fields must share one direction.")
+        self.queryset = queryset
+        self.model = queryset.model if queryset is not None else None
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.descending = descending.pop()
+        self.fields = [field.lstrip("-") for field in ordering]
+        self.count = count
+
+    # ----- cursors -----
+
+    def _encode(self, direction, obj):
+        values = [self._key_value(obj, name) for name in self.fields]
+        raw = json.dumps([direction] + values, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def cursor_after(self, obj):
+        """A cursor for the page that starts right after ``obj``."""
+        return self._encode("n", obj)
+
+    def _decode(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            decoded = json.loads(base64.urlsafe_b64decode(padded))
+            if not isinstance(decoded, list) or len(decoded) != len(self.fields) + 1:
+                raise ValueError
+            direction, *values = decoded
+            if direction not in ("n", "p"):
+                raise ValueError
+            values = [
+                self._field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+            # Ordering fields are never NULL, and ``__lt=None`` is no filter.
+            if any(value is None for value in values):
+                raise ValueError
+        except (ValueError, TypeError, binascii.Error, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return direction, values
+
+    def _is_annotation(self, name):
+        return self.queryset is not None and name in self.queryset.query.annotations
+
+    def _key_value(self, obj, name):
+        if self._is_annotation(name):
+            # Annotations are plain numbers or strings, JSON-safe as they are.
+            return obj[name] if isinstance(obj, dict) else getattr(obj, name)
+        return self._field(name).value_to_string(self._owner(obj, name))
+
+    def _field(self, name):
+        if self._is_annotation(name):
+            return self.queryset.query.annotations[name].output_field
+        model = self.model
+        *relations, field_name = name.split("__")
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        return model._meta.get_field(field_name)
+
+    def _owner(self, obj, name):
+        """The object holding the value of ordering field ``name``."""
+        if isinstance(obj, dict):
+            # Rows from .values(); the ordering fields must be among them.
+            return SimpleNamespace(**{self._field(name).attname: obj[name]})
+        for relation in name.split("__")[:-1]:
+            obj = getattr(obj, relation)
+        return obj
+
+    # ----- paging -----
+
+    def _after(self, values, forward):
+        """Q selecting rows strictly after ``values`` in the walk direction."""
+        lookup = "lt" if forward == self.descending else "gt"
+        condition = Q()
+        for i, name in enumerate(self.fields):
+            step = Q(**{f"{name}__{lookup}": values[i]})
+            for prev_name, prev_value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{prev_name: prev_value})
+            condition |= step
+        return condition
+
+    def _reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        )
+
+    def get_page(self, cursor=None):
+        """Return the page for ``cursor``; bad or missing cursors give page 1."""
+        direction, values = "n", None
+        if cursor:
+            try:
+                direction, values = self._decode(cursor)
+            except InvalidCursor:
+                direction, values = "n", None
+
+        forward = direction == "n"
+        rows = self._fetch(values, forward, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or not forward:
+                next_cursor = self._encode("n", rows[-1])
+            if (has_more and not forward) or (forward and values is not None):
+                previous_cursor = self._encode("p", rows[0])
+        return CursorPage(rows, next_cursor, previous_cursor, self._count())
+
+    def _fetch(self, values, forward, limit):
+        """Up to ``limit`` rows after ``values`` (None: from the start)."""
+        queryset = self.queryset.order_by(
+            *(self.ordering if forward else self._reversed_ordering())
+        )
+        if values is not None:
+            queryset = queryset.filter(self._after(values, forward))
+        return list(queryset[:limit])
+
+    def _count(self):
+        if self.count != "cached":
+            return None
+        sql, params = self.queryset.query.sql_with_params()
+        digest = hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+        return cache.get_or_set(
+            f"core:count:{digest}", self.queryset.count, COUNT_CACHE_TIMEOUT
+        )
@@ -0,0 +1,130 @@
+# core/reorder.py
+"""
+Event-driven reorder-point engine.
+
+A product needs reordering once ``stock_quantity <= reorder point + safety
+stock``. Either setting may be left blank on the product to inherit its
+category's CategoryReorderDefault (and 0 without one).
+
+``evaluate`` is called with the ids of the products a write just touched:
+the stock service for every movement and sale order, signals for product
+and category-default edits, the importer for new rows. It reads those rows
+only, opens a ReorderAlert for each product that crossed below its threshold
+and resolves the open alert of each that climbed back above it. The
+"needs reorder" list is then just the open alerts, read through the
+(state, id) index, never a scan of the catalogue.
+"""
+from django.db.models import Exists, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import events, versioning
+from .models import CategoryReorderDefault, Product, ReorderAlert
+
+
+def with_thresholds(queryset, prefix=""):
+    """
+    Annotate products with their effective reorder settings and threshold.
+    ``prefix`` reaches the product through a relation, e.g. ``"product__"``.
+    """
+    defaults = CategoryReorderDefault.objects.filter(
+        category=OuterRef(f"{prefix}category")
+    )
+    return queryset.annotate(
+        effective_reorder_point=Coalesce(
+            f"{prefix}reorder_point",
+            Subquery(defaults.values("reorder_point")[:1]),
+            Value(0),
+        ),
+        effective_safety_stock=Coalesce(
+            f"{prefix}safety_stock",
+            Subquery(defaults.values("safety_stock")[:1]),
+            Value(0),
+        ),
+    ).annotate(
+        reorder_threshold=F("effective_reorder_point") + F("effective_safety_stock")
+    )
+
+
+def evaluate(product_ids):
+    """
+    Open or resolve alerts for ``product_ids`` in one read (plus one write per
+    kind of transition). Call it inside the transaction that changed the
+    products. Returns the lists of product ids opened and resolved.
+    """
+    if not product_ids:
+        return [], []
+    return evaluate_queryset(Product.objects.filter(pk__in=list(product_ids)))
+
+
+def evaluate_queryset(products):
+    """``evaluate`` for the products of a queryset, e.g. freshly bulk-created rows."""
+    open_alerts = ReorderAlert.objects.filter(
+        product=OuterRef("pk"), state=ReorderAlert.OPEN
+    )
+    rows = (
+        with_thresholds(products)
+        .annotate(has_open_alert=Exists(open_alerts))
+        .values("id", "name", "stock_quantity", "reorder_threshold", "has_open_alert")
+    )
+    opened, resolved = [], []
+    for row in rows:
+        low = row["stock_quantity"] <= row["reorder_threshold"]
+        if low and not row["has_open_alert"]:
+            opened.append(row)
+        elif not low and row["has_open_alert"]:
+            resolved.append(row)
+
+    if opened:
+        # A concurrent evaluation may have opened the same alert first.
+        ReorderAlert.objects.bulk_create(
+            [
+                ReorderAlert(
+                    product_id=row["id"],
+                    stock_quantity=row["stock_quantity"],
+                    threshold=row["reorder_threshold"],
+                )
+                for row in opened
+            ],
+            ignore_conflicts=True,
+        )
+    if resolved:
+        ReorderAlert.objects.filter(
+            product_id__in=[row["id"] for row in resolved], state=ReorderAlert.OPEN
+        ).update(state=ReorderAlert.RESOLVED, resolved_at=timezone.now())
+    if opened or resolved:
+        versioning.bump_on_commit("reorderalert")
+        events.publish_reorder_transitions(opened, resolved)
+    return [row["id"] for row in opened], [row["id"] for row in resolved]
+
+
+def evaluate_category(category, chunk_size=1000):
+    """Re-evaluate every product of ``category`` after its defaults change."""
+    return _evaluate_chunked(Product.objects.filter(category=category), chunk_size)
+
+
+def evaluate_all(chunk_size=1000):
+    """
+    Full re-evaluation, for backfills only (e.g. after bulk loads that bypass
+    the engine). Returns the number of products checked.
+    """
+    return _evaluate_chunked(Product.objects.all(), chunk_size)
+
+
+def _evaluate_chunked(products, chunk_size):
+    product_ids = products.order_by("pk").values_list("pk", flat=True)
+    checked = last_id = 0
+    while True:
+        chunk = list(product_ids.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            return checked
+        evaluate(chunk)
+        checked += len(chunk)
+        last_id = chunk[-1]
+
+
+def needs_reorder():
+    """Open alerts with their products, oldest first."""
+    return ReorderAlert.objects.filter(state=ReorderAlert.OPEN).select_related(
+        "product", "product__supplier"
+    )
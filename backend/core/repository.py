@@ -0,0 +1,162 @@
+# core/repository.py
+"""
+Reads behind the hottest pages, one function per page.
+
+Each returns a keyset paginator for its page. On SQL backends that is a
+CursorPaginator over an ORM queryset; when the default database is djongo
+(MongoDB) it is core/mongo.py's native aggregation pipeline instead, which
+avoids djongo's SQL translation of joins and substring filters. Views only
+call ``get_page`` on the result, so they do not care which one they get.
+"""
+from django.db import models
+
+from . import mongo, reorder, search
+from .models import Product, SaleOrder, StockLevel, Supplier
+from .pagination import CursorPaginator
+
+
+def _filter_products(queryset, filters, prefix=""):
+    """Apply the product filters to ``queryset``, whose products are at ``prefix``."""
+    # Filter by name (case-insensitive partial match)
+    name = filters.get("name")
+    if name:
+        queryset = search.filter_queryset(queryset, name, model=Product, prefix=prefix)
+
+    # Filter by supplier
+    supplier = filters.get("supplier")
+    if supplier:
+        queryset = queryset.filter(**{f"{prefix}supplier": supplier})
+
+    if filters.get("below_reorder_point"):
+        queryset = queryset.filter(
+            **{f"{prefix}stock_quantity__lte": models.F("reorder_threshold")}
+        )
+    if filters.get("max_days_of_cover") is not None:
+        queryset = queryset.filter(
+            **{f"{prefix}forecast__days_of_cover__lte": filters["max_days_of_cover"]}
+        )
+    return queryset
+
+
+def filter_stock_levels(filters):
+    products = _filter_products(
+        reorder.with_thresholds(Product.objects.select_related("supplier", "forecast")),
+        filters,
+    )
+    # Filter by stock
+    if filters.get("min_stock") is not None:
+        products = products.filter(stock_quantity__gte=filters["min_stock"])
+    if filters.get("max_stock") is not None:
+        products = products.filter(stock_quantity__lte=filters["max_stock"])
+    return products
+
+
+class LocationStockPaginator(CursorPaginator):
+    """
+    Pages a location's StockLevel rows but yields their products, each with
+    ``location_quantity`` and ``reorder_threshold`` set, so the stock level
+    page renders them like any other product.
+    """
+
+    def get_page(self, cursor=None):
+        page = super().get_page(cursor)
+        products = []
+        for level in page.object_list:
+            product = level.product
+            product.location_quantity = level.quantity
+            product.reorder_threshold = level.reorder_threshold
+            products.append(product)
+        page.object_list = products
+        return page
+
+
+def stock_levels_at(location, filters, per_page):
+    """
+    One location's stock levels, lowest first. Reads only that location's
+    rows, through the (location, quantity, id) index; stock filters apply to
+    the location's quantity.
+    """
+    levels = _filter_products(
+        reorder.with_thresholds(
+            StockLevel.objects.filter(location=location).select_related(
+                "product__supplier", "product__forecast"
+            ),
+            prefix="product__",
+        ),
+        filters,
+        prefix="product__",
+    )
+    if filters.get("min_stock") is not None:
+        levels = levels.filter(quantity__gte=filters["min_stock"])
+    if filters.get("max_stock") is not None:
+        levels = levels.filter(quantity__lte=filters["max_stock"])
+    ordering = ("quantity", "id")
+    if filters.get("sort") == "cover":
+        levels = levels.filter(product__forecast__isnull=False)
+        ordering = ("product__forecast__days_of_cover", "id")
+    return LocationStockPaginator(levels, per_page, ordering=ordering)
+
+
+def stock_levels(filters, per_page):
+    """
+    Products matching StockLevelFilterForm's cleaned ``filters``, lowest stock
+    first, or fewest days of cover first for ``sort=cover``. With a
+    ``location`` filter, see stock_levels_at.
+    """
+    if filters.get("location"):
+        # Per-location stock lives in SQL only, djongo or not.
+        return stock_levels_at(filters["location"], filters, per_page)
+    if mongo.is_active():
+        return mongo.stock_levels(mongo.get_database(), filters, per_page)
+    products = filter_stock_levels(filters)
+    ordering = ("stock_quantity", "id")
+    if filters.get("sort") == "cover":
+        # Products not forecast yet have no cover to sort by.
+        products = products.filter(forecast__isnull=False)
+        ordering = ("forecast__days_of_cover", "id")
+    return CursorPaginator(products, per_page, ordering=ordering)
+
+
+def products(term, per_page):
+    """
+    Products (with suppliers) by id, or the products matching a search term
+    by relevance.
+    """
+    if mongo.is_active():
+        return mongo.products(mongo.get_database(), term, per_page)
+    products_list = Product.objects.select_related("supplier").all()
+    if term:
+        # Partial match on product name via the search index, best first
+        return _ranked(search.filter_queryset(products_list, term), term, per_page)
+    return CursorPaginator(products_list, per_page, ordering=("id",), count="cached")
+
+
+def suppliers(term, per_page):
+    if mongo.is_active():
+        return mongo.suppliers(mongo.get_database(), term, per_page)
+    suppliers_list = Supplier.objects.all()
+    if term:
+        return _ranked(search.filter_queryset(suppliers_list, term), term, per_page)
+    return CursorPaginator(suppliers_list, per_page, ordering=("id",), count="cached")
+
+
+def _ranked(matches, term, per_page):
+    """Search matches by relevance, then id, keyset-paginated."""
+    return CursorPaginator(
+        search.rank(matches, term),
+        per_page,
+        ordering=("search_rank", "id"),
+        count="cached",
+    )
+
+
+def sale_orders(status, per_page):
+    """Orders newest first, optionally with one status, with their line counts."""
+    if mongo.is_active():
+        return mongo.sale_orders(mongo.get_database(), status, per_page)
+    orders_list = SaleOrder.objects.select_related("product").annotate(
+        line_count=models.Count("lines")
+    )
+    if status:
+        orders_list = orders_list.filter(status=status)
+    return CursorPaginator(orders_list, per_page, ordering=("-id",), count="cached")
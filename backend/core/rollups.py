@@ -0,0 +1,152 @@
+# core/rollups.py
+"""
+Daily stock balance rollups.
+
+DailyStockBalance holds the In/Out totals per product per day. The stock
+service calls ``record_movements`` in the same transaction as every
+StockMovement it writes, so the rollup is always current and historical
+questions read a handful of rollup rows instead of the whole ledger:
+
+* stock on date D  = current stock - net movement on days after D
+* totals per day / week / month come straight from the rollup rows
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyStockBalance, Product, StockMovement
+
+
+def record_movements(movements):
+    """
+    Add saved StockMovement rows to the rollup. Uses two statements per
+    distinct movement date however many products are involved: one
+    INSERT ... ON CONFLICT IGNORE to make sure the rows exist and one UPDATE
+    adding the deltas.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for movement in movements:
+        if movement.movement_type not in ("In", "Out"):
+            continue  # Transfers leave the product's stock unchanged
+        key = (movement.movement_date, movement.product_id)
+        totals[key][0 if movement.movement_type == "In" else 1] += movement.quantity
+
+    by_date = defaultdict(dict)
+    for (date, product_id), in_out in totals.items():
+        by_date[date][product_id] = in_out
+
+    for date, products in by_date.items():
+        DailyStockBalance.objects.bulk_create(
+            [
+                DailyStockBalance(product_id=product_id, date=date)
+                for product_id in products
+            ],
+            ignore_conflicts=True,
+        )
+        DailyStockBalance.objects.filter(
+            date=date, product_id__in=list(products)
+        ).update(
+            quantity_in=F("quantity_in") + _per_product(products, 0),
+            quantity_out=F("quantity_out") + _per_product(products, 1),
+        )
+
+
+def _per_product(products, index):
+    return Case(
+        *[
+            When(product_id=product_id, then=Value(in_out[index]))
+            for product_id, in_out in products.items()
+        ],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def _net():
+    return Sum(F("quantity_in") - F("quantity_out"))
+
+
+def stock_as_of(product, date):
+    """Stock level of ``product`` at the end of ``date``."""
+    later = DailyStockBalance.objects.filter(
+        product=product, date__gt=date
+    ).aggregate(net=_net())["net"]
+    current = Product.objects.values_list("stock_quantity", flat=True).get(
+        pk=product.pk
+    )
+    return current - (later or 0)
+
+
+PERIODS = {
+    "day": F("date"),
+    "week": TruncWeek("date"),
+    "month": TruncMonth("date"),
+}
+
+
+def movement_totals(start, end, period="day", product=None):
+    """
+    In/Out/net totals between ``start`` and ``end`` (inclusive), one dict per
+    period, optionally for a single product.
+    """
+    balances = DailyStockBalance.objects.filter(date__gte=start, date__lte=end)
+    if product is not None:
+        balances = balances.filter(product=product)
+    return list(
+        balances.annotate(period=PERIODS[period])
+        .values("period")
+        .annotate(
+            quantity_in=Sum("quantity_in"),
+            quantity_out=Sum("quantity_out"),
+        )
+        .annotate(net=F("quantity_in") - F("quantity_out"))
+        .order_by("period")
+    )
+
+
+def rebuild(chunk_size=1000, since=None):
+    """
+    Recompute the rollup from StockMovement, ``chunk_size`` products at a
+    time so each aggregation stays small. With ``since`` only days from that
+    date on are rebuilt. Returns the number of rollup rows written.
+    """
+    written = 0
+    product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+    last_id = 0
+    while True:
+        chunk = list(product_ids.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            return written
+        last_id = chunk[-1]
+
+        movements = StockMovement.objects.filter(product_id__in=chunk)
+        balances = DailyStockBalance.objects.filter(product_id__in=chunk)
+        if since is not None:
+            movements = movements.filter(movement_date__gte=since)
+            balances = balances.filter(date__gte=since)
+
+        rows = (
+            movements.values("product_id", "movement_date")
+            .annotate(
+                quantity_in=Sum("quantity", filter=Q(movement_type="In")),
+                quantity_out=Sum("quantity", filter=Q(movement_type="Out")),
+            )
+            .order_by()
+        )
+        with transaction.atomic():
+            balances.delete()
+            created = DailyStockBalance.objects.bulk_create(
+                [
+                    DailyStockBalance(
+                        product_id=row["product_id"],
+                        date=row["movement_date"],
+                        quantity_in=row["quantity_in"] or 0,
+                        quantity_out=row["quantity_out"] or 0,
+                    )
+                    for row in rows
+                ],
+                batch_size=chunk_size,
+            )
+        written += len(created)
@@ -0,0 +1,175 @@
+# core/routing.py
+"""
+Read-replica routing.
+
+Views that only read are wrapped in ``replica_reads``, and reports run
+inside ``reading_from_replica()``. While they run, ReplicaRouter sends
+their reads to one of the aliases in ``DATABASE_ROUTING["REPLICAS"]``,
+picked at random. Every other read, and every write, goes to ``default``,
+the primary.
+
+A replica may lag behind the primary. After a write, a view calls
+``pin_to_primary(request)``. ReplicaRoutingMiddleware then sets a signed
+cookie, and while the cookie is valid that browser reads from the primary
+too, so it always sees its own changes. The cookie lasts until the browser
+session ends, or ``PIN_SECONDS`` if that is set.
+
+Pages cached by core/pagecache.py are keyed by ``read_source()``, so a page
+rendered from a lagging replica is never served to a pinned user. Nor is it
+cached at all within ``MAX_LAG_SECONDS`` of a write to a table it shows
+(``replica_may_lag``): the replica may not have that write yet, and the page
+would be stored under the version the write bumped to.
+"""
+import contextlib
+import contextvars
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import versioning
+
+DEFAULTS = {
+    # Aliases in DATABASES serving replica reads; none disables routing
+    "REPLICAS": [],
+    # How long a write pins the browser to the primary; None for the session
+    "PIN_SECONDS": None,
+    "PIN_COOKIE": "db_pin",
+    # How far a replica may fall behind; replica reads are not cached this
+    # soon after a write to a table they read
+    "MAX_LAG_SECONDS": 5,
+}
+
+_PIN_SALT = "core.routing.pin"
+
+# Alias reads go to in the current request; None means the primary
+_read_alias = contextvars.ContextVar("core_read_alias", default=None)
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "DATABASE_ROUTING", {}))
+    return config
+
+
+def read_source():
+    """Where the current request reads from: "replica" or "primary"."""
+    return "primary" if _read_alias.get() is None else "replica"
+
+
+def replica_may_lag(*version_names):
+    """
+    True if the current request reads from a replica and one of
+    ``version_names`` was bumped within MAX_LAG_SECONDS, so what it read may
+    predate that write and must not be cached under the current versions.
+    """
+    if read_source() != "replica":
+        return False
+    modified = versioning.get_last_modified(*version_names)
+    return time.time() - modified < get_config()["MAX_LAG_SECONDS"]
+
+
+def _pick_replica():
+    replicas = get_config()["REPLICAS"]
+    return random.choice(replicas) if replicas else None
+
+
+@contextlib.contextmanager
+def reading_from_replica():
+    """Send the reads made inside the block to a replica, if there is one."""
+    token = _read_alias.set(_pick_replica())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def is_pinned(request):
+    return getattr(request, "db_pinned", False)
+
+
+def pin_to_primary(request):
+    """Read from the primary for the rest of this browser session."""
+    request.db_pinned = True
+    request._db_pin_changed = True
+
+
+def _routed(iterable, alias):
+    """Route the reads made while a streaming response is consumed."""
+    iterator = iter(iterable)
+    while True:
+        token = _read_alias.set(alias)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _read_alias.reset(token)
+        yield chunk
+
+
+def replica_reads(view):
+    """Serve a read-only view from a replica unless the browser is pinned."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = None if is_pinned(request) else _pick_replica()
+        if alias is None:
+            return view(request, *args, **kwargs)
+        token = _read_alias.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            _read_alias.reset(token)
+        if response.streaming:
+            response.streaming_content = _routed(response.streaming_content, alias)
+        return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so saving an object loaded from a replica still writes
+        # to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *get_config()["REPLICAS"]}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Reads and sets the signed cookie that pins a browser to the primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_config()
+        request.db_pinned = bool(
+            request.get_signed_cookie(
+                config["PIN_COOKIE"],
+                default=None,
+                salt=_PIN_SALT,
+                max_age=config["PIN_SECONDS"],
+            )
+        )
+        response = self.get_response(request)
+        if getattr(request, "_db_pin_changed", False):
+            response.set_signed_cookie(
+                config["PIN_COOKIE"],
+                "1",
+                salt=_PIN_SALT,
+                max_age=config["PIN_SECONDS"],
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
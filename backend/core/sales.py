@@ -0,0 +1,328 @@
+# core/sales.py
+"""
+Daily sales rollups.
+
+DailyProductSales and DailyCategorySales hold, per product / category and
+per order date, the orders, units and revenue placed, and how much of that
+was later completed or cancelled. The stock service calls ``record`` in the
+same transaction that places, completes or cancels an order, so the home
+dashboard reads a few rollup rows instead of aggregating SaleOrder:
+
+* pending  = placed - completed - cancelled
+* net      = placed - cancelled
+
+An order counts once in ``orders`` for every product (and category) it
+contains. Amounts are booked against the order's ``sale_date`` (not the day it was
+completed or cancelled) so ``rebuild`` can reproduce the tables exactly from
+SaleOrder/SaleOrderLine. Categories are taken as they were when the order was
+written; ``rebuild`` uses the current ones.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
+
+from .models import (
+    DailyCategorySales,
+    DailyProductSales,
+    MoneyField,
+    Product,
+    SaleOrder,
+    SaleOrderLine,
+)
+
+PLACED, COMPLETED, CANCELLED = "placed", "completed", "cancelled"
+
+# Rollup columns (orders, quantity, revenue) each kind of change adds to
+COLUMNS = {
+    PLACED: ("orders", "quantity", "revenue"),
+    COMPLETED: ("completed_orders", "completed_quantity", "completed_revenue"),
+    CANCELLED: ("cancelled_orders", "cancelled_quantity", "cancelled_revenue"),
+}
+STATUS_KINDS = {"Completed": COMPLETED, "Cancelled": CANCELLED}
+
+
+def record(kind, date, lines):
+    """
+    Add one order's ``(product_id, category, quantity, revenue)`` lines to
+    both rollups, however many lines: two statements per table for a placed
+    order, and usually one for a completed or cancelled order, whose rows
+    were created when it was placed.
+    """
+    products = defaultdict(lambda: [1, 0, Decimal("0")])
+    categories = defaultdict(lambda: [1, 0, Decimal("0")])
+    for product_id, category, quantity, revenue in lines:
+        for totals in (products[product_id], categories[category]):
+            totals[1] += quantity
+            totals[2] += revenue
+    add = _create_and_add if kind == PLACED else _add
+    add(DailyProductSales, "product_id", date, products, COLUMNS[kind])
+    add(DailyCategorySales, "category", date, categories, COLUMNS[kind])
+
+
+def _create_and_add(model, key, date, totals, columns):
+    if not totals:
+        return
+    model.objects.bulk_create(
+        [model(**{key: value, "date": date}) for value in totals],
+        ignore_conflicts=True,
+    )
+    _rows(model, key, date, totals).update(**_increments(key, totals, columns))
+
+
+def _add(model, key, date, totals, columns):
+    """
+    Add to rows that should already exist, creating any that do not (e.g.
+    the category of a product that moved category since the order).
+    """
+    if not totals:
+        return
+    rows = _rows(model, key, date, totals)
+    if rows.update(**_increments(key, totals, columns)) == len(totals):
+        return
+    existing = set(rows.values_list(key, flat=True))
+    _create_and_add(
+        model,
+        key,
+        date,
+        {value: amounts for value, amounts in totals.items() if value not in existing},
+        columns,
+    )
+
+
+def _rows(model, key, date, totals):
+    return model.objects.filter(date=date, **{f"{key}__in": list(totals)})
+
+
+def _increments(key, totals, columns):
+    return {
+        column: F(column) + _per_key(key, totals, index, column)
+        for index, column in enumerate(columns)
+    }
+
+
+def _per_key(key, totals, index, column):
+    output_field = MoneyField() if column.endswith("revenue") else IntegerField()
+    return Case(
+        *[
+            When(**{key: value}, then=Value(amounts[index], output_field=output_field))
+            for value, amounts in totals.items()
+        ],
+        default=Value(0),
+        output_field=output_field,
+    )
+
+
+# ----- dashboard reads -----
+
+
+def _totals():
+    totals = {}
+    for columns in COLUMNS.values():
+        for column in columns:
+            totals[column] = Sum(column)
+    return totals
+
+
+def _with_derived(row):
+    zero = Decimal("0")
+    for column in _totals():
+        if row.get(column) is None:
+            row[column] = zero if column.endswith("revenue") else 0
+    row["net_revenue"] = row["revenue"] - row["cancelled_revenue"]
+    row["net_quantity"] = row["quantity"] - row["cancelled_quantity"]
+    row["pending_quantity"] = (
+        row["quantity"] - row["completed_quantity"] - row["cancelled_quantity"]
+    )
+    return row
+
+
+def summary(start, end):
+    """Totals over ``start``..``end`` (inclusive)."""
+    return _with_derived(
+        DailyCategorySales.objects.filter(date__gte=start, date__lte=end).aggregate(
+            **_totals()
+        )
+    )
+
+
+def daily(start, end):
+    """One row of totals per day with sales, oldest first."""
+    rows = (
+        DailyCategorySales.objects.filter(date__gte=start, date__lte=end)
+        .values("date")
+        .annotate(**_totals())
+        .order_by("date")
+    )
+    return [_with_derived(row) for row in rows]
+
+
+def top_products(start, end, limit=10):
+    """Best-selling products by net revenue, with their names."""
+    rows = (
+        DailyProductSales.objects.filter(date__gte=start, date__lte=end)
+        .values("product_id", "product__name")
+        .annotate(**_totals())
+        .annotate(net=F("revenue") - F("cancelled_revenue"))
+        .order_by("-net", "product_id")[:limit]
+    )
+    return [_with_derived(row) for row in rows]
+
+
+def top_categories(start, end, limit=10):
+    rows = (
+        DailyCategorySales.objects.filter(date__gte=start, date__lte=end)
+        .values("category")
+        .annotate(**_totals())
+        .annotate(net=F("revenue") - F("cancelled_revenue"))
+        .order_by("-net", "category")[:limit]
+    )
+    return [_with_derived(row) for row in rows]
+
+
+def dashboard(days=30, today=None):
+    today = today or datetime.date.today()
+    start = today - datetime.timedelta(days=days - 1)
+    return {
+        "start": start,
+        "end": today,
+        "summary": summary(start, today),
+        "daily": daily(start, today),
+        "top_products": top_products(start, today),
+        "top_categories": top_categories(start, today),
+    }
+
+
+# ----- rebuild -----
+
+
+def rebuild(since=None, chunk_size=1000):
+    """
+    Recompute both rollups from SaleOrder and SaleOrderLine, optionally only
+    for order dates from ``since`` on. Product rows are rebuilt ``chunk_size``
+    products at a time and category rows ``chunk_size`` categories at a time
+    from them, each chunk in its own transaction, so no aggregation or lock
+    covers the whole order history. Returns the number of rows written.
+    """
+    written = 0
+    product_ids = Product.objects.order_by("pk").values_list("pk", flat=True)
+    last_id = 0
+    while True:
+        chunk = list(product_ids.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1]
+        written += _rebuild_products(chunk, since, chunk_size)
+
+    categories = (
+        Product.objects.order_by("category")
+        .values_list("category", flat=True)
+        .distinct()
+    )
+    last_category = None
+    while True:
+        remaining = categories
+        if last_category is not None:
+            remaining = categories.filter(category__gt=last_category)
+        chunk = list(remaining[:chunk_size])
+        if not chunk:
+            break
+        last_category = chunk[-1]
+        written += _rebuild_categories(chunk, since, chunk_size)
+
+    # Rows of categories no product belongs to any more
+    stale = DailyCategorySales.objects.exclude(
+        category__in=Product.objects.values("category")
+    )
+    if since is not None:
+        stale = stale.filter(date__gte=since)
+    stale.delete()
+    return written
+
+
+def _rebuild_products(product_ids, since, batch_size):
+    orders = SaleOrder.objects.all()
+    product_sales = DailyProductSales.objects.filter(product_id__in=product_ids)
+    if since is not None:
+        orders = orders.filter(sale_date__gte=since)
+        product_sales = product_sales.filter(date__gte=since)
+
+    # (product_id, date) -> {column: amount}
+    product_rows = defaultdict(lambda: defaultdict(int))
+    single = (
+        orders.filter(product_id__in=product_ids)
+        .values("product_id", "sale_date", "status")
+        .annotate(orders=Count("id"), quantity=Sum("quantity"), revenue=Sum("total_price"))
+        .order_by()
+    )
+    for row in single:
+        _accumulate(product_rows[(row["product_id"], row["sale_date"])], row)
+
+    multi = (
+        SaleOrderLine.objects.filter(
+            product_id__in=product_ids,
+            order__in=orders.filter(product__isnull=True),
+        )
+        .values("product_id", "order__sale_date", "order__status")
+        .annotate(
+            orders=Count("order_id", distinct=True),
+            quantity=Sum("quantity"),
+            revenue=Sum("line_total"),
+        )
+        .order_by()
+    )
+    for row in multi:
+        row["status"] = row["order__status"]
+        _accumulate(product_rows[(row["product_id"], row["order__sale_date"])], row)
+
+    with transaction.atomic():
+        product_sales.delete()
+        created = DailyProductSales.objects.bulk_create(
+            [
+                DailyProductSales(product_id=product_id, date=date, **amounts)
+                for (product_id, date), amounts in product_rows.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def _rebuild_categories(categories, since, batch_size):
+    """Sum the (rebuilt) product rows by each product's current category."""
+    product_sales = DailyProductSales.objects.filter(product__category__in=categories)
+    category_sales = DailyCategorySales.objects.filter(category__in=categories)
+    if since is not None:
+        product_sales = product_sales.filter(date__gte=since)
+        category_sales = category_sales.filter(date__gte=since)
+    rows = (
+        product_sales.values("product__category", "date")
+        .annotate(**_totals())
+        .order_by()
+    )
+    with transaction.atomic():
+        category_sales.delete()
+        created = DailyCategorySales.objects.bulk_create(
+            [
+                DailyCategorySales(
+                    category=row.pop("product__category"), date=row.pop("date"), **row
+                )
+                for row in rows
+            ],
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def _accumulate(target, row):
+    """Add one aggregated (status, orders, quantity, revenue) row."""
+    kinds = [PLACED]
+    if row["status"] in STATUS_KINDS:
+        kinds.append(STATUS_KINDS[row["status"]])
+    revenue = row["revenue"] or Decimal("0")
+    for kind in kinds:
+        orders, quantity, revenue_column = COLUMNS[kind]
+        target[orders] += row["orders"]
+        target[quantity] += row["quantity"]
+        target[revenue_column] += revenue
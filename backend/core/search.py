@@ -0,0 +1,194 @@
+# core/search.py
+"""
+Indexed substring search for products and suppliers.
+
+On SQLite the search runs against FTS5 tables using the trigram tokenizer
+(``core_product_fts`` / ``core_supplier_fts``). Triggers created by migration
+0005 keep them in sync with every insert, delete and rename, including
+``bulk_create`` and queryset updates.
+
+Other backends use SearchTrigram, a plain inverted index of 3-character
+substrings kept in sync by signals (see core/signals.py). Both paths return
+a subquery of matching primary keys, so callers just add
+``pk__in=...`` to their existing queryset and nothing is materialised in
+Python.
+
+Terms shorter than three characters cannot be served by a trigram index and
+fall back to ``icontains``.
+"""
+from django.db import connection
+from django.db.models import Count, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Product, SearchTrigram, Supplier
+
+# model -> (fts table, indexed fields)
+INDEXED = {
+    Product: ("core_product_fts", ("name",)),
+    Supplier: ("core_supplier_fts", ("name", "email")),
+}
+
+
+def uses_fts():
+    return connection.vendor == "sqlite"
+
+
+def trigrams(text):
+    text = (text or "").lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def matching_ids(model, term):
+    """
+    An expression selecting the primary keys of ``model`` rows whose indexed
+    fields contain ``term`` (case-insensitive). Use as ``pk__in=...``.
+    """
+    table, fields = INDEXED[model]
+    if uses_fts():
+        return RawSQL(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH %s",
+            [_fts_phrase(term)],
+        )
+    grams = trigrams(term)
+    return (
+        SearchTrigram.objects.filter(
+            model=model._meta.model_name, trigram__in=grams
+        )
+        .values("object_id")
+        .annotate(hits=Count("trigram", distinct=True))
+        .filter(hits=len(grams))
+        .values("object_id")
+    )
+
+
+def _contains(fields, term, prefix=""):
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f"{prefix}{field}__icontains": term})
+    return condition
+
+
+def filter_queryset(queryset, term, model=None, prefix=""):
+    """
+    Restrict ``queryset`` to rows matching ``term``. ``model``/``prefix`` let
+    a related model's index drive the filter, e.g. filtering StockMovement
+    by ``model=Product, prefix="product__"``.
+    """
+    model = model or queryset.model
+    _table, fields = INDEXED[model]
+    if len(term) < 3:
+        return queryset.filter(_contains(fields, term, prefix))
+    matches = queryset.filter(**{f"{prefix}pk__in": matching_ids(model, term)})
+    if uses_fts():
+        return matches
+    # Trigram hits are candidates; confirm the exact substring.
+    return matches.filter(_contains(fields, term, prefix))
+
+
+def rank(queryset, term):
+    """
+    Annotate ``search_rank`` (lower is better) from FTS5's bm25 score so
+    callers can order by relevance, e.g. ``("search_rank", "id")``. Every
+    row ranks 0 on other backends and for short terms.
+    """
+    table, _fields = INDEXED[queryset.model]
+    if not uses_fts() or len(term) < 3:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    db_table = queryset.model._meta.db_table
+    return queryset.annotate(
+        search_rank=RawSQL(
+            f"SELECT rank FROM {table} WHERE {table} MATCH %s "
+            f"AND rowid = {db_table}.id",
+            [_fts_phrase(term)],
+            output_field=FloatField(),
+        )
+    )
+
+
+# ----- FTS5 setup (SQLite) -----
+
+
+def _fts_statements(table, source, fields):
+    cols = ", ".join(fields)
+    new_vals = ", ".join(f"new.{f}" for f in fields)
+    old_vals = ", ".join(f"old.{f}" for f in fields)
+    delete = (
+        f"INSERT INTO {table}({table}, rowid, {cols}) "
+        f"VALUES ('delete', old.id, {old_vals});"
+    )
+    insert = f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_vals});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} "
+        f"ON {source} BEGIN {delete} {insert} END",
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+def install_fts(schema_editor):
+    """
+    Create the FTS5 tables and sync triggers and rebuild their contents.
+    Safe to run repeatedly; migrations that rebuild core_product or
+    core_supplier on SQLite (which drops their triggers) call it again.
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for model, (table, fields) in INDEXED.items():
+        for statement in _fts_statements(table, model._meta.db_table, fields):
+            schema_editor.execute(statement)
+
+
+def uninstall_fts(schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for _model, (table, _fields) in INDEXED.items():
+        for suffix in ("_ai", "_ad", "_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+# ----- inverted index maintenance (non-FTS backends) -----
+
+
+def index_object(instance):
+    model = type(instance)
+    _table, fields = INDEXED[model]
+    grams = set()
+    for field in fields:
+        grams |= trigrams(getattr(instance, field))
+    model_name = model._meta.model_name
+    SearchTrigram.objects.filter(
+        model=model_name, object_id=instance.pk
+    ).delete()
+    SearchTrigram.objects.bulk_create(
+        SearchTrigram(model=model_name, object_id=instance.pk, trigram=gram)
+        for gram in grams
+    )
+
+
+def unindex_object(instance):
+    SearchTrigram.objects.filter(
+        model=type(instance)._meta.model_name, object_id=instance.pk
+    ).delete()
+
+
+def rebuild(model, queryset=None, chunk_size=2000):
+    """
+    Reindex ``queryset`` (default: every row) into SearchTrigram. Needed after
+    bulk writes that bypass signals; a no-op when FTS triggers are in use.
+    """
+    if uses_fts():
+        return
+    _table, fields = INDEXED[model]
+    queryset = queryset if queryset is not None else model.objects.all()
+    for instance in queryset.only("pk", *fields).iterator(chunk_size=chunk_size):
+        index_object(instance)
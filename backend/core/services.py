@@ -0,0 +1,529 @@
+# core/services.py
+"""
+Stock mutation service.
+
+Every change to stock goes through this module so counters are updated with
+single ``UPDATE ... SET quantity = quantity +/- n`` statements instead of a
+read-modify-write in Python. Stock is held per location in StockLevel rows;
+'Out' movements are refused by a conditional UPDATE of the location's row,
+so sites selling the same product never contend on one row for the check.
+``Product.stock_quantity`` holds the total over all locations and is
+adjusted in the same transaction, after the location's row, so its lock is
+taken last and held only until commit; transfers between locations leave
+it alone. It stays synchronous rather than being refreshed from StockLevel
+later because other writes and reads rely on it being exact as of the
+commit: reorder alerts (core/reorder.py) compare it with the reorder point
+inside the same transaction, the stock level check, the stock-levels API
+and the forecast's days of cover filter and sort on it through its index,
+and ``ledger.check()`` expects it to equal the ledger and the location
+total at every commit. The matching ``StockMovement`` row, and its DailyStockBalance rollup
+(see core/rollups.py), are written in the same transaction, as are any
+reorder alert transitions (core/reorder.py) and, for sale orders, the daily
+sales rollups (core/sales.py). Live listeners are notified once it commits
+(core/events.py).
+"""
+from collections import OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce
+
+from . import events, reorder, rollups, sales, versioning
+from .models import (
+    Product,
+    SaleOrder,
+    SaleOrderLine,
+    StockLevel,
+    StockMovement,
+    default_location,
+)
+
+
+class InsufficientStock(Exception):
+    """Raised when an 'Out' movement would take a location's stock below zero."""
+
+    def __init__(self, product_id, quantity):
+        self.product_id = product_id
+        self.quantity = quantity
+        super().__init__(
+            f"Insufficient stock for product #{product_id} (requested {quantity})."
+        )
+
+
+class CheckoutError(Exception):
+    """
+    Raised when one or more checkout lines cannot be fulfilled.
+    ``errors`` maps the index of each failing line to a message.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} order line(s) could not be fulfilled.")
+
+
+def resolve_location(location):
+    """Primary key of ``location`` (a Location, a pk or None for the default)."""
+    if location is None:
+        return default_location()
+    return getattr(location, "pk", location)
+
+
+def open_stock_levels(products, using=None):
+    """
+    StockLevel rows for new products: the stock they were created with, held
+    at the default location.
+    """
+    location_id = default_location()
+    StockLevel.objects.using(using).bulk_create(
+        StockLevel(
+            product_id=product.pk,
+            location_id=location_id,
+            quantity=product.stock_quantity,
+        )
+        for product in products
+    )
+
+
+def _add_to_level(product_id, location_id, quantity):
+    """Add units to a location's StockLevel row, creating it on first use."""
+    levels = StockLevel.objects.filter(product_id=product_id, location_id=location_id)
+    if levels.update(quantity=F("quantity") + quantity):
+        return
+    try:
+        with transaction.atomic():
+            StockLevel.objects.create(
+                product_id=product_id, location_id=location_id, quantity=quantity
+            )
+    except IntegrityError:
+        # Created by a concurrent movement since our UPDATE
+        levels.update(quantity=F("quantity") + quantity)
+
+
+def _take_from_level(product_id, location_id, quantity):
+    """
+    Remove units from a location in one statement. Only succeeds if the row
+    still has at least ``quantity`` units, so concurrent requests can never
+    oversell the same unit.
+    """
+    taken = StockLevel.objects.filter(
+        product_id=product_id, location_id=location_id, quantity__gte=quantity
+    ).update(quantity=F("quantity") - quantity)
+    if not taken:
+        raise InsufficientStock(product_id, quantity)
+
+
+def _apply_delta(product_id, quantity, movement_type, location_id):
+    """
+    Apply a stock delta to the product's level at ``location_id``, then to
+    its total. Both directions lock the level row before the product row,
+    so an 'In' and an 'Out' of the same product cannot deadlock, and a
+    refused 'Out' never touches the product row.
+    """
+    if movement_type == "In":
+        _add_to_level(product_id, location_id, quantity)
+        delta = quantity
+    else:  # 'Out'
+        _take_from_level(product_id, location_id, quantity)
+        delta = -quantity
+    if not Product.objects.filter(pk=product_id).update(
+        stock_quantity=F("stock_quantity") + delta
+    ):
+        # The product is gone; the caller's transaction undoes the level.
+        raise InsufficientStock(product_id, quantity)
+    versioning.bump_on_commit("product")
+    events.publish_stock_changes(
+        {product_id: quantity if movement_type == "In" else -quantity}
+    )
+    reorder.evaluate([product_id])
+
+
+def record_movement(product, quantity, movement_type, notes="", location=None):
+    """
+    Adjust the product's stock at ``location`` (default: the default
+    location) and write the StockMovement row atomically. Raises
+    InsufficientStock if an 'Out' movement cannot be satisfied there.
+    """
+    location_id = resolve_location(location)
+    with transaction.atomic():
+        _apply_delta(product.pk, quantity, movement_type, location_id)
+        movement = StockMovement.objects.create(
+            product=product,
+            quantity=quantity,
+            movement_type=movement_type,
+            notes=notes,
+            location_id=location_id,
+        )
+        rollups.record_movements([movement])
+    return movement
+
+
+def transfer(product, quantity, from_location, to_location, notes=""):
+    """
+    Move stock between two locations and write one 'Transfer' movement. The
+    product's total is unchanged, so its row is not touched. Raises
+    InsufficientStock if ``from_location`` has too few units.
+    """
+    from_id, to_id = resolve_location(from_location), resolve_location(to_location)
+    if from_id == to_id:
+        raise ValueError("A transfer needs two different locations.")
+    with transaction.atomic():
+        _take_from_level(product.pk, from_id, quantity)
+        _add_to_level(product.pk, to_id, quantity)
+        movement = StockMovement.objects.create(
+            product=product,
+            quantity=quantity,
+            movement_type="Transfer",
+            notes=notes,
+            location_id=from_id,
+            to_location_id=to_id,
+        )
+        # Per-location pages and counts are keyed on "product"
+        versioning.bump_on_commit("product")
+    return movement
+
+
+def place_sale_order(product, quantity, location=None):
+    """
+    Reserve stock at ``location`` for a new Pending order and record the
+    'Out' movement. Raises InsufficientStock (and writes nothing) if the
+    location has too little stock.
+    """
+    price = Product._meta.get_field("price").to_python(product.price)
+    location_id = resolve_location(location)
+    with transaction.atomic():
+        _apply_delta(product.pk, quantity, "Out", location_id)
+        sale_order = SaleOrder.objects.create(
+            product=product,
+            quantity=quantity,
+            total_price=price * quantity,
+            status="Pending",
+            location_id=location_id,
+        )
+        movement = StockMovement.objects.create(
+            product=product,
+            quantity=quantity,
+            movement_type="Out",
+            notes=f"Sale Order #{sale_order.pk}",
+            location_id=location_id,
+        )
+        rollups.record_movements([movement])
+        sales.record(
+            sales.PLACED,
+            sale_order.sale_date,
+            [(product.pk, product.category, quantity, sale_order.total_price)],
+        )
+    return sale_order
+
+
+def _merge_lines(lines):
+    """Sum quantities per product id, keeping product ids in sorted order."""
+    merged = {}
+    for product_id, quantity in lines:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return OrderedDict(sorted(merged.items()))
+
+
+def _apply_bulk_delta(quantities, movement_type, location_id):
+    """
+    Apply per-product deltas to several products at one location with a
+    CASE expression: one UPDATE of their StockLevel rows, then one of their
+    totals (kept in step for the reasons in the module docstring). For 'Out' the level update only touches rows that still
+    have enough stock, and the call fails if any row was skipped.
+    """
+    if not quantities:
+        return
+    sign = 1 if movement_type == "In" else -1
+    levels = StockLevel.objects.filter(
+        location_id=location_id, product_id__in=list(quantities)
+    )
+    if movement_type == "In":
+        StockLevel.objects.bulk_create(
+            [
+                StockLevel(product_id=product_id, location_id=location_id)
+                for product_id in quantities
+            ],
+            ignore_conflicts=True,
+        )
+    else:
+        enough = Q()
+        for product_id, quantity in quantities.items():
+            enough |= Q(product_id=product_id, quantity__gte=quantity)
+        levels = levels.filter(enough)
+    updated = levels.update(
+        quantity=Case(
+            *[
+                When(product_id=product_id, then=F("quantity") + sign * quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            default=F("quantity"),
+        )
+    )
+    if updated != len(quantities):
+        # A level ran short after the caller checked it; checkout() reports
+        # which lines once its transaction has rolled back.
+        raise CheckoutError({})
+    Product.objects.filter(pk__in=list(quantities)).update(
+        stock_quantity=Case(
+            *[
+                When(pk=product_id, then=F("stock_quantity") + sign * quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            default=F("stock_quantity"),
+        )
+    )
+    versioning.bump_on_commit("product")
+    events.publish_stock_changes(
+        {product_id: sign * quantity for product_id, quantity in quantities.items()}
+    )
+    reorder.evaluate(list(quantities))
+
+
+def apply_queued_movements(queued):
+    """
+    Write StockMovement rows for a batch of QueuedStockMovement and add one
+    coalesced delta per product and location, with a constant number of
+    statements per location however large the batch. Call inside a
+    transaction (see core/stockqueue.py).
+    """
+    movements = StockMovement.objects.bulk_create(
+        StockMovement(
+            product_id=item.product_id,
+            quantity=item.quantity,
+            movement_type="In",
+            notes=item.notes,
+            location_id=item.location_id,
+        )
+        for item in queued
+    )
+    by_location = {}
+    for item in queued:
+        by_location.setdefault(item.location_id, []).append(
+            (item.product_id, item.quantity)
+        )
+    for location_id, lines in sorted(by_location.items()):
+        _apply_bulk_delta(_merge_lines(lines), "In", location_id)
+    rollups.record_movements(movements)
+    versioning.bump_on_commit("stockmovement")
+    return movements
+
+
+def checkout(lines, location=None):
+    """
+    Create one Pending order from many ``(product_id, quantity)`` lines,
+    allocated from ``location`` (default: the default location).
+
+    All affected products are locked in primary-key order, every line is
+    validated up front against the location's stock, and the order lines,
+    the stock updates and the StockMovement rows are each written with a
+    single statement, so the number of queries does not grow with the
+    number of lines.
+
+    Raises CheckoutError with per-line messages if any line cannot be
+    fulfilled; nothing is written in that case.
+    """
+    lines = list(lines)
+    if not lines:
+        raise CheckoutError({})
+    quantities = _merge_lines(lines)
+    location_id = resolve_location(location)
+    try:
+        return _checkout(lines, quantities, location_id)
+    except CheckoutError as exc:
+        if exc.errors:
+            raise
+        # Stock was taken between the up-front check and the conditional
+        # update; read what is left now that nothing of this order remains.
+        available = dict(
+            StockLevel.objects.filter(
+                location_id=location_id, product_id__in=list(quantities)
+            ).values_list("product_id", "quantity")
+        )
+        errors = _line_errors(
+            lines,
+            quantities,
+            {product_id: available.get(product_id, 0) for product_id in quantities},
+        )
+        if not errors:
+            errors = {
+                index: "Stock changed meanwhile. Please try again."
+                for index in range(len(lines))
+            }
+        raise CheckoutError(errors) from exc
+
+
+def _line_errors(lines, quantities, available):
+    """
+    Per-line messages for ``lines`` given ``{product_id: available}``; a
+    product missing from ``available`` does not exist.
+    """
+    errors = {}
+    for index, (product_id, _quantity) in enumerate(lines):
+        if product_id not in available:
+            errors[index] = "This product does not exist."
+        elif available[product_id] < quantities[product_id]:
+            errors[index] = (
+                f"Insufficient stock. Currently "
+                f"{available[product_id]} in stock."
+            )
+    return errors
+
+
+def _checkout(lines, quantities, location_id):
+    available = StockLevel.objects.filter(
+        product=OuterRef("pk"), location_id=location_id
+    ).values("quantity")
+
+    with transaction.atomic():
+        products = {
+            product.pk: product
+            for product in Product.objects.select_for_update()
+            .filter(pk__in=list(quantities))
+            .order_by("pk")
+            .only("pk", "price", "category")
+            .annotate(
+                available=Coalesce(
+                    Subquery(available, output_field=IntegerField()), 0
+                )
+            )
+        }
+
+        errors = _line_errors(
+            lines,
+            quantities,
+            {product.pk: product.available for product in products.values()},
+        )
+        if errors:
+            raise CheckoutError(errors)
+
+        order_lines = []
+        for product_id, quantity in quantities.items():
+            unit_price = products[product_id].price
+            order_lines.append(
+                SaleOrderLine(
+                    product_id=product_id,
+                    quantity=quantity,
+                    unit_price=unit_price,
+                    line_total=unit_price * quantity,
+                )
+            )
+
+        sale_order = SaleOrder.objects.create(
+            quantity=sum(quantities.values()),
+            total_price=sum(line.line_total for line in order_lines),
+            status="Pending",
+            location_id=location_id,
+        )
+        for line in order_lines:
+            line.order = sale_order
+        SaleOrderLine.objects.bulk_create(order_lines)
+
+        _apply_bulk_delta(quantities, "Out", location_id)
+        movements = StockMovement.objects.bulk_create(
+            StockMovement(
+                product_id=product_id,
+                quantity=quantity,
+                movement_type="Out",
+                notes=f"Sale Order #{sale_order.pk}",
+                location_id=location_id,
+            )
+            for product_id, quantity in quantities.items()
+        )
+        rollups.record_movements(movements)
+        sales.record(
+            sales.PLACED,
+            sale_order.sale_date,
+            [
+                (
+                    line.product_id,
+                    products[line.product_id].category,
+                    line.quantity,
+                    line.line_total,
+                )
+                for line in order_lines
+            ],
+        )
+        versioning.bump_on_commit("saleorder", "stockmovement")
+    return sale_order
+
+
+def _sale_lines(sale_order):
+    """The order's ``(product_id, category, quantity, revenue)`` lines, in one query."""
+    if sale_order.product_id is not None:
+        category = (
+            Product.objects.filter(pk=sale_order.product_id)
+            .values_list("category", flat=True)
+            .first()
+        )
+        total_price = SaleOrder._meta.get_field("total_price").to_python(
+            sale_order.total_price
+        )
+        return [(sale_order.product_id, category, sale_order.quantity, total_price)]
+    return list(
+        sale_order.lines.values_list(
+            "product_id", "product__category", "quantity", "line_total"
+        )
+    )
+
+
+def cancel_sale_order(sale_order):
+    """
+    Cancel a Pending order and put its stock back where it was allocated
+    from. The status flip is itself a
+    conditional update, so two concurrent cancels restock only once.
+    Returns True if the order was cancelled by this call.
+    """
+    with transaction.atomic():
+        cancelled = SaleOrder.objects.filter(
+            pk=sale_order.pk, status="Pending"
+        ).update(status="Cancelled")
+        if not cancelled:
+            return False
+        notes = f"Cancelled Sale Order #{sale_order.pk}"
+        lines = _sale_lines(sale_order)
+        if sale_order.product_id is not None:
+            _apply_delta(
+                sale_order.product_id, sale_order.quantity, "In", sale_order.location_id
+            )
+            movements = [
+                StockMovement.objects.create(
+                    product_id=sale_order.product_id,
+                    quantity=sale_order.quantity,
+                    movement_type="In",
+                    notes=notes,
+                    location_id=sale_order.location_id,
+                )
+            ]
+        else:
+            quantities = _merge_lines(
+                (product_id, quantity) for product_id, _category, quantity, _revenue in lines
+            )
+            _apply_bulk_delta(quantities, "In", sale_order.location_id)
+            movements = StockMovement.objects.bulk_create(
+                StockMovement(
+                    product_id=product_id,
+                    quantity=quantity,
+                    movement_type="In",
+                    notes=notes,
+                    location_id=sale_order.location_id,
+                )
+                for product_id, quantity in quantities.items()
+            )
+        rollups.record_movements(movements)
+        sales.record(sales.CANCELLED, sale_order.sale_date, lines)
+        versioning.bump_on_commit("saleorder", "stockmovement")
+    sale_order.status = "Cancelled"
+    return True
+
+
+def complete_sale_order(sale_order):
+    """Mark a Pending order as Completed. Returns True on success."""
+    with transaction.atomic():
+        completed = SaleOrder.objects.filter(
+            pk=sale_order.pk, status="Pending"
+        ).update(status="Completed")
+        if not completed:
+            return False
+        sales.record(sales.COMPLETED, sale_order.sale_date, _sale_lines(sale_order))
+        versioning.bump_on_commit("saleorder")
+    sale_order.status = "Completed"
+    return True
@@ -0,0 +1,77 @@
+# core/signals.py
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import choices, ledger, reorder, search, services, versioning
+from .models import (
+    DEFAULT_LOCATION_KEY,
+    CategoryReorderDefault,
+    Location,
+    Product,
+    SaleOrder,
+    SaleOrderLine,
+    StockMovement,
+    Supplier,
+)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Supplier)
+def update_search_index(sender, instance, **kwargs):
+    # SQLite keeps its FTS5 tables in sync with triggers.
+    if not search.uses_fts():
+        search.index_object(instance)
+    versioning.bump_on_commit(
+        sender._meta.model_name, choices.version_name(sender)
+    )
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Supplier)
+def remove_from_search_index(sender, instance, **kwargs):
+    if not search.uses_fts():
+        search.unindex_object(instance)
+    versioning.bump_on_commit(
+        sender._meta.model_name, choices.version_name(sender)
+    )
+
+
+@receiver(post_save, sender=StockMovement)
+@receiver(post_save, sender=SaleOrder)
+@receiver(post_save, sender=SaleOrderLine)
+@receiver(post_delete, sender=StockMovement)
+@receiver(post_delete, sender=SaleOrder)
+@receiver(post_delete, sender=SaleOrderLine)
+def bump_version(sender, **kwargs):
+    # Order lines are only ever shown as part of their order.
+    name = "saleorder" if sender is SaleOrderLine else sender._meta.model_name
+    versioning.bump_on_commit(name)
+
+
+@receiver(post_save, sender=Product)
+def open_stock_ledger(sender, instance, created, using, **kwargs):
+    if created:
+        ledger.open_snapshots([instance], using=using)
+        services.open_stock_levels([instance], using=using)
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def bump_location_version(sender, **kwargs):
+    # The default may have moved to another location.
+    cache.delete(DEFAULT_LOCATION_KEY)
+    versioning.bump_on_commit("location", choices.version_name(sender))
+
+
+@receiver(post_save, sender=Product)
+def evaluate_reorder_point(sender, instance, **kwargs):
+    # Stock or reorder settings may have been edited directly.
+    reorder.evaluate([instance.pk])
+
+
+@receiver(post_save, sender=CategoryReorderDefault)
+@receiver(post_delete, sender=CategoryReorderDefault)
+def evaluate_category_reorder_points(sender, instance, **kwargs):
+    reorder.evaluate_category(instance.category)
+    versioning.bump_on_commit("categoryreorderdefault")
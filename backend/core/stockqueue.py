@@ -0,0 +1,160 @@
+# core/stockqueue.py
+"""
+Write-behind queue for scanned 'In' movements.
+
+With ``STOCK_QUEUE["ENABLED"]``, add_stock_movement does not touch the
+product for an 'In' movement: ``enqueue`` appends a QueuedStockMovement row
+(one INSERT) and the scanner gets its answer at once. ``manage.py
+drain_stock_queue`` then calls ``drain``, which takes up to ``BATCH_SIZE``
+queued rows at a time and, in one transaction, bulk-creates their
+StockMovement rows and adds one coalesced ``F()`` delta per product through
+core/services.py. A burst of scans of the same few products costs a few
+statements per batch instead of a transaction per scan.
+
+'Out' movements are never queued: they must be refused when stock is short,
+which needs the row's current value.
+
+Until the worker runs, ``Product.stock_quantity`` does not include queued
+movements, nor does the StockLevel of the location each was scanned at.
+``pending_deltas`` (per product and location), ``exact_stock`` and
+``with_pending`` add them back when a read needs the exact figure. Movements
+are dated when they are applied, not when they were queued.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from . import services, versioning
+from .models import Product, QueuedStockMovement, StockLevel
+
+DEFAULTS = {
+    "ENABLED": False,
+    # Queued movements applied per transaction by drain()
+    "BATCH_SIZE": 500,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "STOCK_QUEUE", {}))
+    return config
+
+
+def accepts(movement_type):
+    """True if a movement of this type is queued rather than applied now."""
+    return get_config()["ENABLED"] and movement_type == "In"
+
+
+def enqueue(product, quantity, notes="", location=None):
+    queued = QueuedStockMovement.objects.create(
+        product=product,
+        quantity=quantity,
+        notes=notes,
+        location_id=services.resolve_location(location),
+    )
+    versioning.bump_on_commit("stockqueue")
+    return queued
+
+
+def drain(batch_size=None):
+    """
+    Apply up to ``batch_size`` queued movements, oldest first, in one
+    transaction. Returns how many were applied; 0 means the queue is empty.
+    Workers on databases with SKIP LOCKED never take the same rows; on SQLite
+    run a single worker.
+    """
+    batch_size = batch_size or get_config()["BATCH_SIZE"]
+    with transaction.atomic():
+        batch = list(
+            QueuedStockMovement.objects.select_for_update(skip_locked=True)
+            .order_by("pk")[:batch_size]
+        )
+        if not batch:
+            return 0
+        services.apply_queued_movements(batch)
+        QueuedStockMovement.objects.filter(pk__in=[item.pk for item in batch]).delete()
+        versioning.bump_on_commit("stockqueue")
+    return len(batch)
+
+
+def drain_all(batch_size=None):
+    """Drain until the queue is empty. Returns the number of movements applied."""
+    total = 0
+    while True:
+        applied = drain(batch_size)
+        total += applied
+        if not applied:
+            return total
+
+
+# ----- exact reads -----
+
+
+def pending_deltas(product_ids=None, location=None):
+    """
+    {(product_id, location_id): queued units not yet applied} for the pairs
+    with any, optionally only at one ``location`` (a Location or pk).
+    """
+    queued = QueuedStockMovement.objects.all()
+    if product_ids is not None:
+        queued = queued.filter(product_id__in=list(product_ids))
+    if location is not None:
+        queued = queued.filter(location_id=services.resolve_location(location))
+    return {
+        (product_id, location_id): total
+        for product_id, location_id, total in queued.values("product_id", "location_id")
+        .annotate(total=Sum("quantity"))
+        .order_by()
+        .values_list("product_id", "location_id", "total")
+    }
+
+
+def exact_stock(product_ids, location=None):
+    """
+    {product_id: stock including queued movements}, in two queries: the
+    product totals, or with ``location`` the stock held there.
+    """
+    product_ids = list(product_ids)
+    if location is None:
+        stock = dict(
+            Product.objects.filter(pk__in=product_ids).values_list(
+                "pk", "stock_quantity"
+            )
+        )
+    else:
+        stock = dict(
+            StockLevel.objects.filter(
+                product_id__in=product_ids,
+                location_id=services.resolve_location(location),
+            ).values_list("product_id", "quantity")
+        )
+    for (product_id, _location_id), delta in pending_deltas(
+        product_ids, location
+    ).items():
+        # A queued 'In' may open the product's first level at the location.
+        stock[product_id] = stock.get(product_id, 0) + delta
+    return stock
+
+
+def with_pending(queryset, location=None):
+    """
+    Annotate a Product queryset with ``pending_quantity`` (queued units) and
+    ``exact_stock_quantity``, in the same query. With ``location``, only
+    units queued for that location count, and a StockLevel queryset (of
+    that location) is annotated from its ``quantity``.
+    """
+    if queryset.model is StockLevel:
+        pending = QueuedStockMovement.objects.filter(
+            product=OuterRef("product"), location=OuterRef("location")
+        )
+        stock = F("quantity")
+    else:
+        pending = QueuedStockMovement.objects.filter(product=OuterRef("pk"))
+        if location is not None:
+            pending = pending.filter(location_id=services.resolve_location(location))
+        stock = F("stock_quantity")
+    pending = pending.values("product").annotate(total=Sum("quantity")).values("total")
+    return queryset.annotate(
+        pending_quantity=Coalesce(Subquery(pending, output_field=IntegerField()), 0)
+    ).annotate(exact_stock_quantity=stock + F("pending_quantity"))
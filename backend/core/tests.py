@@ -1,7 +1,62 @@
-from django.test import TestCase, Client
+import asyncio
+import base64
+import datetime
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import warnings
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+try:
+    import mongomock
+except ImportError:  # optional test dependency
+    mongomock = None
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, router
+from django.db.models import F, Sum
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from .models import Product, Supplier, StockMovement, SaleOrder
-from .forms import ProductForm, SupplierForm, StockMovementForm, SaleOrderForm
+from .forms import (
+    ProductForm, SupplierForm, StockMovementForm, SaleOrderForm, violated_key
+)
+from . import admin as core_admin
+from . import benchmark, events, pagecache, search, services, versioning
+from .cache_backends import LRUFileBasedCache
+from .importers import CatalogImporter, iter_rows
+from .middleware import QueryRecorder
+from .pagination import CursorPaginator
+from . import forecasting, ledger, mongo, repository, rollups, routing, sales, stockqueue
+from .models import (
+    CategoryReorderDefault,
+    MoneyField,
+    DailyCategorySales,
+    DailyProductSales,
+    DailyStockBalance,
+    Location,
+    ProductForecast,
+    QueuedStockMovement,
+    ReorderAlert,
+    SaleOrderLine,
+    StockLevel,
+    StockSnapshot,
+    UNIQUE_KEY_INDEXES,
+    default_location,
+)
 
 
 class ProductViewTests(TestCase):
@@ -168,8 +223,14 @@ class StockMovementViewTests(TestCase):
         self.client = Client()
         self.stock_movement_url = reverse("add_stock_movement")
         self.list_stock_movements_url = reverse("list_stock_movements")
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
         self.product = Product.objects.create(
-            name="Test Product", price="10.00", stock_quantity=100
+            name="Test Product",
+            price="10.00",
+            stock_quantity=100,
+            supplier=self.supplier,
         )
 
     def test_add_stock_movement_get(self):
@@ -224,8 +285,14 @@ class SaleOrderViewTests(TestCase):
     def setUp(self):
         self.client = Client()
         self.sale_order_url = reverse("create_sale_order")
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
         self.product = Product.objects.create(
-            name="Test Product", price="10.00", stock_quantity=100
+            name="Test Product",
+            price="10.00",
+            stock_quantity=100,
+            supplier=self.supplier,
         )
 
     def test_create_sale_order_get(self):
@@ -233,6 +300,29 @@ class SaleOrderViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "core/create_sale_order.html")
 
+    def test_product_choice_renders_only_the_chosen_option(self):
+        cache.clear()
+        other = Product.objects.create(
+            name="Other Product", price="1.00", stock_quantity=1,
+            supplier=self.supplier,
+        )
+        response = self.client.get(self.sale_order_url)
+        self.assertContains(
+            response, f'data-autocomplete-url="{reverse("api_products")}"'
+        )
+        self.assertNotContains(response, "Test Product")
+        self.assertNotContains(response, "Other Product")
+
+        response = self.client.post(
+            self.sale_order_url, {"product": self.product.id, "quantity": 200}
+        )
+        self.assertContains(
+            response,
+            f'<option value="{self.product.id}" selected>Test Product</option>',
+            html=True,
+        )
+        self.assertNotContains(response, other.name)
+
     def test_create_sale_order_post_valid(self):
         data = {"product": self.product.id, "quantity": 10}
         response = self.client.post(self.sale_order_url, data)
@@ -316,6 +406,7 @@ class SaleOrderViewTests(TestCase):
 
 class StockLevelCheckViewTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.stock_level_check_url = reverse("stock_level_check")
         self.supplier = Supplier.objects.create(
@@ -338,3 +429,2556 @@ class StockLevelCheckViewTests(TestCase):
         response = self.client.post(self.stock_level_check_url, data)
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Test Product")
+
+    def _make_products(self, count, **kwargs):
+        Product.objects.bulk_create(
+            Product(
+                name=f"Bulk {i}",
+                price="1.00",
+                stock_quantity=i,
+                supplier=self.supplier,
+                **kwargs,
+            )
+            for i in range(count)
+        )
+
+    def test_stock_level_check_get_filters(self):
+        self._make_products(10, reorder_point=3)
+        response = self.client.get(
+            self.stock_level_check_url,
+            {"name": "bulk", "min_stock": 2, "max_stock": 5},
+        )
+        names = [p.name for p in response.context["page_obj"]]
+        self.assertEqual(names, ["Bulk 2", "Bulk 3", "Bulk 4", "Bulk 5"])
+
+        response = self.client.get(
+            self.stock_level_check_url, {"below_reorder_point": "on"}
+        )
+        names = [p.name for p in response.context["page_obj"]]
+        self.assertEqual(names, ["Bulk 0", "Bulk 1", "Bulk 2", "Bulk 3"])
+
+    def test_stock_level_check_rejects_inverted_range(self):
+        response = self.client.get(
+            self.stock_level_check_url, {"min_stock": 10, "max_stock": 1}
+        )
+        self.assertIsNone(response.context["page_obj"])
+        self.assertContains(response, "Minimum stock cannot be greater")
+
+    def test_stock_level_check_is_paginated(self):
+        self._make_products(60)
+        response = self.client.get(self.stock_level_check_url, {"supplier": self.supplier.id})
+        page_obj = response.context["page_obj"]
+        self.assertEqual(len(page_obj), 25)
+        self.assertContains(response, f"supplier={self.supplier.id}")
+        response = self.client.get(
+            self.stock_level_check_url,
+            {"supplier": self.supplier.id, "cursor": page_obj.next_cursor},
+        )
+        self.assertEqual(len(response.context["page_obj"]), 25)
+
+    def test_stock_level_check_caches_until_stock_changes(self):
+        params = {"name": "Test", "min_stock": "050"}
+        self.client.get(self.stock_level_check_url, params)
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(self.stock_level_check_url, {"min_stock": 50, "name": "test"})
+        product_queries = [
+            q for q in cold.captured_queries if 'FROM "core_product"' in q["sql"]
+        ]
+        self.assertEqual(product_queries, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.record_movement(self.product, 60, "Out")
+        response = self.client.get(self.stock_level_check_url, params)
+        self.assertNotContains(response, "<td>Test Product</td>")
+
+
+class StockServiceTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Test Product",
+            price="10.00",
+            stock_quantity=5,
+            supplier=self.supplier,
+        )
+
+    def test_record_movement_out_rejects_oversell(self):
+        with self.assertRaises(services.InsufficientStock):
+            services.record_movement(self.product, 6, "Out")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 5)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_record_movement_ignores_stale_instance(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        services.record_movement(self.product, 3, "Out")
+        # The stale copy still thinks there are 5 units; the DB knows better.
+        with self.assertRaises(services.InsufficientStock):
+            services.record_movement(stale, 3, "Out")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 2)
+
+    def test_place_sale_order(self):
+        sale_order = services.place_sale_order(self.product, 2)
+        self.assertEqual(sale_order.total_price, 20)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 3)
+        self.assertTrue(
+            StockMovement.objects.filter(
+                movement_type="Out", notes=f"Sale Order #{sale_order.pk}"
+            ).exists()
+        )
+
+    def test_cancel_sale_order_restocks_once(self):
+        sale_order = services.place_sale_order(self.product, 2)
+        stale = SaleOrder.objects.get(pk=sale_order.pk)
+        self.assertTrue(services.cancel_sale_order(sale_order))
+        self.assertFalse(services.cancel_sale_order(stale))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 5)
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type="In").count(), 1
+        )
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.checkout_url = reverse("checkout_sale_order")
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                price="10.00",
+                stock_quantity=10,
+                supplier=self.supplier,
+            )
+            for i in range(5)
+        ]
+
+    def _post_data(self, lines):
+        data = {
+            "form-TOTAL_FORMS": len(lines),
+            "form-INITIAL_FORMS": 0,
+            "form-MIN_NUM_FORMS": 1,
+            "form-MAX_NUM_FORMS": 200,
+        }
+        for i, (product, quantity) in enumerate(lines):
+            data[f"form-{i}-product"] = product.pk
+            data[f"form-{i}-quantity"] = quantity
+        return data
+
+    def test_checkout_get(self):
+        response = self.client.get(self.checkout_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "core/checkout_sale_order.html")
+        # Lines search the API instead of listing every product.
+        self.assertNotContains(response, "Product 0")
+        self.assertContains(response, "data-autocomplete-url=", count=6)
+
+    def test_checkout_post_valid(self):
+        lines = [(product, 2) for product in self.products]
+        response = self.client.post(self.checkout_url, self._post_data(lines))
+        self.assertEqual(response.status_code, 302)
+        sale_order = SaleOrder.objects.get()
+        self.assertIsNone(sale_order.product_id)
+        self.assertEqual(sale_order.quantity, 10)
+        self.assertEqual(sale_order.total_price, 100)
+        self.assertEqual(sale_order.lines.count(), 5)
+        self.assertEqual(
+            StockMovement.objects.filter(movement_type="Out").count(), 5
+        )
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock_quantity, 8)
+
+    def test_checkout_reports_per_line_failures(self):
+        cache.clear()
+        lines = [(self.products[0], 2), (self.products[1], 11)]
+        response = self.client.post(self.checkout_url, self._post_data(lines))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Product 1")
+        self.assertNotContains(response, "Product 4")
+        formset = response.context["formset"]
+        self.assertFalse(formset.forms[0].errors)
+        self.assertIn("quantity", formset.forms[1].errors)
+        self.assertFalse(SaleOrder.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 10)
+
+    def test_checkout_merges_duplicate_lines(self):
+        product = self.products[0]
+        with self.assertRaises(services.CheckoutError) as ctx:
+            services.checkout([(product.pk, 6), (product.pk, 6)])
+        self.assertEqual(set(ctx.exception.errors), {0, 1})
+
+    def test_checkout_reports_lines_short_after_the_check(self):
+        short, fine = self.products[:2]
+        StockLevel.objects.filter(product=short).update(quantity=1)
+        line_errors = services._line_errors
+        # The up-front check passes, as if it ran before another order took
+        # the stock; the conditional update then comes up short.
+        checks = iter([lambda *args: {}, line_errors])
+
+        with mock.patch.object(
+            services, "_line_errors", lambda *args: next(checks)(*args)
+        ):
+            with self.assertRaises(services.CheckoutError) as ctx:
+                services.checkout([(fine.pk, 2), (short.pk, 3)])
+        self.assertEqual(
+            ctx.exception.errors, {1: "Insufficient stock. Currently 1 in stock."}
+        )
+        self.assertFalse(SaleOrder.objects.exists())
+        fine.refresh_from_db()
+        self.assertEqual(fine.stock_quantity, 10)
+
+    def test_checkout_query_count_is_constant(self):
+        small = [(p.pk, 1) for p in self.products[:1]]
+        large = [(p.pk, 1) for p in self.products]
+        # 6 writes/reads (stock level and product total updated apart)
+        # + reorder check + 2 stock rollup statements
+        # + 4 sales rollup statements + savepoint pair
+        with self.assertNumQueries(15):
+            services.checkout(small)
+        with self.assertNumQueries(15):
+            services.checkout(large)
+
+    def test_cancel_multi_line_order_restocks_every_line(self):
+        sale_order = services.checkout([(p.pk, 3) for p in self.products])
+        self.assertTrue(services.cancel_sale_order(sale_order))
+        for product in self.products:
+            product.refresh_from_db()
+            self.assertEqual(product.stock_quantity, 10)
+
+    def test_single_product_form_still_requires_product(self):
+        form = SaleOrderForm(data={"quantity": 1})
+        self.assertFalse(form.is_valid())
+        self.assertIn("product", form.errors)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        Product.objects.create(
+            name="Existing",
+            price="1.00",
+            stock_quantity=1,
+            description="d",
+            category="c",
+            supplier=self.supplier,
+        )
+
+    def _csv(self, rows):
+        header = "name,description,category,price,stock_quantity,supplier\n"
+        return io.StringIO(header + "".join(row + "\n" for row in rows))
+
+    def test_import_products_reports_bad_rows(self):
+        sid = self.supplier.pk
+        source = self._csv(
+            [
+                f"Widget,d,c,2.50,10,{sid}",
+                f"existing,d,c,2.50,10,{sid}",  # case-insensitive clash
+                f"WIDGET,d,c,2.50,10,{sid}",  # clash within the file
+                f"Gadget,d,c,-1,10,{sid}",  # negative price
+                "Gizmo,d,c,1.00,10,999",  # unknown supplier
+                f"Doohickey,d,c,1.00,5,{sid}",
+            ]
+        )
+        importer = CatalogImporter("product", batch_size=2)
+        errors = list(importer.run(iter_rows(source, "csv")))
+        self.assertEqual(importer.created, 2)
+        self.assertEqual(
+            [(e.row, e.field) for e in errors],
+            [(2, "name"), (3, "name"), (4, "price"), (5, "supplier")],
+        )
+        self.assertTrue(Product.objects.filter(name="Doohickey").exists())
+
+    def test_import_batch_query_count_is_constant(self):
+        sid = self.supplier.pk
+        rows = [f"Item {i},d,c,1.00,1,{sid}" for i in range(50)]
+        importer = CatalogImporter("product", batch_size=50)
+        # supplier lookup, name check, bulk insert (+ savepoint pair), the new
+        # rows' opening ledger snapshots and stock levels (select + 2 inserts),
+        # reorder check
+        with self.assertNumQueries(9):
+            list(importer.run(iter_rows(self._csv(rows), "csv")))
+        self.assertEqual(importer.created, 50)
+
+    def test_new_rows_are_found_by_their_indexed_key(self):
+        sid = self.supplier.pk
+        source = self._csv([f"Mixed Case,d,c,1.00,1,{sid}"])
+        with CaptureQueriesContext(connection) as queries:
+            list(CatalogImporter("product").run(iter_rows(source, "csv")))
+        lookup = next(q["sql"] for q in queries if '"name_key" IN' in q["sql"])
+        self.assertIn("'mixed case'", lookup.lower())
+        self.assertNotIn('"core_product"."name" IN', " ".join(q["sql"] for q in queries))
+        self.assertTrue(
+            StockLevel.objects.filter(product__name="Mixed Case", quantity=1).exists()
+        )
+
+    def test_failed_reindex_rolls_back_the_batch(self):
+        sid = self.supplier.pk
+        rows = [f"Item {i},d,c,1.00,1,{sid}" for i in range(3)]
+        importer = CatalogImporter("product")
+        with mock.patch.object(
+            services, "open_stock_levels", side_effect=RuntimeError("boom")
+        ):
+            with self.assertRaises(RuntimeError):
+                list(importer.run(iter_rows(self._csv(rows), "csv")))
+        self.assertFalse(Product.objects.filter(name__startswith="Item").exists())
+        self.assertEqual(importer.created, 0)
+
+    def test_import_suppliers_jsonl(self):
+        source = io.StringIO(
+            '{"name": "A", "email": "a@x.com", "phone": "1111111111", "address": "x"}\n'
+            '{"name": "B", "email": "A@X.com", "phone": "2222222222", "address": "x"}\n'
+            "not json\n"
+        )
+        importer = CatalogImporter("supplier")
+        errors = list(importer.run(iter_rows(source, "jsonl")))
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(errors[0].row, 2)
+        self.assertEqual(errors[0].field, "email")
+        self.assertEqual({e.row for e in errors}, {2, 3})
+
+    def test_import_catalog_command(self):
+        path = self._write_tmp(
+            "name,description,category,price,stock_quantity,supplier\n"
+            f"Cmd Item,d,c,1.00,1,{self.supplier.pk}\n"
+        )
+        out = io.StringIO()
+        call_command(
+            "import_catalog", path, "--batch-size", "10", stdout=out, stderr=io.StringIO()
+        )
+        self.assertIn("Imported 1 product(s); 0 error(s).", out.getvalue())
+        self.assertTrue(Product.objects.filter(name="Cmd Item").exists())
+
+    def test_import_catalog_upload(self):
+        upload = SimpleUploadedFile(
+            "catalog.csv",
+            (
+                "name,description,category,price,stock_quantity,supplier\n"
+                f"Upload Item,d,c,1.00,1,{self.supplier.pk}\n"
+                "Bad Item,d,c,1.00,1,999\n"
+            ).encode(),
+        )
+        response = self.client.post(
+            reverse("import_catalog"), {"kind": "product", "file": upload}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Product.objects.filter(name="Upload Item").exists())
+        self.assertContains(response, "Supplier does not exist.")
+
+    def test_import_catalog_upload_tolerates_latin1(self):
+        upload = SimpleUploadedFile(
+            "catalog.csv",
+            (
+                "name,description,category,price,stock_quantity,supplier\n"
+                f"Caf\u00e9 Item,d,c,1.00,1,{self.supplier.pk}\n"
+            ).encode("latin-1"),
+        )
+        response = self.client.post(
+            reverse("import_catalog"), {"kind": "product", "file": upload}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Product.objects.filter(name="Caf\ufffd Item").exists())
+
+    def _write_tmp(self, content):
+        handle = tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False, encoding="utf-8"
+        )
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+
+class LedgerExportTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.widget = Product.objects.create(
+            name="Widget", price="10.00", stock_quantity=100, supplier=self.supplier
+        )
+        self.gadget = Product.objects.create(
+            name="Gadget", price="5.00", stock_quantity=100, supplier=self.supplier
+        )
+        services.record_movement(self.widget, 3, "In", notes="restock")
+        services.record_movement(self.gadget, 4, "Out")
+        services.place_sale_order(self.widget, 2)
+
+    def _content(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_stock_movements_csv_with_search(self):
+        response = self.client.get(
+            reverse("export_stock_movements"), {"search": "widg"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = self._content(response).splitlines()
+        self.assertEqual(lines[0], "id,movement_date,product_id,product,movement_type,quantity,notes")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all("Widget" in line for line in lines[1:]))
+
+    def test_export_sale_orders_jsonl_with_status(self):
+        response = self.client.get(
+            reverse("export_sale_orders"), {"status": "Pending", "format": "jsonl"}
+        )
+        rows = [json.loads(line) for line in self._content(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["product"], "Widget")
+        self.assertEqual(rows[0]["total_price"], "20.00")
+
+    def test_export_date_range(self):
+        response = self.client.get(
+            reverse("export_stock_movements"), {"date_to": "2000-01-01"}
+        )
+        self.assertEqual(len(self._content(response).splitlines()), 1)
+
+    def test_export_rejects_bad_dates(self):
+        response = self.client.get(
+            reverse("export_sale_orders"),
+            {"date_from": "2024-02-01", "date_to": "2024-01-01"},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_ledger_command(self):
+        out = io.StringIO()
+        call_command("export_ledger", "orders", "--format", "jsonl", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 1)
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget", price="1.00", stock_quantity=0, supplier=self.supplier
+        )
+        StockMovement.objects.bulk_create(
+            StockMovement(product=self.product, quantity=i + 1, movement_type="In")
+            for i in range(25)
+        )
+
+    def _walk(self, paginator):
+        seen = []
+        page = paginator.get_page()
+        while True:
+            seen.extend(m.pk for m in page)
+            if not page.has_next():
+                return seen, page
+            page = paginator.get_page(page.next_cursor)
+
+    def test_walks_every_row_once_in_order(self):
+        paginator = CursorPaginator(
+            StockMovement.objects.all(), 10, ordering=("-movement_date", "-id")
+        )
+        seen, last = self._walk(paginator)
+        expected = list(
+            StockMovement.objects.order_by("-id").values_list("pk", flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(last), 5)
+
+        previous = paginator.get_page(last.previous_cursor)
+        self.assertEqual([m.pk for m in previous], expected[10:20])
+        first = paginator.get_page(previous.previous_cursor)
+        self.assertEqual([m.pk for m in first], expected[:10])
+        self.assertFalse(first.has_previous())
+        self.assertTrue(first.has_next())
+
+    def test_deep_page_does_not_count_or_offset(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), 10)
+        page = paginator.get_page(paginator.get_page().next_cursor)
+        with CaptureQueriesContext(connection) as ctx:
+            paginator.get_page(page.next_cursor)
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn("COUNT", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        paginator = CursorPaginator(StockMovement.objects.all(), 10)
+        page = paginator.get_page("not-a-cursor")
+        self.assertEqual(len(page), 10)
+        self.assertFalse(page.has_previous())
+
+    def test_garbage_cursor_values_fall_back_to_first_page(self):
+        paginator = CursorPaginator(
+            StockMovement.objects.all(), 10, ordering=("-movement_date", "-id")
+        )
+        first = [m.pk for m in paginator.get_page()]
+        for payload in (
+            ["n", "not-a-date", "x"],
+            ["n", None, None],
+            ["n", "2024-01-01T00:00:00"],
+            "np",
+            {"n": 1},
+        ):
+            cursor = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+            with self.subTest(payload=payload):
+                page = paginator.get_page(cursor)
+                self.assertEqual([m.pk for m in page], first)
+                self.assertFalse(page.has_previous())
+
+    def test_list_view_uses_cursor_and_keeps_search(self):
+        response = self.client.get(
+            reverse("list_stock_movements"), {"search": "Widget"}
+        )
+        page_obj = response.context["page_obj"]
+        self.assertEqual(page_obj.total_count, 25)
+        self.assertContains(response, f"cursor={page_obj.next_cursor}&search=Widget")
+        response = self.client.get(
+            reverse("list_stock_movements"),
+            {"search": "Widget", "cursor": page_obj.next_cursor},
+        )
+        self.assertEqual(len(response.context["page_obj"]), 10)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Acme Corp", email="sales@acme.com"
+        )
+        for name in ["Blue Widget", "Red Widget", "Widgetry Kit", "Gadget"]:
+            Product.objects.create(
+                name=name, price="1.00", stock_quantity=1, supplier=self.supplier
+            )
+
+    def _names(self, queryset):
+        return sorted(queryset.values_list("name", flat=True))
+
+    def test_substring_search_is_case_insensitive(self):
+        found = search.filter_queryset(Product.objects.all(), "WIDGET")
+        self.assertEqual(
+            self._names(found), ["Blue Widget", "Red Widget", "Widgetry Kit"]
+        )
+
+    def test_index_follows_bulk_create_rename_and_delete(self):
+        Product.objects.bulk_create(
+            [Product(name="Bulk Widget", price="1.00", stock_quantity=1, supplier=self.supplier)]
+        )
+        Product.objects.filter(name="Gadget").update(name="Gadget Widget")
+        Product.objects.filter(name="Red Widget").delete()
+        found = search.filter_queryset(Product.objects.all(), "widget")
+        self.assertEqual(
+            self._names(found),
+            ["Blue Widget", "Bulk Widget", "Gadget Widget", "Widgetry Kit"],
+        )
+
+    def test_short_terms_fall_back_to_icontains(self):
+        found = search.filter_queryset(Product.objects.all(), "ga")
+        self.assertEqual(self._names(found), ["Gadget"])
+
+    def test_supplier_search_covers_email(self):
+        found = search.filter_queryset(Supplier.objects.all(), "acme.com")
+        self.assertEqual(list(found), [self.supplier])
+
+    def test_stock_movement_search_uses_product_index(self):
+        services.record_movement(Product.objects.get(name="Gadget"), 1, "In")
+        response = self.client.get(reverse("list_stock_movements"), {"search": "adge"})
+        self.assertEqual(len(response.context["page_obj"]), 1)
+
+    def test_rank_orders_by_relevance(self):
+        ranked = search.rank(
+            search.filter_queryset(Product.objects.all(), "widget"), "widget"
+        ).order_by("search_rank")
+        self.assertEqual(len(ranked), 3)
+        self.assertIsNotNone(ranked[0].search_rank)
+
+    def test_list_search_pages_by_relevance(self):
+        Product.objects.create(
+            name="Widget", price="1.00", stock_quantity=1, supplier=self.supplier
+        )
+        paginator = repository.products("widget", 2)
+        page = paginator.get_page()
+        seen = list(page)
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(page)
+        self.assertEqual(len(seen), 4)
+        self.assertEqual(len({product.pk for product in seen}), 4)
+        self.assertEqual(seen[0].name, "Widget")
+        ranks = [product.search_rank for product in seen]
+        self.assertEqual(ranks, sorted(ranks))
+
+    def test_trigram_fallback_index(self):
+        with mock.patch.object(search, "uses_fts", return_value=False):
+            search.rebuild(Product)
+            found = search.filter_queryset(Product.objects.all(), "idget")
+            self.assertEqual(
+                self._names(found), ["Blue Widget", "Red Widget", "Widgetry Kit"]
+            )
+            product = Product.objects.get(name="Gadget")
+            product.name = "Gadget Widget"
+            product.save()
+            product = Product.objects.get(name="Blue Widget")
+            product.delete()
+            found = search.filter_queryset(Product.objects.all(), "idget")
+            self.assertEqual(
+                self._names(found), ["Gadget Widget", "Red Widget", "Widgetry Kit"]
+            )
+
+
+class DailyStockBalanceTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget", price="1.00", stock_quantity=50, supplier=self.supplier
+        )
+        self.today = datetime.date.today()
+
+    def _backdate(self, days, quantity, movement_type):
+        date = self.today - datetime.timedelta(days=days)
+        movement = services.record_movement(self.product, quantity, movement_type)
+        StockMovement.objects.filter(pk=movement.pk).update(movement_date=date)
+        DailyStockBalance.objects.filter(product=self.product, date=self.today).delete()
+        movement.movement_date = date
+        rollups.record_movements([movement])
+
+    def test_movements_update_rollup_incrementally(self):
+        services.record_movement(self.product, 10, "In")
+        services.place_sale_order(self.product, 4)
+        order = services.place_sale_order(self.product, 1)
+        services.cancel_sale_order(order)
+        balance = DailyStockBalance.objects.get(product=self.product, date=self.today)
+        self.assertEqual((balance.quantity_in, balance.quantity_out), (11, 5))
+
+    def test_stock_as_of_and_totals(self):
+        self._backdate(10, 20, "In")  # stock 70
+        self._backdate(3, 5, "Out")  # stock 65
+        services.record_movement(self.product, 1, "Out")  # stock 64 today
+
+        def past(days):
+            return self.today - datetime.timedelta(days=days)
+
+        self.assertEqual(rollups.stock_as_of(self.product, past(days=11)), 50)
+        self.assertEqual(rollups.stock_as_of(self.product, past(days=5)), 70)
+        self.assertEqual(rollups.stock_as_of(self.product, self.today), 64)
+
+        totals = rollups.movement_totals(past(days=30), self.today)
+        self.assertEqual([row["net"] for row in totals], [20, -5, -1])
+        self.assertEqual(
+            sum(row["net"] for row in rollups.movement_totals(
+                past(days=30), self.today, period="week"
+            )),
+            14,
+        )
+
+    def test_backfill_command_rebuilds_from_ledger(self):
+        services.record_movement(self.product, 10, "In")
+        services.record_movement(self.product, 3, "Out")
+        DailyStockBalance.objects.all().delete()
+        out = io.StringIO()
+        call_command("backfill_stock_balances", "--chunk-size", "1", stdout=out)
+        balance = DailyStockBalance.objects.get(product=self.product)
+        self.assertEqual((balance.quantity_in, balance.quantity_out), (10, 3))
+        self.assertIn("Wrote 1 daily balance row(s).", out.getvalue())
+
+
+class BenchCommandTests(TestCase):
+    volumes = [
+        "--use-current-db",
+        "--suppliers", "3",
+        "--products", "30",
+        "--orders", "20",
+        "--movements", "60",
+        "--days", "5",
+        "--iterations", "1",
+        "--warmup", "0",
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def _budget_file(self, budgets):
+        handle = tempfile.NamedTemporaryFile(
+            "w", suffix=".json", delete=False, encoding="utf-8"
+        )
+        with handle:
+            json.dump(budgets, handle)
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_bench_seeds_and_times_every_url(self):
+        out = io.StringIO()
+        call_command(
+            "bench", *self.volumes, "--budgets", self._budget_file({}),
+            stdout=out, stderr=io.StringIO(),
+        )
+        self.assertEqual(Product.objects.filter(name__startswith="Product ").count(), 30)
+        self.assertGreaterEqual(StockMovement.objects.count(), 60)
+        self.assertEqual(benchmark.uncovered_urls(benchmark.build_scenarios()), [])
+        self.assertIn("list_stock_movements:deep", out.getvalue())
+        self.assertIn("All scenarios within budget.", out.getvalue())
+
+    def test_bench_fails_when_over_budget(self):
+        budgets = self._budget_file({"list_products": {"queries": 0}})
+        with self.assertRaisesMessage(CommandError, "queries > budget 0"):
+            call_command(
+                "bench", *self.volumes, "--only", "list_products",
+                "--budgets", budgets, stdout=io.StringIO(),
+            )
+
+    def test_seed_is_deterministic(self):
+        benchmark.seed(2, 10, 0, 0, days=1, seed=7)
+        first = list(Product.objects.order_by("pk").values_list("price", "stock_quantity"))
+        Product.objects.all().delete()
+        Supplier.objects.all().delete()
+        benchmark.seed(2, 10, 0, 0, days=1, seed=7)
+        second = list(Product.objects.order_by("pk").values_list("price", "stock_quantity"))
+        self.assertEqual(first, second)
+
+
+@override_settings(SQL_INSTRUMENTATION={"ENABLED": True, "N_PLUS_ONE_THRESHOLD": 3})
+class QueryInstrumentationTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        for i in range(4):
+            Product.objects.create(
+                name=f"P{i}", price="1.00", stock_quantity=1, supplier=self.supplier
+            )
+
+    def test_server_timing_header_and_log_line(self):
+        with self.assertLogs("core.sql", level="INFO") as logs:
+            response = self.client.get(reverse("list_suppliers"))
+        self.assertRegex(
+            response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$'
+        )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], reverse("list_suppliers"))
+        self.assertGreaterEqual(record["queries"], 1)
+        self.assertEqual(record["n_plus_one"], [])
+
+    def test_streaming_response_is_logged_when_the_stream_closes(self):
+        StockMovement.objects.create(
+            product=Product.objects.first(), quantity=1, movement_type="In"
+        )
+        with self.assertLogs("core.sql", level="INFO") as logs:
+            response = self.client.get(
+                reverse("export_stock_movements"), {"format": "csv"}
+            )
+            self.assertEqual(logs.records, [])
+            b"".join(response.streaming_content)
+        self.assertFalse(response.has_header("Server-Timing"))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], reverse("export_stock_movements"))
+        self.assertTrue(
+            any("core_stockmovement" in query["sql"] for query in record["slowest"])
+        )
+
+    def test_recorder_flags_repeated_query_shapes(self):
+        with QueryRecorder() as recorder:
+            for product in Product.objects.all():
+                product.supplier.name  # lazy load per row
+        suspects = recorder.repeated_shapes(3)
+        self.assertEqual(len(suspects), 1)
+        count, shape = suspects[0]
+        self.assertEqual(count, 4)
+        self.assertIn('FROM "core_supplier"', shape)
+
+    @override_settings(SQL_INSTRUMENTATION={"ENABLED": False})
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse("home"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+class CachedChoicesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget", price="1.00", stock_quantity=10, supplier=self.supplier
+        )
+
+    def test_repeated_form_render_reads_no_choice_tables(self):
+        self.client.get(reverse("add_product"))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse("add_product"))
+        self.assertContains(response, "Test Supplier")
+        self.assertFalse(
+            any('"core_supplier"' in q["sql"] for q in captured.captured_queries)
+        )
+
+    def test_new_supplier_appears_after_commit(self):
+        self.client.get(reverse("add_product"))
+        with self.captureOnCommitCallbacks(execute=True):
+            Supplier.objects.create(
+                name="Fresh Supplier", email="fresh@test.com", phone="555"
+            )
+        response = self.client.get(reverse("add_product"))
+        self.assertContains(response, "Fresh Supplier")
+
+    def test_submitted_choice_is_validated_by_primary_key(self):
+        form = StockMovementForm(
+            data={"product": self.product.pk, "movement_type": "In", "quantity": 1}
+        )
+        with CaptureQueriesContext(connection) as captured:
+            self.assertTrue(form.is_valid())
+        # The form field and the model's FK validation each look up one pk.
+        for query in captured.captured_queries:
+            self.assertIn('WHERE "core_product"."id" =', query["sql"])
+
+    def test_forms_import_before_migrate_on_an_empty_database(self):
+        # Building the form classes must not read the choice tables, or a
+        # fresh database cannot be migrated ("no such table: core_supplier").
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "empty_db_settings.py"), "w") as out:
+                out.write(
+                    "from inventory_project.settings import *\n"
+                    "DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3',"
+                    f" 'NAME': {os.path.join(tmp, 'empty.sqlite3')!r}}}}}\n"
+                )
+            script = (
+                "import django; django.setup()\n"
+                "import core.forms\n"
+                "from django.core.management import call_command\n"
+                "call_command('migrate', skip_checks=False, verbosity=0)\n"
+            )
+            result = subprocess.run(
+                [sys.executable, "-c", script],
+                cwd=settings.BASE_DIR,
+                env={
+                    **os.environ,
+                    "DJANGO_SETTINGS_MODULE": "empty_db_settings",
+                    "PYTHONPATH": os.pathsep.join([tmp, str(settings.BASE_DIR)]),
+                },
+                capture_output=True,
+                text=True,
+            )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget", price="1.00", stock_quantity=10, supplier=self.supplier
+        )
+
+    def test_repeat_request_is_served_without_queries(self):
+        url = reverse("list_products")
+        first = self.client.get(url, {"search": "Widget"})
+        self.assertEqual(first["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {"search": "Widget"})
+        self.assertEqual(second["X-Page-Cache"], "hit")
+        self.assertEqual(first.content, second.content)
+        # A different query string is a different page
+        other = self.client.get(url, {"search": "Gadget"})
+        self.assertEqual(other["X-Page-Cache"], "miss")
+
+    def test_versions_share_the_pages_backend(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            shared = {
+                "BACKEND": "core.cache_backends.LRUFileBasedCache",
+                "LOCATION": tmp,
+            }
+            with override_settings(
+                CACHES={**settings.CACHES, "pages": shared}
+            ):
+                before = versioning.get_version("product")
+                # Another process reads the same counter from disk.
+                other = LRUFileBasedCache(tmp, {})
+                self.assertEqual(other.get("core:version:product"), before)
+                self.assertIsNone(cache.get("core:version:product"))
+                versioning.bump("product")
+                self.assertGreater(versioning.get_version("product"), before)
+                self.assertEqual(
+                    other.get("core:version:product"),
+                    versioning.get_version("product"),
+                )
+                caches["pages"].close()
+
+    def test_write_invalidates_page(self):
+        url = reverse("list_stock_movements")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("add_stock_movement"),
+                {"product": self.product.pk, "movement_type": "In", "quantity": 4},
+            )
+        # A fresh client: this one still has the success message pending.
+        response = Client().get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "<td>4</td>", html=True)
+
+    def test_pending_messages_bypass_cache(self):
+        url = reverse("list_sale_orders")
+        self.client.get(url)
+        order = services.place_sale_order(self.product, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(
+                reverse("complete_sale_order", args=[order.pk]), follow=True
+            )
+        self.assertContains(response, "completed")
+        self.assertFalse(response.has_header("X-Page-Cache"))
+
+    def test_hit_and_miss_counts(self):
+        pagecache.reset_stats()
+        for _ in range(3):
+            self.client.get(reverse("list_suppliers"))
+        self.assertEqual(
+            pagecache.stats()["list_suppliers"], {"hits": 2, "misses": 1}
+        )
+        # Local memory is per process: the command has nothing to report.
+        with self.assertRaisesMessage(CommandError, "local memory"):
+            call_command("page_cache_stats", stdout=io.StringIO())
+
+    def test_stats_command_reads_a_shared_cache(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        pages = {
+            "BACKEND": "core.cache_backends.LRUFileBasedCache",
+            "LOCATION": directory.name,
+        }
+        with self.settings(CACHES={**settings.CACHES, "pages": pages}):
+            for _ in range(3):
+                self.client.get(reverse("list_suppliers"))
+            out = io.StringIO()
+            call_command("page_cache_stats", "--reset", stdout=out)
+            self.assertRegex(out.getvalue(), r"list_suppliers\s+2\s+1\s+66\.7%")
+            self.assertEqual(
+                pagecache.stats()["list_suppliers"], {"hits": 0, "misses": 0}
+            )
+
+    @override_settings(PAGE_CACHE={"ENABLED": False})
+    def test_can_be_disabled(self):
+        response = self.client.get(reverse("home"))
+        self.assertFalse(response.has_header("X-Page-Cache"))
+
+
+class LRUFileBasedCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = LRUFileBasedCache(
+            self.directory, {"OPTIONS": {"MAX_ENTRIES": 3, "CULL_FREQUENCY": 3}}
+        )
+
+    def tearDown(self):
+        self.store.clear()
+        os.rmdir(self.directory)
+
+    def _age(self, key, seconds_ago):
+        fname = self.store._key_to_file(key)
+        stamp = os.path.getmtime(fname) - seconds_ago
+        os.utime(fname, (stamp, stamp))
+
+    def test_culls_least_recently_used(self):
+        for age, key in enumerate(["c", "b", "a"]):
+            self.store.set(key, key)
+            self._age(key, 100 - age * 10)  # "c" oldest, "a" newest
+        self.store.get("c")  # touching "c" makes "b" the LRU entry
+        self.store.set("d", "d")
+        self.assertIsNone(self.store.get("b"))
+        self.assertEqual(self.store.get_many(["a", "c", "d"]), {"a": "a", "c": "c", "d": "d"})
+
+    def test_entries_expire(self):
+        self.store.set("k", "v", timeout=-1)
+        self.assertIsNone(self.store.get("k"))
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.products = [
+            Product.objects.create(
+                name=f"Gadget {i}",
+                price="2.50",
+                stock_quantity=i,
+                reorder_point=2,
+                supplier=self.supplier,
+            )
+            for i in range(5)
+        ]
+
+    def test_products_from_values_with_field_selection(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("api_products"), {"fields": "name,price,supplier_name"}
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(
+            data["results"][0],
+            {"name": "Gadget 0", "price": "2.50", "supplier_name": "Test Supplier"},
+        )
+        self.assertIsNone(data["next"])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse("api_products"), {"fields": "name,secret"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("secret", response.json()["error"])
+
+    def test_cursor_pagination(self):
+        url = reverse("api_products")
+        first = self.client.get(url, {"limit": 2, "fields": "id"}).json()
+        self.assertEqual(len(first["results"]), 2)
+        second = self.client.get(first["next"]).json()
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        self.assertEqual(ids, [p.pk for p in self.products[:4]])
+
+    def test_stock_level_filters_match_html_view(self):
+        response = self.client.get(
+            reverse("api_stock_levels"), {"below_reorder_point": "on", "fields": "name"}
+        )
+        self.assertEqual(
+            [row["name"] for row in response.json()["results"]],
+            ["Gadget 0", "Gadget 1", "Gadget 2"],
+        )
+        bad = self.client.get(
+            reverse("api_stock_levels"), {"min_stock": 5, "max_stock": 1}
+        )
+        self.assertEqual(bad.status_code, 400)
+
+    def test_stock_levels_at_a_location_filter_on_its_quantity(self):
+        depot = Location.objects.create(name="Depot")
+        services.record_movement(self.products[1], 5, "In", location=depot)
+        services.record_movement(self.products[4], 1, "In", location=depot)
+        stockqueue.enqueue(self.products[4], 2, location=depot)
+        stockqueue.enqueue(self.products[4], 9)  # another location's queue
+        response = self.client.get(
+            reverse("api_stock_levels"),
+            {
+                "location": depot.pk,
+                "max_stock": 3,
+                "fields": "id,stock_quantity,location_quantity,exact_stock_quantity",
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {
+                    "id": self.products[4].pk,
+                    "stock_quantity": 5,
+                    "location_quantity": 1,
+                    "exact_stock_quantity": 3,
+                }
+            ],
+        )
+        # Without a location there is only the total.
+        response = self.client.get(
+            reverse("api_stock_levels"), {"fields": "location_quantity"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_movements_report_their_locations(self):
+        depot = Location.objects.create(name="Depot")
+        services.transfer(self.products[3], 2, None, depot)
+        row = self.client.get(reverse("api_movements")).json()["results"][0]
+        self.assertEqual(
+            (row["movement_type"], row["location"], row["to_location"]),
+            ("Transfer", default_location(), depot.pk),
+        )
+
+    def test_location_changes_refresh_the_etag(self):
+        url = reverse("api_stock_levels")
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Location.objects.create(name="Depot")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_orders_status_filter(self):
+        order = services.place_sale_order(self.products[3], 1)
+        services.complete_sale_order(services.place_sale_order(self.products[4], 1))
+        response = self.client.get(reverse("api_orders"), {"status": "Pending"})
+        self.assertEqual([row["id"] for row in response.json()["results"]], [order.pk])
+        self.assertEqual(
+            self.client.get(reverse("api_orders"), {"status": "Lost"}).status_code, 400
+        )
+
+    def test_conditional_get_returns_304_until_a_write(self):
+        url = reverse("api_movements")
+        first = self.client.get(url)
+        etag = first["ETag"]
+        self.assertTrue(first.has_header("Last-Modified"))
+        with self.assertNumQueries(0):
+            unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+            ).status_code,
+            304,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            services.record_movement(self.products[0], 3, "In")
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()["results"][0]["quantity"], 3)
+
+    def test_read_only(self):
+        response = self.client.post(reverse("api_products"))
+        self.assertEqual(response.status_code, 405)
+
+
+class StockEventTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget",
+            price="1.00",
+            stock_quantity=12,
+            reorder_point=10,
+            supplier=self.supplier,
+        )
+
+    def test_broker_fans_out_to_matching_subscribers(self):
+        async def scenario():
+            broker = events.Broker()
+            everything = broker.subscribe()
+            low_only = broker.subscribe(lambda event: event["type"] == "low_stock")
+            broker.publish("stock", {"product": 1})
+            broker.publish("low_stock", {"product": 1})
+            first = await everything.get(1)
+            second = await everything.get(1)
+            low = await low_only.get(1)
+            nothing = await low_only.get(0.01)
+            everything.close()
+            low_only.close()
+            return [first["type"], second["type"]], low["type"], nothing, broker
+
+        seen, low, nothing, broker = asyncio.run(scenario())
+        self.assertEqual(seen, ["stock", "low_stock"])
+        self.assertEqual(low, "low_stock")
+        self.assertIsNone(nothing)
+        self.assertFalse(broker.has_subscribers())
+
+    def test_stock_writes_publish_after_commit(self):
+        with mock.patch.object(events, "broker") as broker:
+            broker.has_subscribers.return_value = True
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                services.record_movement(self.product, 3, "Out")
+            broker.publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        published = [call.args for call in broker.publish.call_args_list]
+        self.assertEqual([event_type for event_type, _data in published], ["stock", "low_stock"])
+        self.assertEqual(published[0][1]["stock_quantity"], 9)
+        self.assertEqual(published[0][1]["delta"], -3)
+
+    def test_no_query_without_listeners(self):
+        with self.assertNumQueries(0):
+            events._publish({self.product.pk: 1})
+
+    def test_sse_endpoint_streams_filtered_events(self):
+        async def scenario():
+            scope = {
+                "type": "http",
+                "method": "GET",
+                "path": events.STREAM_PATH,
+                "query_string": f"product={self.product.pk}".encode(),
+                "headers": [],
+            }
+            app = ApplicationCommunicator(events.stream_stock_events, scope)
+            await app.send_input({"type": "http.request", "body": b""})
+            start = await app.receive_output(1)
+            hello = await app.receive_output(1)
+            events.broker.publish("stock", {"product": self.product.pk + 1})
+            events.broker.publish("stock", {"product": self.product.pk, "delta": 5})
+            message = await app.receive_output(1)
+            await app.send_input({"type": "http.disconnect"})
+            await app.wait(1)
+            return start, hello, message
+
+        start, hello, message = asyncio.run(scenario())
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), start["headers"])
+        self.assertEqual(hello["body"], b": connected\n\n")
+        body = message["body"].decode()
+        self.assertIn("event: stock\n", body)
+        self.assertIn(f'"product": {self.product.pk}', body)
+        self.assertFalse(events.broker.has_subscribers())
+
+
+class ReorderEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget",
+            category="Tools",
+            price="1.00",
+            stock_quantity=20,
+            reorder_point=10,
+            safety_stock=5,
+            supplier=self.supplier,
+        )
+
+    def _alerts(self, state=ReorderAlert.OPEN):
+        return list(
+            ReorderAlert.objects.filter(state=state).values_list("product_id", flat=True)
+        )
+
+    def test_threshold_includes_safety_stock(self):
+        services.record_movement(self.product, 4, "Out")  # 16 > 15
+        self.assertEqual(self._alerts(), [])
+        services.record_movement(self.product, 1, "Out")  # 15 <= 15
+        self.assertEqual(self._alerts(), [self.product.pk])
+        alert = ReorderAlert.objects.get()
+        self.assertEqual((alert.stock_quantity, alert.threshold), (15, 15))
+
+    def test_alert_opens_once_and_resolves(self):
+        services.place_sale_order(self.product, 10)
+        services.place_sale_order(self.product, 2)
+        self.assertEqual(ReorderAlert.objects.count(), 1)
+        services.record_movement(self.product, 50, "In")
+        self.assertEqual(self._alerts(), [])
+        self.assertEqual(self._alerts(ReorderAlert.RESOLVED), [self.product.pk])
+        self.assertIsNotNone(ReorderAlert.objects.get().resolved_at)
+
+    def test_blank_settings_use_category_default(self):
+        other = Product.objects.create(
+            name="Gizmo",
+            category="Tools",
+            price="1.00",
+            stock_quantity=8,
+            supplier=self.supplier,
+        )
+        self.assertNotIn(other.pk, self._alerts())
+        CategoryReorderDefault.objects.create(
+            category="Tools", reorder_point=6, safety_stock=2
+        )
+        self.assertEqual(self._alerts(), [other.pk])
+
+    def test_evaluation_reads_only_touched_products(self):
+        for i in range(5):
+            Product.objects.create(
+                name=f"Other {i}", price="1.00", stock_quantity=0, supplier=self.supplier
+            )
+        with CaptureQueriesContext(connection) as captured:
+            services.record_movement(self.product, 1, "Out")
+        check = [q["sql"] for q in captured.captured_queries if "reorder_threshold" in q["sql"]]
+        self.assertEqual(len(check), 1)
+        self.assertIn(f'WHERE "core_product"."id" IN ({self.product.pk})', check[0])
+
+    def test_needs_reorder_list_and_api(self):
+        services.record_movement(self.product, 15, "Out")
+        response = self.client.get(reverse("needs_reorder"))
+        self.assertContains(response, "Widget")
+        self.assertEqual([a.product_id for a in response.context["page_obj"]], [self.product.pk])
+        data = self.client.get(reverse("api_needs_reorder")).json()
+        self.assertEqual(data["results"][0]["product_name"], "Widget")
+        self.assertEqual(data["results"][0]["stock_quantity"], 5)
+
+    def test_stock_level_filter_uses_effective_threshold(self):
+        CategoryReorderDefault.objects.create(category="Bulk", reorder_point=3)
+        Product.objects.bulk_create(
+            Product(
+                name=f"Bulk {i}",
+                category="Bulk",
+                price="1.00",
+                stock_quantity=i,
+                supplier=self.supplier,
+            )
+            for i in range(6)
+        )
+        response = self.client.get(
+            reverse("stock_level_check"), {"below_reorder_point": "on", "name": "bulk"}
+        )
+        self.assertEqual(
+            [p.name for p in response.context["page_obj"]],
+            ["Bulk 0", "Bulk 1", "Bulk 2", "Bulk 3"],
+        )
+
+    def test_evaluate_command_backfills_bulk_loaded_rows(self):
+        Product.objects.bulk_create(
+            [Product(name="Loaded", price="1.00", stock_quantity=0, supplier=self.supplier)]
+        )
+        out = io.StringIO()
+        call_command("evaluate_reorder_points", stdout=out)
+        self.assertIn("1 need reordering", out.getvalue())
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.widget = Product.objects.create(
+            name="Widget",
+            category="Tools",
+            price="2.50",
+            stock_quantity=100,
+            supplier=self.supplier,
+        )
+        self.gadget = Product.objects.create(
+            name="Gadget",
+            category="Toys",
+            price="10.00",
+            stock_quantity=100,
+            supplier=self.supplier,
+        )
+
+    def _rows(self):
+        columns = [
+            column for kind_columns in sales.COLUMNS.values() for column in kind_columns
+        ]
+        return (
+            sorted(DailyProductSales.objects.values_list("product_id", "date", *columns)),
+            sorted(DailyCategorySales.objects.values_list("category", "date", *columns)),
+        )
+
+    def test_orders_update_rollups_incrementally(self):
+        first = services.place_sale_order(self.widget, 4)
+        services.checkout([(self.widget.pk, 2), (self.gadget.pk, 1)])
+        services.complete_sale_order(first)
+        summary = sales.dashboard()["summary"]
+        self.assertEqual(summary["quantity"], 7)
+        self.assertEqual(summary["revenue"], Decimal("25.00"))
+        self.assertEqual(summary["completed_quantity"], 4)
+        self.assertEqual(summary["pending_quantity"], 3)
+
+        tools = DailyCategorySales.objects.get(category="Tools")
+        self.assertEqual((tools.orders, tools.quantity), (2, 6))
+        self.assertEqual(tools.revenue, Decimal("15.00"))
+
+    def test_cancel_books_against_the_order(self):
+        order = services.checkout([(self.widget.pk, 2), (self.gadget.pk, 1)])
+        services.cancel_sale_order(order)
+        gadget = DailyProductSales.objects.get(product=self.gadget)
+        self.assertEqual((gadget.cancelled_orders, gadget.cancelled_quantity), (1, 1))
+        summary = sales.dashboard()["summary"]
+        self.assertEqual(summary["net_revenue"], Decimal("0.00"))
+        self.assertEqual(summary["pending_quantity"], 0)
+
+    def test_complete_only_updates_the_rows_placed_by_the_order(self):
+        order = services.place_sale_order(self.widget, 2)
+        # status update, category read, one UPDATE per rollup, savepoint pair
+        with self.assertNumQueries(6):
+            services.complete_sale_order(order)
+        tools = DailyCategorySales.objects.get(category="Tools")
+        self.assertEqual(tools.completed_quantity, 2)
+
+    def test_complete_creates_the_row_of_a_new_category(self):
+        order = services.place_sale_order(self.widget, 2)
+        Product.objects.filter(pk=self.widget.pk).update(category="Hardware")
+        services.complete_sale_order(order)
+        hardware = DailyCategorySales.objects.get(category="Hardware")
+        self.assertEqual((hardware.completed_orders, hardware.quantity), (1, 0))
+        product = DailyProductSales.objects.get(product=self.widget)
+        self.assertEqual((product.quantity, product.completed_quantity), (2, 2))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        services.complete_sale_order(services.place_sale_order(self.widget, 3))
+        services.cancel_sale_order(services.place_sale_order(self.gadget, 2))
+        services.cancel_sale_order(
+            services.checkout([(self.widget.pk, 1), (self.gadget.pk, 4)])
+        )
+        services.checkout([(self.widget.pk, 5)])
+        incremental = self._rows()
+        sales.rebuild()
+        self.assertEqual(self._rows(), incremental)
+        sales.rebuild(chunk_size=1)
+        self.assertEqual(self._rows(), incremental)
+
+    def test_rebuild_moves_rows_to_the_current_category(self):
+        services.place_sale_order(self.widget, 2)
+        Product.objects.filter(pk=self.widget.pk).update(category="Hardware")
+        sales.rebuild(chunk_size=1)
+        hardware = DailyCategorySales.objects.get(category="Hardware")
+        self.assertEqual(hardware.quantity, 2)
+        self.assertFalse(DailyCategorySales.objects.filter(category="Tools").exists())
+
+    def test_home_dashboard_reads_only_rollups(self):
+        for _ in range(3):
+            services.checkout([(self.widget.pk, 1), (self.gadget.pk, 1)])
+        with self.captureOnCommitCallbacks(execute=True):
+            services.place_sale_order(self.widget, 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home"))
+        self.assertEqual(len(queries), 4)
+        self.assertNotIn("core_saleorder", " ".join(q["sql"] for q in queries))
+        self.assertContains(response, "Widget")
+        self.assertEqual(response.context["dashboard"]["summary"]["quantity"], 7)
+
+    def test_home_page_is_refreshed_after_a_sale(self):
+        self.client.get(reverse("home"))
+        with self.captureOnCommitCallbacks(execute=True):
+            services.place_sale_order(self.gadget, 1)
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Gadget")
+
+    def test_rebuild_command(self):
+        services.place_sale_order(self.widget, 1)
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        out = io.StringIO()
+        call_command(
+            "rebuild_sales_rollups", "--since", "2000-01-01", "--chunk-size", "1",
+            stdout=out,
+        )
+        self.assertIn("Wrote 2 rollup row(s)", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("rebuild_sales_rollups", "--since", "yesterday")
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = datetime.date(2024, 3, 31)
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.steady, self.growing, self.idle = [
+            Product.objects.create(
+                name=name, category="Tools", price="1.00", stock_quantity=60,
+                supplier=self.supplier,
+            )
+            for name in ("Steady", "Growing", "Idle")
+        ]
+
+    def _history(self, product, quantities):
+        """Daily 'Out' totals ending today, oldest first."""
+        DailyStockBalance.objects.bulk_create(
+            DailyStockBalance(
+                product=product,
+                date=self.today - datetime.timedelta(days=len(quantities) - 1 - i),
+                quantity_out=quantity,
+            )
+            for i, quantity in enumerate(quantities)
+        )
+
+    def _forecast(self, product):
+        return ProductForecast.objects.get(product=product)
+
+    def test_demand_trend_and_cover(self):
+        self._history(self.steady, [3] * 10)
+        self._history(self.growing, range(10))
+        self.assertEqual(forecasting.run(window=10, today=self.today), 3)
+
+        steady = self._forecast(self.steady)
+        self.assertAlmostEqual(steady.average_daily_demand, 3)
+        self.assertAlmostEqual(steady.smoothed_daily_demand, 3)
+        self.assertAlmostEqual(steady.trend, 0)
+        self.assertAlmostEqual(steady.days_of_cover, 20)
+
+        growing = self._forecast(self.growing)
+        self.assertAlmostEqual(growing.average_daily_demand, 4.5)
+        self.assertAlmostEqual(growing.recent_daily_demand, 6)
+        self.assertAlmostEqual(growing.trend, 1)
+        self.assertGreater(growing.smoothed_daily_demand, growing.average_daily_demand)
+
+        idle = self._forecast(self.idle)
+        self.assertEqual(idle.days_of_cover, forecasting.MAX_DAYS_OF_COVER)
+
+    def test_no_demand_and_no_stock_divides_cleanly(self):
+        Product.objects.filter(pk=self.idle.pk).update(stock_quantity=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            forecasting.run(window=10, today=self.today)
+        idle = self._forecast(self.idle)
+        self.assertEqual(idle.days_of_cover, forecasting.MAX_DAYS_OF_COVER)
+
+    def test_history_outside_window_is_ignored(self):
+        self._history(self.steady, [50] + [2] * 10)
+        forecasting.run(window=10, today=self.today)
+        self.assertAlmostEqual(self._forecast(self.steady).average_daily_demand, 2)
+
+    def test_history_after_today_is_ignored(self):
+        self._history(self.steady, [2] * 10 + [50])
+        DailyProductSales.objects.create(
+            product=self.steady, date=self.today, cancelled_quantity=5
+        )
+        forecasting.run(window=10, today=self.today - datetime.timedelta(days=1))
+        self.assertAlmostEqual(self._forecast(self.steady).average_daily_demand, 2)
+
+    def test_cancelled_orders_are_not_demand(self):
+        for _ in range(2):
+            services.place_sale_order(self.steady, 5)
+        order = services.place_sale_order(self.steady, 5)
+        services.cancel_sale_order(order)
+        forecasting.run(window=10)
+        self.assertAlmostEqual(self._forecast(self.steady).average_daily_demand, 1)
+
+    def test_chunks_give_the_same_forecast(self):
+        self._history(self.steady, [1, 4, 2, 0, 3])
+        self._history(self.growing, [5, 0, 0, 2, 9])
+        forecasting.run(window=7, today=self.today)
+        whole = list(ProductForecast.objects.order_by("pk").values_list(
+            "product", "smoothed_daily_demand", "trend", "days_of_cover"
+        ))
+        forecasting.run(window=7, today=self.today, chunk_size=1)
+        chunked = list(ProductForecast.objects.order_by("pk").values_list(
+            "product", "smoothed_daily_demand", "trend", "days_of_cover"
+        ))
+        for chunk_row, whole_row in zip(chunked, whole):
+            self.assertEqual(chunk_row[0], whole_row[0])
+            for chunk_value, whole_value in zip(chunk_row[1:], whole_row[1:]):
+                self.assertAlmostEqual(chunk_value, whole_value, places=3)
+
+    def test_chunk_query_count_is_independent_of_history(self):
+        self._history(self.steady, [1] * 30)
+        # product chunk + 2 rollup reads + savepoint, delete, insert, release
+        # + the empty chunk that ends the walk
+        with self.assertNumQueries(8):
+            forecasting.run(window=30, today=self.today)
+
+    def test_stock_level_check_sorts_and_filters_by_cover(self):
+        self._history(self.steady, [3] * 10)
+        self._history(self.growing, [6] * 10)
+        forecasting.run(window=10, today=self.today)
+        url = reverse("stock_level_check")
+
+        response = self.client.get(url, {"sort": "cover"})
+        names = [p.name for p in response.context["page_obj"]]
+        self.assertEqual(names, ["Growing", "Steady", "Idle"])
+        self.assertContains(response, "10.0")
+
+        response = self.client.get(url, {"max_days_of_cover": 15})
+        self.assertEqual([p.name for p in response.context["page_obj"]], ["Growing"])
+
+    def test_cover_sort_paginates_by_cursor(self):
+        Product.objects.bulk_create(
+            Product(
+                name=f"Bulk {i}", category="Bulk", price="1.00", stock_quantity=i,
+                supplier=self.supplier,
+            )
+            for i in range(30)
+        )
+        for product in Product.objects.filter(category="Bulk"):
+            self._history(product, [1] * 5)
+        forecasting.run(window=5, today=self.today)
+        url = reverse("stock_level_check")
+        first = self.client.get(url, {"sort": "cover"}).context["page_obj"]
+        second = self.client.get(
+            url, {"sort": "cover", "cursor": first.next_cursor}
+        ).context["page_obj"]
+        covers = [p.forecast.days_of_cover for p in list(first) + list(second)]
+        self.assertEqual(len(covers), 33)
+        self.assertEqual(covers, sorted(covers))
+
+    def test_forecast_command(self):
+        out = io.StringIO()
+        call_command("forecast_demand", "--window", "14", stdout=out)
+        self.assertIn("Forecast 3 product(s)", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("forecast_demand", "--window", "1")
+
+
+class MoneyFieldTests(TestCase):
+    def setUp(self):
+        self.supplier = Supplier.objects.create(
+            name="Test Supplier", email="supplier@test.com"
+        )
+        self.product = Product.objects.create(
+            name="Widget", price="0.29", stock_quantity=3, supplier=self.supplier
+        )
+
+    def test_stores_cents_and_loads_exact_decimals(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT price FROM core_product WHERE id = %s", [self.product.pk])
+            self.assertEqual(cursor.fetchone()[0], 29)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal("0.29"))
+        self.assertEqual(str(self.product.price), "0.29")
+        self.assertTrue(Product.objects.filter(price__gt="0.28").exists())
+
+    def test_fractions_of_a_cent_are_rejected(self):
+        with self.assertRaises(ValueError):
+            Product._meta.get_field("price").get_prep_value(Decimal("1.005"))
+        form = ProductForm(
+            data={
+                "name": "Gadget", "description": "", "category": "Tools",
+                "price": "1.005", "stock_quantity": 1, "supplier": self.supplier.pk,
+            }
+        )
+        self.assertIn("price", form.errors)
+
+    def test_to_python_accepts_legacy_decimal128(self):
+        from bson.decimal128 import Decimal128
+
+        field = Product._meta.get_field("price")
+        self.assertEqual(field.to_python(Decimal128("12.5")), Decimal("12.50"))
+        self.assertEqual(field.to_python(3), Decimal("3.00"))
+
+    def test_totals_are_aggregated_in_the_database(self):
+        services.place_sale_order(self.product, 1)
+        services.checkout([(self.product.pk, 2)])
+        with self.assertNumQueries(1):
+            total = SaleOrder.objects.aggregate(total=Sum("total_price"))["total"]
+        self.assertEqual(total, Decimal("0.87"))
+        Product.objects.create(
+            name="Gadget", price="10.10", stock_quantity=10, supplier=self.supplier
+        )
+        value = Product.objects.aggregate(
+            value=Sum(F("price") * F("stock_quantity"), output_field=MoneyField())
+        )["value"]
+        self.assertEqual(value, Decimal("101.00"))
+
+
+
+@skipUnless(mongomock, "mongomock is not installed")
+class MongoRepositoryTests(TestCase):
+    """core/mongo.py against an in-process mongomock database."""
+
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+        self.db = mongomock.MongoClient().db
+        self._insert(Supplier, id=1, name="Acme", email="a@acme.test", phone="1", address="")
+        self._insert(Supplier, id=2, name="Globex", email="g@globex.test", phone="2", address="")
+        self._insert(CategoryReorderDefault, id=1, category="Tools", reorder_point=5, safety_stock=1)
+        for pk, name, stock, supplier, reorder_point in [
+            (1, "Widget", 4, 1, None),
+            (2, "Gadget", 9, 2, 10),
+            (3, "Sprocket", 20, 1, None),
+            (4, "Widget Pro", 2, 2, 0),
+        ]:
+            self._insert(
+                Product, id=pk, name=name, description="", category="Tools",
+                price="1.50", stock_quantity=stock, supplier_id=supplier,
+                reorder_point=reorder_point, safety_stock=None,
+            )
+        self._insert(ProductForecast, product_id=1, days_of_cover=2.0, **self._demand())
+        self._insert(ProductForecast, product_id=3, days_of_cover=40.0, **self._demand())
+
+    def _demand(self):
+        return {
+            "average_daily_demand": 1.0, "recent_daily_demand": 1.0,
+            "smoothed_daily_demand": 1.0, "trend": 0.0,
+            "computed_at": datetime.datetime(2024, 1, 1),
+        }
+
+    def _insert(self, model, **values):
+        """Store a row the way djongo does: one field per column."""
+        doc = {}
+        for field in model._meta.concrete_fields:
+            if field.attname not in values:
+                continue
+            value = values[field.attname]
+            # BSON has no date type; djongo stores datetimes.
+            if not isinstance(value, datetime.datetime):
+                value = field.get_prep_value(value)
+            doc[field.column] = value
+        self.db[model._meta.db_table].insert_one(doc)
+
+    def _page(self, paginator, cursor=None):
+        return paginator.get_page(cursor)
+
+    def test_stock_levels_join_suppliers_thresholds_and_forecasts(self):
+        with self.assertNumQueries(0):
+            page = self._page(mongo.stock_levels(self.db, {}, 25))
+            rows = [
+                (p.name, p.stock_quantity, p.supplier.name, p.reorder_threshold)
+                for p in page
+            ]
+            self.assertEqual(page.object_list[1].forecast.days_of_cover, 2.0)
+            self.assertEqual(page.object_list[1].price, Decimal("1.50"))
+            with self.assertRaises(ProductForecast.DoesNotExist):
+                page.object_list[0].forecast
+        self.assertEqual(
+            rows,
+            [
+                ("Widget Pro", 2, "Globex", 1),
+                ("Widget", 4, "Acme", 6),
+                ("Gadget", 9, "Globex", 11),
+                ("Sprocket", 20, "Acme", 6),
+            ],
+        )
+
+    def test_stock_levels_filters(self):
+        supplier = Supplier(pk=2)
+        page = self._page(mongo.stock_levels(self.db, {"name": "WIDG"}, 25))
+        self.assertEqual([p.name for p in page], ["Widget Pro", "Widget"])
+        filters = {"name": "WIDG", "below_reorder_point": True}
+        page = self._page(mongo.stock_levels(self.db, filters, 25))
+        self.assertEqual([p.name for p in page], ["Widget"])
+        page = self._page(
+            mongo.stock_levels(self.db, {"supplier": supplier, "min_stock": 5}, 25)
+        )
+        self.assertEqual([p.name for p in page], ["Gadget"])
+        page = self._page(mongo.stock_levels(self.db, {"max_days_of_cover": 10}, 25))
+        self.assertEqual([p.name for p in page], ["Widget"])
+
+    def test_stock_levels_sorted_by_cover(self):
+        page = self._page(mongo.stock_levels(self.db, {"sort": "cover"}, 1))
+        self.assertEqual([p.name for p in page], ["Widget"])
+        page = self._page(
+            mongo.stock_levels(self.db, {"sort": "cover"}, 1), page.next_cursor
+        )
+        self.assertEqual([(p.name, p.forecast.days_of_cover) for p in page], [("Sprocket", 40.0)])
+        self.assertFalse(page.has_next())
+
+    def test_list_pages_follow_cursors_and_count(self):
+        paginator = mongo.products(self.db, "", 3)
+        first = self._page(paginator)
+        self.assertEqual([p.pk for p in first], [1, 2, 3])
+        self.assertEqual(first.total_count, 4)
+        second = self._page(paginator, first.next_cursor)
+        self.assertEqual([p.pk for p in second], [4])
+        back = self._page(paginator, second.previous_cursor)
+        self.assertEqual([p.pk for p in back], [1, 2, 3])
+
+        page = self._page(mongo.suppliers(self.db, "globex", 10))
+        self.assertEqual([s.name for s in page], ["Globex"])
+
+    def test_sale_orders_by_status_with_line_counts(self):
+        self._insert(
+            SaleOrder, id=1, product_id=1, quantity=2, total_price="3.00",
+            sale_date=datetime.datetime(2024, 1, 1), status="Pending",
+        )
+        self._insert(
+            SaleOrder, id=2, product_id=None, quantity=3, total_price="4.50",
+            sale_date=datetime.datetime(2024, 1, 2), status="Pending",
+        )
+        self._insert(
+            SaleOrder, id=3, product_id=2, quantity=1, total_price="1.50",
+            sale_date=datetime.datetime(2024, 1, 2), status="Completed",
+        )
+        for pk, product_id in ((1, 1), (2, 3)):
+            self._insert(
+                SaleOrderLine, id=pk, order_id=2, product_id=product_id, quantity=1,
+                unit_price="1.50", line_total="1.50",
+            )
+        with self.assertNumQueries(0):
+            page = self._page(mongo.sale_orders(self.db, "Pending", 10))
+            rows = [
+                (o.pk, o.line_count, o.product and o.product.name, o.sale_date)
+                for o in page
+            ]
+        self.assertEqual(
+            rows,
+            [
+                (2, 2, None, datetime.date(2024, 1, 2)),
+                (1, 0, "Widget", datetime.date(2024, 1, 1)),
+            ],
+        )
+        self.assertEqual(page.total_count, 2)
+
+    def test_views_read_mongo_when_djongo_is_active(self):
+        with mock.patch.object(mongo, "is_active", return_value=True), mock.patch.object(
+            mongo, "get_database", return_value=self.db
+        ):
+            self.assertIsInstance(repository.products("", 10), mongo.MongoPaginator)
+            response = self.client.get(reverse("stock_level_check"), {"name": "sprock"})
+        self.assertEqual([p.name for p in response.context["page_obj"]], ["Sprocket"])
+        self.assertNotIsInstance(repository.products("", 10), mongo.MongoPaginator)
+
+    def test_ensure_indexes(self):
+        mongo.ensure_indexes(self.db)
+        indexes = self.db[Product._meta.db_table].index_information()
+        self.assertIn([("stock_quantity", 1), ("id", 1)], [i["key"] for i in indexes.values()])
+
+
+@override_settings(DATABASE_ROUTING={"REPLICAS": ["replica"]})
+class ReplicaRoutingTests(TestCase):
+    """
+    Reads against a real second SQLite database standing in for a replica
+    that has not caught up: rows written to the primary are missing there.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after TestCase set up its databases, so the replica keeps its
+        # rows between tests (it is a throwaway file) and is not wrapped in
+        # the per-test transaction.
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.path.join(cls.replica_dir.name, "replica.sqlite3"),
+        }
+        call_command("migrate", database="replica", verbosity=0)
+        supplier = Supplier.objects.using("replica").create(
+            name="Acme", email="a@acme.test"
+        )
+        Product.objects.using("replica").create(
+            name="Replica Widget", price=Decimal("1.00"), stock_quantity=5,
+            category="Tools", supplier=supplier,
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        connections["replica"].close()
+        del connections.databases["replica"]
+        del connections._connections.replica
+        cls.replica_dir.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+        self.supplier = Supplier.objects.create(name="Acme", email="a@acme.test")
+        Product.objects.create(
+            name="Primary Widget", price=Decimal("1.00"), stock_quantity=5,
+            category="Tools", supplier=self.supplier,
+        )
+
+    def _add_supplier(self):
+        return self.client.post(
+            reverse("add_supplier"),
+            {"name": "Globex", "email": "g@globex.test", "phone": "1234567890", "address": "x"},
+        )
+
+    def test_router_outside_routed_views(self):
+        self.assertEqual(router.db_for_read(Product), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(Product), DEFAULT_DB_ALIAS)
+        self.assertEqual(routing.read_source(), "primary")
+
+    def test_read_views_use_the_replica(self):
+        response = self.client.get(reverse("list_products"))
+        self.assertContains(response, "Replica Widget")
+        self.assertNotContains(response, "Primary Widget")
+
+    def test_write_pins_the_browser_to_the_primary(self):
+        response = self._add_supplier()
+        self.assertRedirects(response, reverse("list_suppliers"), fetch_redirect_response=False)
+        self.assertIn("db_pin", response.cookies)
+
+        response = self.client.get(reverse("list_products"))
+        self.assertContains(response, "Primary Widget")
+        self.assertNotContains(response, "Replica Widget")
+
+        # Other browsers keep reading from the replica.
+        response = Client().get(reverse("list_products"))
+        self.assertContains(response, "Replica Widget")
+
+    def _pin(self):
+        signer = signing.get_cookie_signer(salt="db_pin" + routing._PIN_SALT)
+        self.client.cookies["db_pin"] = signer.sign("1")
+
+    # A replica that keeps up: its pages are cached straight away.
+    @override_settings(DATABASE_ROUTING={"REPLICAS": ["replica"], "MAX_LAG_SECONDS": 0})
+    def test_cached_pages_are_kept_per_read_source(self):
+        self.client.get(reverse("list_products"))  # cached from the replica
+        response = self.client.get(reverse("list_products"))
+        self.assertEqual(response["X-Page-Cache"], "hit")
+
+        self._pin()
+        response = self.client.get(reverse("list_products"))
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Primary Widget")
+        response = self.client.get(reverse("list_products"))
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Primary Widget")
+
+    def test_lagging_replica_pages_are_not_cached_after_a_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._add_supplier()
+        reader = Client()
+        for _ in range(2):
+            response = reader.get(reverse("list_suppliers"))
+            self.assertNotContains(response, "Globex")
+            self.assertEqual(response["X-Page-Cache"], "miss")
+        for _ in range(2):
+            with CaptureQueriesContext(connections["replica"]) as replica_reads:
+                reader.get(reverse("stock_level_check"))
+            self.assertTrue(replica_reads.captured_queries)
+
+        # The primary's pages are cached as usual.
+        self.client = Client()
+        self._pin()
+        self.client.get(reverse("list_suppliers"))
+        response = self.client.get(reverse("list_suppliers"))
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Globex")
+
+    def test_forged_pin_cookie_is_ignored(self):
+        self.client.cookies["db_pin"] = "1"
+        response = self.client.get(reverse("list_products"))
+        self.assertContains(response, "Replica Widget")
+
+    def test_streaming_export_reads_the_replica(self):
+        movement = StockMovement.objects.using("replica").create(
+            product=Product.objects.using("replica").get(), quantity=3,
+            movement_type="IN", notes="replica only",
+        )
+        self.addCleanup(movement.delete)
+        response = self.client.get(reverse("export_stock_movements"))
+        self.assertIn("replica only", b"".join(response.streaming_content).decode())
+        out = io.StringIO()
+        call_command("export_ledger", "movements", stdout=out)
+        self.assertIn("replica only", out.getvalue())
+
+
+class StockQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+        self.supplier = Supplier.objects.create(name="Acme", email="a@acme.test")
+        self.products = [
+            Product.objects.create(
+                name=f"Widget {i}", category="Tools", price="1.00",
+                stock_quantity=10, supplier=self.supplier,
+            )
+            for i in range(3)
+        ]
+
+    def _queue(self, scans):
+        for product, quantity in scans:
+            stockqueue.enqueue(product, quantity, notes="scan")
+
+    def test_enqueue_leaves_stock_until_drained(self):
+        first, second, _third = self.products
+        self._queue([(first, 2), (second, 3), (first, 4)])
+        first.refresh_from_db()
+        self.assertEqual(first.stock_quantity, 10)
+        home = services.default_location()
+        self.assertEqual(
+            stockqueue.pending_deltas(), {(first.pk, home): 6, (second.pk, home): 3}
+        )
+        self.assertEqual(
+            stockqueue.exact_stock([first.pk, second.pk]), {first.pk: 16, second.pk: 13}
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(stockqueue.drain(), 3)
+        self.assertEqual(
+            dict(Product.objects.values_list("pk", "stock_quantity")),
+            {first.pk: 16, second.pk: 13, self.products[2].pk: 10},
+        )
+        self.assertEqual(StockMovement.objects.filter(notes="scan").count(), 3)
+        self.assertEqual(
+            DailyStockBalance.objects.get(product=first).quantity_in, 6
+        )
+        self.assertFalse(QueuedStockMovement.objects.exists())
+        self.assertEqual(stockqueue.pending_deltas(), {})
+
+    def test_drain_cost_does_not_grow_with_the_batch(self):
+        def queries_to_drain(scans):
+            self._queue(scans)
+            with CaptureQueriesContext(connection) as context:
+                stockqueue.drain()
+            return len(context)
+
+        small = queries_to_drain([(self.products[0], 1), (self.products[1], 1)])
+        large = queries_to_drain(
+            [(product, n) for n in range(1, 21) for product in self.products[:2]]
+        )
+        self.assertEqual(small, large)
+
+    def test_drain_respects_batch_size(self):
+        self._queue([(self.products[0], 1)] * 5)
+        self.assertEqual(stockqueue.drain(batch_size=2), 2)
+        self.assertEqual(QueuedStockMovement.objects.count(), 3)
+        self.assertEqual(stockqueue.drain_all(batch_size=2), 3)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock_quantity, 15)
+
+    def test_with_pending_annotates_exact_stock(self):
+        self._queue([(self.products[1], 5)])
+        rows = dict(
+            stockqueue.with_pending(Product.objects.all()).values_list(
+                "pk", "exact_stock_quantity"
+            )
+        )
+        self.assertEqual(rows[self.products[0].pk], 10)
+        self.assertEqual(rows[self.products[1].pk], 15)
+
+    def test_pending_deltas_are_kept_per_location(self):
+        product = self.products[0]
+        depot = Location.objects.create(name="Depot")
+        home = services.default_location()
+        self._queue([(product, 2)])
+        stockqueue.enqueue(product, 5, location=depot)
+        self.assertEqual(
+            stockqueue.pending_deltas([product.pk]),
+            {(product.pk, home): 2, (product.pk, depot.pk): 5},
+        )
+        self.assertEqual(
+            stockqueue.pending_deltas(location=depot), {(product.pk, depot.pk): 5}
+        )
+        self.assertEqual(stockqueue.exact_stock([product.pk]), {product.pk: 17})
+        self.assertEqual(stockqueue.exact_stock([product.pk], home), {product.pk: 12})
+        self.assertEqual(stockqueue.exact_stock([product.pk], depot), {product.pk: 5})
+
+        at_depot = stockqueue.with_pending(Product.objects.all(), location=depot)
+        self.assertEqual(at_depot.get(pk=product.pk).pending_quantity, 5)
+        levels = stockqueue.with_pending(StockLevel.objects.filter(location_id=home))
+        self.assertEqual(levels.get(product=product).exact_stock_quantity, 12)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stockqueue.drain()
+        self.assertEqual(StockLevel.objects.get(product=product, location=depot).quantity, 5)
+
+    @override_settings(STOCK_QUEUE={"ENABLED": True})
+    def test_view_queues_in_movements_only(self):
+        product = self.products[0]
+        url = reverse("add_stock_movement")
+        with self.assertNumQueries(1):  # the INSERT, no product update
+            stockqueue.enqueue(product, 1)
+        response = self.client.post(
+            url, {"product": product.pk, "movement_type": "In", "quantity": 7}
+        )
+        self.assertRedirects(
+            response, reverse("list_stock_movements"), fetch_redirect_response=False
+        )
+        self.assertEqual(QueuedStockMovement.objects.count(), 2)
+        self.assertFalse(StockMovement.objects.exists())
+
+        self.client.post(url, {"product": product.pk, "movement_type": "Out", "quantity": 3})
+        product.refresh_from_db()
+        self.assertEqual(product.stock_quantity, 7)
+
+    def test_api_reports_pending_quantity(self):
+        self._queue([(self.products[2], 4)])
+        response = self.client.get(
+            reverse("api_stock_levels"),
+            {"fields": "id,stock_quantity,pending_quantity,exact_stock_quantity"},
+        )
+        row = next(r for r in response.json()["results"] if r["id"] == self.products[2].pk)
+        self.assertEqual(
+            (row["stock_quantity"], row["pending_quantity"], row["exact_stock_quantity"]),
+            (10, 4, 14),
+        )
+
+    def test_drain_command(self):
+        self._queue([(self.products[0], 3)])
+        out = io.StringIO()
+        call_command("drain_stock_queue", "--batch-size", "10", stdout=out)
+        self.assertIn("Applied 1 queued movement(s).", out.getvalue())
+        self.assertFalse(QueuedStockMovement.objects.exists())
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(name="Acme", email="a@acme.test")
+        self.product = Product.objects.create(
+            name="Widget", category="Tools", price="2.00", stock_quantity=10,
+            supplier=self.supplier,
+        )
+        self.today = datetime.date.today()
+
+    def _days_ago(self, days):
+        return self.today - datetime.timedelta(days=days)
+
+    def _move(self, quantity, movement_type, days_ago):
+        movement = services.record_movement(self.product, quantity, movement_type)
+        StockMovement.objects.filter(pk=movement.pk).update(
+            movement_date=self._days_ago(days_ago)
+        )
+
+    def _history(self):
+        """Created 10 days ago with 10 units, +5 eight days ago, -3 five days ago."""
+        StockSnapshot.objects.update(date=self._days_ago(10))
+        self._move(5, "In", 8)
+        self._move(3, "Out", 5)
+
+    def test_new_products_open_their_ledger(self):
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual((snapshot.quantity, snapshot.last_movement_id), (10, 0))
+        self.assertEqual(ledger.stock([self.product.pk]), {self.product.pk: 10})
+
+    def test_ledger_matches_the_counter_after_service_writes(self):
+        services.record_movement(self.product, 4, "In")
+        order = services.place_sale_order(self.product, 6)
+        services.checkout([(self.product.pk, 2)])
+        services.cancel_sale_order(order)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 12)
+        self.assertEqual(ledger.stock([self.product.pk]), {self.product.pk: 12})
+        self.assertEqual(list(ledger.check()), [])
+
+    def test_as_of(self):
+        self._history()
+        self.assertEqual(ledger.as_of(self._days_ago(11)), {self.product.pk: 0})
+        self.assertEqual(ledger.as_of(self._days_ago(9)), {self.product.pk: 10})
+        self.assertEqual(ledger.as_of(self._days_ago(8)), {self.product.pk: 15})
+        self.assertEqual(ledger.as_of(self._days_ago(1)), {self.product.pk: 12})
+
+    def test_snapshot_compacts_history(self):
+        self._history()
+        self.assertEqual(ledger.snapshot(self._days_ago(6)), 1)
+        self.assertEqual(ledger.snapshot(self._days_ago(1)), 1)
+        self.assertEqual(ledger.snapshot(self._days_ago(1)), 0)  # nothing new
+        latest = StockSnapshot.objects.latest("date")
+        self.assertEqual(latest.quantity, 12)
+        self.assertEqual(
+            latest.last_movement_id, StockMovement.objects.latest("pk").pk
+        )
+
+        services.record_movement(self.product, 1, "In")  # after the snapshot
+        self.assertEqual(ledger.stock([self.product.pk]), {self.product.pk: 13})
+        self.assertEqual(ledger.as_of(self._days_ago(7)), {self.product.pk: 15})
+        self.assertEqual(ledger.as_of(self._days_ago(3)), {self.product.pk: 12})
+
+    def test_stock_reads_are_one_query(self):
+        for _ in range(5):
+            services.record_movement(self.product, 1, "In")
+        with self.assertNumQueries(1):
+            ledger.stock([self.product.pk])
+
+    def test_rebuild_counters(self):
+        services.record_movement(self.product, 5, "In")
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=99)
+        self.assertEqual(list(ledger.check()), [(self.product.pk, 99, 15, 15)])
+
+        out = io.StringIO()
+        call_command("rebuild_stock_counters", "--dry-run", stdout=out)
+        self.assertIn("counter 99, ledger 15", out.getvalue())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 99)
+
+        call_command("rebuild_stock_counters", stdout=io.StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 15)
+
+    def _replay(self):
+        """{product_id: latest snapshot + signed movements after it}, in Python."""
+        stock = {}
+        for product in Product.objects.all():
+            snapshot = product.snapshots.order_by("-date", "-last_movement_id").first()
+            total = snapshot.quantity if snapshot else 0
+            mark = snapshot.last_movement_id if snapshot else 0
+            for movement in product.stockmovement_set.filter(pk__gt=mark):
+                sign = {"In": 1, "Out": -1}.get(movement.movement_type, 0)
+                total += sign * movement.quantity
+            stock[product.pk] = total
+        return stock
+
+    def test_replayed_ledger_matches_counters_and_location_totals(self):
+        depot = Location.objects.create(name="Depot")
+        gadget = Product.objects.create(
+            name="Gadget", category="Tools", price="1.00", stock_quantity=4,
+            supplier=self.supplier,
+        )
+        services.record_movement(self.product, 6, "In", location=depot)
+        services.transfer(self.product, 4, depot, None)
+        services.cancel_sale_order(services.place_sale_order(gadget, 3))
+        ledger.snapshot(self.today)
+        services.checkout([(self.product.pk, 5), (gadget.pk, 2)])
+        services.record_movement(gadget, 1, "Out")
+        services.complete_sale_order(services.place_sale_order(self.product, 2, depot))
+
+        replayed = self._replay()
+        self.assertEqual(replayed, {self.product.pk: 9, gadget.pk: 1})
+        self.assertEqual(dict(Product.objects.values_list("pk", "stock_quantity")), replayed)
+        self.assertEqual(
+            dict(
+                StockLevel.objects.values("product")
+                .annotate(total=Sum("quantity"))
+                .values_list("product", "total")
+            ),
+            replayed,
+        )
+        self.assertEqual(ledger.stock(replayed), replayed)
+        self.assertEqual(list(ledger.check()), [])
+
+    def test_check_reports_location_drift(self):
+        StockLevel.objects.filter(product=self.product).update(quantity=7)
+        self.assertEqual(list(ledger.check()), [(self.product.pk, 10, 10, 7)])
+        out = io.StringIO()
+        call_command("rebuild_stock_counters", "--dry-run", stdout=out)
+        self.assertIn("counter 10, ledger 10, locations 7", out.getvalue())
+
+    def test_snapshot_command_rejects_bad_dates(self):
+        with self.assertRaises(CommandError):
+            call_command("snapshot_stock", "--date", "yesterday")
+
+
+class CaseInsensitiveKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supplier = Supplier.objects.create(name="Acme", email="Sales@Acme.test")
+        Product.objects.create(
+            name="Widget", price="1.00", stock_quantity=1, category="c",
+            supplier=self.supplier,
+        )
+
+    def _product_data(self, name):
+        return {
+            "name": name, "description": "d", "category": "c", "price": "1.00",
+            "stock_quantity": 1, "supplier": self.supplier.pk,
+        }
+
+    def test_keys_follow_saves_and_bulk_creates(self):
+        self.assertEqual(Product.objects.get().name_key, "widget")
+        self.assertEqual(Supplier.objects.get().email_key, "sales@acme.test")
+        product = Product.objects.get()
+        product.name = "Widget XL"
+        product.save()
+        self.assertTrue(Product.objects.filter(name_key="widget xl").exists())
+
+    def test_database_rejects_case_variants(self):
+        with self.assertRaises(IntegrityError):
+            Product.objects.bulk_create(
+                [Product(name="WIDGET", price="1.00", stock_quantity=1, supplier=self.supplier)]
+            )
+
+    def test_product_form_has_no_duplicate_prequery(self):
+        form = ProductForm(data=self._product_data("wIdGeT"))
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(form.is_valid())
+        self.assertFalse(
+            [q for q in context.captured_queries if "core_product" in q["sql"]]
+        )
+        self.assertIsNone(form.save())
+        self.assertEqual(form.errors["name"], ["A product with this name already exists."])
+        self.assertEqual(Product.objects.count(), 1)
+
+    def _driver_error(self, cause):
+        """A Django IntegrityError raised from the driver error ``cause``."""
+        try:
+            try:
+                raise cause
+            except Exception as exc:
+                raise IntegrityError(*cause.args) from exc
+        except IntegrityError as exc:
+            return exc
+
+    def test_violated_key_on_sqlite(self):
+        exc = self._driver_error(
+            sqlite3.IntegrityError("UNIQUE constraint failed: core_product.name_key")
+        )
+        self.assertEqual(violated_key(exc, "core_product", ["name_key"]), "name_key")
+        other = self._driver_error(
+            sqlite3.IntegrityError("UNIQUE constraint failed: core_product.phone_key")
+        )
+        self.assertIsNone(violated_key(other, "core_product", ["name_key"]))
+
+    def test_violated_key_on_postgresql(self):
+        cause = Exception("duplicate key value violates unique constraint")
+        cause.diag = mock.Mock(constraint_name="core_supplier_email_key_c4c70991_uniq")
+        exc = self._driver_error(cause)
+        self.assertEqual(violated_key(exc, "core_supplier", ["email_key"]), "email_key")
+        cause.diag.constraint_name = "core_supplier_phone_key"
+        self.assertIsNone(violated_key(exc, "core_supplier", ["email_key"]))
+
+    def test_violated_key_on_mongodb(self):
+        message = (
+            "E11000 duplicate key error collection: ims.core_product index: "
+            'core_product_name_key_04ed20cc_uniq dup key: { name_key: "widget" }'
+        )
+        exc = self._driver_error(Exception(message))
+        self.assertEqual(violated_key(exc, "core_product", ["name_key"]), "name_key")
+        cause = Exception("duplicate key")
+        cause.details = {"keyPattern": {"name_key": 1}, "errmsg": "E11000"}
+        exc = self._driver_error(cause)
+        self.assertEqual(violated_key(exc, "core_product", ["name_key"]), "name_key")
+
+    def test_frozen_index_names_match_the_schema_editor(self):
+        editor = connection.schema_editor()
+        for (table, column), name in UNIQUE_KEY_INDEXES.items():
+            self.assertEqual(
+                editor._create_index_name(table, [column], suffix="_uniq"), name
+            )
+
+    def test_supplier_view_reports_duplicate_email(self):
+        response = self.client.post(
+            reverse("add_supplier"),
+            {"name": "Other", "email": "sales@ACME.test", "phone": "1234567890", "address": "x"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "A supplier with this email already exists.")
+        self.assertEqual(Supplier.objects.count(), 1)
+
+
+class LocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.main = Location.objects.get(pk=default_location())
+        self.depot = Location.objects.create(name="Depot")
+        supplier = Supplier.objects.create(name="Acme", email="a@acme.test")
+        self.product = Product.objects.create(
+            name="Widget", price="2.00", stock_quantity=10, category="c",
+            supplier=supplier,
+        )
+
+    def _levels(self):
+        return dict(
+            StockLevel.objects.filter(product=self.product).values_list(
+                "location__name", "quantity"
+            )
+        )
+
+    def test_new_products_start_at_the_default_location(self):
+        self.assertEqual(self.main.name, "Main")
+        self.assertEqual(self._levels(), {"Main": 10})
+
+    def test_movements_change_one_location_and_the_total(self):
+        services.record_movement(self.product, 4, "In", location=self.depot)
+        services.record_movement(self.product, 3, "Out")
+        self.assertEqual(self._levels(), {"Main": 7, "Depot": 4})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 11)
+
+    def test_level_is_locked_before_the_total(self):
+        with CaptureQueriesContext(connection) as queries:
+            services.record_movement(self.product, 2, "In", location=self.depot)
+            services.record_movement(self.product, 1, "Out", location=self.depot)
+        tables = [
+            q["sql"].split()[1].strip('"')
+            for q in queries
+            if q["sql"].startswith("UPDATE")
+        ]
+        stock_tables = [t for t in tables if t in ("core_stocklevel", "core_product")]
+        self.assertEqual(stock_tables, ["core_stocklevel", "core_product"] * 2)
+
+    def test_in_for_a_deleted_product_writes_nothing(self):
+        product = Product(pk=self.product.pk + 100, name="Gone")
+        with self.assertRaises(services.InsufficientStock):
+            services.record_movement(product, 3, "In", location=self.depot)
+        self.assertFalse(StockLevel.objects.filter(product_id=product.pk).exists())
+
+    def test_out_is_refused_when_the_location_is_short(self):
+        with self.assertRaises(services.InsufficientStock):
+            services.record_movement(self.product, 1, "Out", location=self.depot)
+        with self.assertRaises(services.InsufficientStock):
+            services.place_sale_order(self.product, 1, location=self.depot)
+        with self.assertRaises(services.CheckoutError) as caught:
+            services.checkout([(self.product.pk, 1)], location=self.depot)
+        self.assertEqual(caught.exception.errors, {0: "Insufficient stock. Currently 0 in stock."})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 10)
+
+    def test_transfer_moves_stock_but_keeps_the_total(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            movement = services.transfer(self.product, 6, self.main, self.depot)
+        self.assertEqual(movement.to_location, self.depot)
+        self.assertEqual(self._levels(), {"Main": 4, "Depot": 6})
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 10)
+        self.assertEqual(ledger.stock([self.product.pk]), {self.product.pk: 10})
+        self.assertFalse(DailyStockBalance.objects.exists())
+        with self.assertRaises(services.InsufficientStock):
+            services.transfer(self.product, 5, self.main, self.depot)
+
+    def test_cancel_restocks_the_order_location(self):
+        services.transfer(self.product, 6, self.main, self.depot)
+        order = services.place_sale_order(self.product, 2, location=self.depot)
+        self.assertEqual(self._levels()["Depot"], 4)
+        services.cancel_sale_order(order)
+        self.assertEqual(self._levels(), {"Main": 4, "Depot": 6})
+
+    def test_queued_scans_keep_their_location(self):
+        with override_settings(STOCK_QUEUE={"ENABLED": True}):
+            stockqueue.enqueue(self.product, 2, location=self.depot)
+            stockqueue.enqueue(self.product, 3)
+            stockqueue.drain_all()
+        self.assertEqual(self._levels(), {"Main": 13, "Depot": 2})
+
+    def test_transfer_form_needs_a_different_location_with_stock(self):
+        data = {
+            "product": self.product.pk, "movement_type": "Transfer",
+            "location": self.main.pk, "quantity": 3,
+        }
+        form = StockMovementForm(data=data)
+        self.assertFalse(form.is_valid())
+        self.assertIn("to_location", form.errors)
+        form = StockMovementForm(data=dict(data, to_location=self.main.pk))
+        self.assertFalse(form.is_valid())
+        self.assertIn("to_location", form.errors)
+        form = StockMovementForm(
+            data=dict(data, location=self.depot.pk, to_location=self.main.pk)
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["quantity"], ["Insufficient stock. Currently 0 in stock."])
+
+    def test_transfer_view(self):
+        response = self.client.post(
+            reverse("add_stock_movement"),
+            {
+                "product": self.product.pk, "movement_type": "Transfer",
+                "location": self.main.pk, "to_location": self.depot.pk,
+                "quantity": 3, "notes": "",
+            },
+        )
+        self.assertRedirects(response, reverse("list_stock_movements"))
+        self.assertEqual(self._levels(), {"Main": 7, "Depot": 3})
+        movement = StockMovement.objects.get()
+        self.assertEqual((movement.location, movement.to_location), (self.main, self.depot))
+
+    def test_stock_level_check_reads_one_location(self):
+        services.transfer(self.product, 6, self.main, self.depot)
+        other = Product.objects.create(
+            name="Gadget", price="1.00", stock_quantity=1, category="c",
+            supplier=self.product.supplier,
+        )
+        response = self.client.get(
+            reverse("stock_level_check"), {"location": self.depot.pk, "max_stock": 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        products = list(response.context["products"])
+        self.assertEqual(products, [self.product])
+        self.assertEqual(products[0].location_quantity, 6)
+        self.assertContains(response, "At Depot")
+
+        response = self.client.get(reverse("stock_level_check"), {"location": self.main.pk})
+        self.assertEqual(
+            [(p, p.location_quantity) for p in response.context["products"]],
+            [(other, 1), (self.product, 4)],
+        )
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+        self.client.force_login(
+            User.objects.create_superuser("admin", "admin@example.com", "pw")
+        )
+        self.supplier = Supplier.objects.create(name="Acme", email="a@acme.test")
+        self.product = Product.objects.create(
+            name="Widget", price="2.00", stock_quantity=10, category="c",
+            supplier=self.supplier,
+        )
+
+    def _changelist(self, model):
+        return reverse(f"admin:core_{model._meta.model_name}_changelist")
+
+    def _movements(self, count):
+        StockMovement.objects.bulk_create(
+            StockMovement(product=self.product, quantity=1, movement_type="In")
+            for _ in range(count)
+        )
+
+    def test_changelists_load(self):
+        services.place_sale_order(self.product, 1)
+        for model in (Supplier, Product, SaleOrder, StockMovement, StockLevel, Location):
+            with self.subTest(model=model.__name__):
+                response = self.client.get(self._changelist(model))
+                self.assertEqual(response.status_code, 200)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        url = self._changelist(StockMovement)
+        self._movements(3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        self._movements(60)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_count_stops_at_the_limit(self):
+        self._movements(5)
+        with mock.patch.object(core_admin, "COUNT_LIMIT", 3):
+            paginator = core_admin.EstimatedCountPaginator(
+                StockMovement.objects.all(), 2
+            )
+            self.assertEqual(paginator.count, 3)
+        response = self.client.get(self._changelist(StockMovement))
+        self.assertIsNone(response.context["cl"].full_result_count)
+
+    def test_search_uses_the_index(self):
+        Product.objects.create(
+            name="Gadget", price="1.00", stock_quantity=1, category="c",
+            supplier=self.supplier,
+        )
+        response = self.client.get(self._changelist(Product), {"q": "widg"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.product])
+        order = services.place_sale_order(self.product, 1)
+        response = self.client.get(self._changelist(SaleOrder), {"q": f"#{order.pk}"})
+        self.assertEqual(list(response.context["cl"].result_list), [order])
+
+    def test_product_autocomplete(self):
+        response = self.client.get(
+            reverse("admin:autocomplete"),
+            {
+                "term": "widg", "app_label": "core", "model_name": "stockmovement",
+                "field_name": "product",
+            },
+        )
+        self.assertEqual(
+            [item["text"] for item in response.json()["results"]], ["Widget"]
+        )
+
+    def test_stock_is_read_only_on_existing_products(self):
+        response = self.client.post(
+            reverse("admin:core_product_change", args=[self.product.pk]),
+            {
+                "name": "widget", "description": "d", "category": "c", "price": "3.00",
+                "stock_quantity": 99, "supplier": self.supplier.pk,
+                "stock_levels-TOTAL_FORMS": 1, "stock_levels-INITIAL_FORMS": 1,
+                "stock_levels-MIN_NUM_FORMS": 0, "stock_levels-MAX_NUM_FORMS": 1000,
+                "stock_levels-0-id": StockLevel.objects.get().pk,
+                "stock_levels-0-product": self.product.pk,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock_quantity), ("widget", 10))
+
+    def test_duplicate_product_name_is_a_form_error(self):
+        response = self.client.post(
+            reverse("admin:core_product_add"),
+            {
+                "name": "WIDGET", "description": "d", "category": "c", "price": "1.00",
+                "stock_quantity": 1, "supplier": self.supplier.pk,
+                "stock_levels-TOTAL_FORMS": 0, "stock_levels-INITIAL_FORMS": 0,
+                "stock_levels-MIN_NUM_FORMS": 0, "stock_levels-MAX_NUM_FORMS": 1000,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "A product with this name already exists.")
+
+    def test_added_movements_go_through_the_service(self):
+        url = reverse("admin:core_stockmovement_add")
+        data = {
+            "product": self.product.pk, "movement_type": "Out", "quantity": 4,
+            "location": default_location(), "notes": "",
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 6)
+        self.assertEqual(StockLevel.objects.get().quantity, 6)
+        self.assertEqual(DailyStockBalance.objects.get().quantity_out, 4)
+
+        response = self.client.post(url, dict(data, quantity=7))
+        self.assertContains(response, "Insufficient stock. Currently 6 in stock.")
+        self.assertEqual(StockMovement.objects.count(), 1)
+
+    def test_order_actions_go_through_the_service(self):
+        first = services.place_sale_order(self.product, 2)
+        second = services.place_sale_order(self.product, 3)
+        url = self._changelist(SaleOrder)
+        response = self.client.post(
+            url, {"action": "cancel_orders", "_selected_action": [first.pk]}
+        )
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(
+            url,
+            {"action": "complete_orders", "_selected_action": [first.pk, second.pk]},
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ("Cancelled", "Completed"))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+
+    def test_ledger_cannot_be_edited_or_deleted(self):
+        order = services.place_sale_order(self.product, 1)
+        movement = StockMovement.objects.get()
+        response = self.client.get(
+            reverse("admin:core_stockmovement_change", args=[movement.pk])
+        )
+        self.assertNotContains(response, 'name="_save"')
+        response = self.client.get(self._changelist(SaleOrder))
+        self.assertNotContains(response, "delete_selected")
+        response = self.client.post(
+            reverse("admin:core_saleorder_change", args=[order.pk]), {"status": "Completed"}
+        )
+        self.assertEqual(response.status_code, 403)
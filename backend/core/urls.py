@@ -1,11 +1,12 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path("", views.home, name="home"),
     # Products
     path("products/add/", views.add_product, name="add_product"),
     path("products/", views.list_products, name="list_products"),
+    path("catalog/import/", views.import_catalog, name="import_catalog"),
     # Suppliers
     path("suppliers/add/", views.add_supplier, name="add_supplier"),
     path("suppliers/", views.list_suppliers, name="list_suppliers"),
@@ -20,8 +21,18 @@ urlpatterns = [
         views.list_stock_movements,
         name="list_stock_movements",
     ),
+    path(
+        "stock-movements/export/",
+        views.export_stock_movements,
+        name="export_stock_movements",
+    ),
     # Sale Orders
     path("sales/add/", views.create_sale_order, name="create_sale_order"),
+    path(
+        "sales/checkout/",
+        views.checkout_sale_order,
+        name="checkout_sale_order",
+    ),
     path(
         "sales/<int:order_id>/cancel/",
         views.cancel_sale_order,
@@ -33,10 +44,33 @@ urlpatterns = [
         name="complete_sale_order",
     ),
     path("sales/", views.list_sale_orders, name="list_sale_orders"),
+    path(
+        "sales/export/",
+        views.export_sale_orders,
+        name="export_sale_orders",
+    ),
     # Stock Level
     path(
         "stock-level-check/",
         views.stock_level_check,
         name="stock_level_check",
     ),
+    path("reorder/", views.needs_reorder, name="needs_reorder"),
+    # Read-only JSON API (see core/api.py)
+    path("api/products/", api.api_list, {"resource": "products"}, name="api_products"),
+    path("api/suppliers/", api.api_list, {"resource": "suppliers"}, name="api_suppliers"),
+    path(
+        "api/stock-levels/",
+        api.api_list,
+        {"resource": "stock-levels"},
+        name="api_stock_levels",
+    ),
+    path("api/orders/", api.api_list, {"resource": "orders"}, name="api_orders"),
+    path("api/movements/", api.api_list, {"resource": "movements"}, name="api_movements"),
+    path(
+        "api/needs-reorder/",
+        api.api_list,
+        {"resource": "needs-reorder"},
+        name="api_needs_reorder",
+    ),
 ]
@@ -0,0 +1,83 @@
+# core/versioning.py
+"""
+Per-table version counters kept in the Django cache.
+
+Cached results are keyed by the version of every table they read; any write
+bumps the counter, which makes all older keys unreachable without having to
+find and delete them. Signals bump on model save/delete, and code that
+writes with ``update()``/``bulk_create`` (which skip signals) calls
+``bump_on_commit`` itself.
+
+The counters live in the cache alias named by ``VERSIONS_CACHE_ALIAS``
+(settings.py puts them next to the rendered pages), so pages shared between
+worker processes are never keyed by one process's private counter.
+
+Counters start from, and are bumped to, the current time in microseconds
+rather than counting from 1, so a counter that was evicted or flushed can
+never repeat a version still keyed in another cache (such as the page
+cache), and two processes bumping at once through a cache without an atomic
+``incr`` (the file cache) still each leave a version nothing was stored
+under. Each bump also records when it happened, for HTTP ``Last-Modified``
+headers.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import transaction
+
+KEY = "core:version:{}"
+MODIFIED_KEY = "core:modified:{}"
+
+
+def get_cache():
+    return caches[getattr(settings, "VERSIONS_CACHE_ALIAS", DEFAULT_CACHE_ALIAS)]
+
+
+def get_version(name):
+    cache = get_cache()
+    version = cache.get(KEY.format(name))
+    if version is None:
+        # add() avoids clobbering a racing bump.
+        cache.add(KEY.format(name), _initial(), timeout=None)
+        version = cache.get(KEY.format(name), 1)
+    return version
+
+
+def _initial():
+    return time.time_ns() // 1000
+
+
+def get_versions(*names):
+    return ".".join(str(get_version(name)) for name in names)
+
+
+def get_last_modified(*names):
+    """
+    Epoch seconds of the latest bump of any of ``names``. A table not bumped
+    since the cache started counts as modified when first asked about.
+    """
+    cache = get_cache()
+    latest = 0
+    for name in names:
+        key = MODIFIED_KEY.format(name)
+        modified = cache.get(key)
+        if modified is None:
+            cache.add(key, time.time(), timeout=None)
+            modified = cache.get(key, time.time())
+        latest = max(latest, modified)
+    return latest
+
+
+def bump(*names):
+    cache = get_cache()
+    now = time.time()
+    for name in names:
+        key = KEY.format(name)
+        cache.set(key, max(_initial(), cache.get(key, 0) + 1), timeout=None)
+        cache.set(MODIFIED_KEY.format(name), now, timeout=None)
+
+
+def bump_on_commit(*names):
+    """Bump once the current transaction commits (immediately if none)."""
+    transaction.on_commit(lambda: bump(*names))
@@ -1,24 +1,50 @@
+import hashlib
+import io
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.core.paginator import Paginator
 from django.contrib import messages
-from django.db import models
+from django.core.cache import cache
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.core.paginator import Paginator
 
-from .models import Product, Supplier, StockMovement, SaleOrder
+from . import (
+    forecasting,
+    reorder,
+    repository,
+    routing,
+    sales,
+    search,
+    services,
+    stockqueue,
+    versioning,
+)
+from .pagecache import cache_page_versioned
+from .pagination import CursorPaginator
+from .models import Product, StockMovement, SaleOrder
 from .forms import (
     ProductForm,
     SupplierForm,
     StockMovementForm,
     SaleOrderForm,
+    CheckoutFormSet,
     StockLevelFilterForm,
+    CatalogUploadForm,
+    LedgerExportForm,
 )
+from . import exporters
+from .importers import CatalogImporter, guess_format, iter_rows
 
+# Rejected rows shown on the upload result page; the rest are only counted.
+IMPORT_ERRORS_SHOWN = 100
 
+
+@routing.replica_reads
+@cache_page_versioned("saleorder", "product")
 def home(request):
-    return render(request, "core/home.html")
+    """Last 30 days of sales, read from the daily rollups (see core/sales.py)."""
+    return render(request, "core/home.html", {"dashboard": sales.dashboard()})
 
 
 # ----- PRODUCTS -----
@@ -27,8 +53,10 @@ def home(request):
 def add_product(request):
     if request.method == "POST":
         form = ProductForm(request.POST)
-        if form.is_valid():
-            product = form.save()  # Saves to DB
+        # save() returns None if the name turns out to be taken
+        product = form.save() if form.is_valid() else None
+        if product is not None:
+            routing.pin_to_primary(request)
             messages.success(
                 request, f"Product '{product.name}' was added successfully!"
             )
@@ -45,24 +73,16 @@ def add_product(request):
     return render(request, "core/add_product.html", {"form": form})
 
 
+@routing.replica_reads
+@cache_page_versioned("product", "supplier")
 def list_products(request):
     # 1. Get optional search term from query string
     search_query = request.GET.get("search", "")
 
-    # 2. Filter products by name if a search term is provided
-    if search_query:
-        # Example: partial match on product name
-        products_list = Product.objects.select_related("supplier").filter(
-            name__icontains=search_query
-        )
-    else:
-        # No search term => show all products
-        products_list = Product.objects.select_related("supplier").all()
-
-    # 3. Set up pagination (e.g., 10 products per page)
-    paginator = Paginator(products_list, 10)
-    page_number = request.GET.get("page")  # "page" query param
-    page_obj = paginator.get_page(page_number)
+    # 2. Keyset pagination (10 products per page) on the primary key,
+    #    filtered by name through the search index
+    paginator = repository.products(search_query, 10)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     context = {
         "search_query": search_query,
@@ -71,14 +91,57 @@ def list_products(request):
     return render(request, "core/list_products.html", context)
 
 
+def import_catalog(request):
+    """
+    Upload a CSV/JSON-lines catalogue. The file is streamed through
+    CatalogImporter in batches, so its size does not affect memory use.
+    """
+    errors = []
+    rejected = 0
+    if request.method == "POST":
+        form = CatalogUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            kind = form.cleaned_data["kind"]
+            importer = CatalogImporter(kind)
+            # Batches are committed as they stream in, so a stray non-UTF-8
+            # byte (e.g. a Latin-1 export) becomes U+FFFD instead of failing
+            # the request halfway through the file.
+            text = io.TextIOWrapper(
+                upload.file, encoding="utf-8-sig", errors="replace", newline=""
+            )
+            for error in importer.run(iter_rows(text, guess_format(upload.name))):
+                rejected += 1
+                if len(errors) < IMPORT_ERRORS_SHOWN:
+                    errors.append(error)
+
+            routing.pin_to_primary(request)
+            messages.success(
+                request,
+                f"Imported {importer.created} {kind}(s); {rejected} row(s) rejected.",
+            )
+    else:
+        form = CatalogUploadForm()
+
+    context = {
+        "form": form,
+        "errors": errors,
+        "rejected": rejected,
+        "hidden_errors": rejected - len(errors),
+    }
+    return render(request, "core/import_catalog.html", context)
+
+
 # ----- SUPPLIERS -----
 
 
 def add_supplier(request):
     if request.method == "POST":
         form = SupplierForm(request.POST)
-        if form.is_valid():
-            supplier = form.save()
+        # save() returns None if the email turns out to be taken
+        supplier = form.save() if form.is_valid() else None
+        if supplier is not None:
+            routing.pin_to_primary(request)
             messages.success(
                 request, f"Supplier '{supplier.name}' added successfully!"
             )
@@ -91,22 +154,14 @@ def add_supplier(request):
     return render(request, "core/add_supplier.html", {"form": form})
 
 
+@routing.replica_reads
+@cache_page_versioned("supplier")
 def list_suppliers(request):
     search_query = request.GET.get("search", "")
 
-    # Filter suppliers by name or email (case-insensitive) if a search term is provided.
-    if search_query:
-        suppliers_list = Supplier.objects.filter(
-            models.Q(name__icontains=search_query)
-            | models.Q(email__icontains=search_query)
-        )
-    else:
-        suppliers_list = Supplier.objects.all()
-
-    # Paginate
-    paginator = Paginator(suppliers_list, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Filter suppliers by name or email (case-insensitive) and paginate
+    paginator = repository.suppliers(search_query, 10)
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     context = {
         "search_query": search_query,
@@ -123,35 +178,53 @@ def add_stock_movement(request):
         form = StockMovementForm(request.POST)
         if form.is_valid():
             stock_movement = form.save(commit=False)
-
-            # Update the product's stock based on movement_type
             product = stock_movement.product
-            import decimal
-
-            # When setting a DecimalField value, ensure it's a Python decimal
-            # value = "123.00"  # Example value as string
-            # decimal_value = decimal.Decimal(value)
-            # product.price = decimal_value
-            # product.save()
-            # print("---")
-            # print(type(product.price))
-            # print("---")
-            if stock_movement.movement_type == "In":
-                product.stock_quantity += stock_movement.quantity
-            else:  # 'Out'
-                product.stock_quantity -= stock_movement.quantity
-
-            # Save updated product
-            product.save()
-
-            # Now save the StockMovement record
-            stock_movement.save()
-
-            messages.success(
-                request,
-                f"Stock movement '{stock_movement.movement_type}' recorded successfully for {product.name}!",
-            )
-            return redirect("list_stock_movements")
+            location = form.cleaned_data["location"]
+
+            if stockqueue.accepts(stock_movement.movement_type):
+                # Acknowledge now; drain_stock_queue applies it in a batch
+                stockqueue.enqueue(
+                    product,
+                    stock_movement.quantity,
+                    notes=stock_movement.notes,
+                    location=location,
+                )
+                routing.pin_to_primary(request)
+                messages.success(
+                    request,
+                    f"Stock movement 'In' queued for {product.name}.",
+                )
+                return redirect("list_stock_movements")
+
+            # Update stock and write the movement in one transaction
+            try:
+                if stock_movement.movement_type == "Transfer":
+                    services.transfer(
+                        product,
+                        stock_movement.quantity,
+                        location,
+                        stock_movement.to_location,
+                        notes=stock_movement.notes,
+                    )
+                else:
+                    services.record_movement(
+                        product,
+                        stock_movement.quantity,
+                        stock_movement.movement_type,
+                        notes=stock_movement.notes,
+                        location=location,
+                    )
+            except services.InsufficientStock:
+                form.add_error(
+                    "quantity", "Insufficient stock for this product."
+                )
+            else:
+                routing.pin_to_primary(request)
+                messages.success(
+                    request,
+                    f"Stock movement '{stock_movement.movement_type}' recorded successfully for {product.name}!",
+                )
+                return redirect("list_stock_movements")
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -160,22 +233,29 @@ def add_stock_movement(request):
     return render(request, "core/add_stock_movement.html", {"form": form})
 
 
+@routing.replica_reads
+@cache_page_versioned("stockmovement", "product", "location")
 def list_stock_movements(request):
     # Example: optional search by product name
     search_query = request.GET.get("search", "")
 
+    movements_list = StockMovement.objects.select_related(
+        "product", "location", "to_location"
+    ).all()
     if search_query:
-        # Filter by product name
-        movements_list = StockMovement.objects.select_related(
-            "product"
-        ).filter(product__name__icontains=search_query)
-    else:
-        movements_list = StockMovement.objects.select_related("product").all()
+        # Filter by product name via the product search index
+        movements_list = search.filter_queryset(
+            movements_list, search_query, model=Product, prefix="product__"
+        )
 
-    # Paginate (10 per page)
-    paginator = Paginator(movements_list, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Paginate (10 per page), newest first
+    paginator = CursorPaginator(
+        movements_list,
+        10,
+        ordering=("-movement_date", "-id"),
+        count="cached",
+    )
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     return render(
         request,
@@ -187,48 +267,37 @@ def list_stock_movements(request):
     )
 
 
+@routing.replica_reads
+def export_stock_movements(request):
+    return _export(
+        request, "stock_movements", exporters.stock_movement_rows, "search"
+    )
+
+
 # ----- SALE ORDERS -----
 
 
 def create_sale_order(request):
     """
     Use a Django form to create a sale order.
-    We do stock checks and set total price in the view logic.
+    The stock check and deduction happen atomically in services.place_sale_order.
     """
     if request.method == "POST":
         form = SaleOrderForm(request.POST)
         if form.is_valid():
-            # The form is valid, but we still need to do a stock check
             product = form.cleaned_data["product"]
             quantity = form.cleaned_data["quantity"]
 
-            if product.stock_quantity < quantity:
+            try:
+                sale_order = services.place_sale_order(
+                    product, quantity, location=form.cleaned_data["location"]
+                )
+            except services.InsufficientStock:
                 form.add_error(
                     "quantity", "Insufficient stock for this product."
                 )
             else:
-                # Enough stock => create the order
-                total_price = product.price.to_decimal() * quantity
-
-                sale_order = SaleOrder.objects.create(
-                    product=product,
-                    quantity=quantity,
-                    total_price=total_price,
-                    status="Pending",
-                )
-
-                # Deduct stock immediately (or do so only on "Complete" if that's your policy)
-                product.stock_quantity -= quantity
-                product.save()
-
-                # Record a StockMovement of type 'Out'
-                StockMovement.objects.create(
-                    product=product,
-                    quantity=quantity,
-                    movement_type="Out",
-                    notes=f"Sale Order #{sale_order.pk}",
-                )
-
+                routing.pin_to_primary(request)
                 messages.success(
                     request,
                     f"Sale Order #{sale_order.pk} created successfully!",
@@ -241,25 +310,44 @@ def create_sale_order(request):
     return render(request, "core/create_sale_order.html", {"form": form})
 
 
-def cancel_sale_order(request, order_id):
-    sale_order = get_object_or_404(SaleOrder, pk=order_id)
+def checkout_sale_order(request):
+    """
+    Create one order with many lines. Every line is validated together and
+    the whole order is written in a single transaction; per-line stock
+    failures are shown next to the offending line.
+    """
+    if request.method == "POST":
+        formset = CheckoutFormSet(request.POST)
+        if formset.is_valid():
+            try:
+                sale_order = services.checkout(formset.lines())
+            except services.CheckoutError as exc:
+                line_forms = formset.line_forms()
+                for index, message in exc.errors.items():
+                    line_forms[index].add_error("quantity", message)
+                messages.error(request, "Some order lines could not be fulfilled.")
+            else:
+                routing.pin_to_primary(request)
+                messages.success(
+                    request,
+                    f"Sale Order #{sale_order.pk} created successfully!",
+                )
+                return redirect("list_sale_orders")
+        else:
+            messages.error(request, "Please correct the errors below.")
+    else:
+        formset = CheckoutFormSet()
 
-    if sale_order.status == "Pending":
-        sale_order.status = "Cancelled"
-        sale_order.save()
+    return render(
+        request, "core/checkout_sale_order.html", {"formset": formset}
+    )
 
-        # Restore stock if we deducted it already
-        sale_order.product.stock_quantity += sale_order.quantity
-        sale_order.product.save()
 
-        # Record stock movement
-        StockMovement.objects.create(
-            product=sale_order.product,
-            quantity=sale_order.quantity,
-            movement_type="In",
-            notes=f"Cancelled Sale Order #{sale_order.pk}",
-        )
+def cancel_sale_order(request, order_id):
+    sale_order = get_object_or_404(SaleOrder, pk=order_id)
 
+    if services.cancel_sale_order(sale_order):
+        routing.pin_to_primary(request)
         messages.success(request, f"Sale Order #{sale_order.pk} cancelled.")
     else:
         messages.warning(request, "Only 'Pending' orders can be cancelled.")
@@ -269,9 +357,8 @@ def cancel_sale_order(request, order_id):
 
 def complete_sale_order(request, order_id):
     sale_order = get_object_or_404(SaleOrder, pk=order_id)
-    if sale_order.status == "Pending":
-        sale_order.status = "Completed"
-        sale_order.save()
+    if services.complete_sale_order(sale_order):
+        routing.pin_to_primary(request)
         messages.success(request, f"Sale Order #{sale_order.pk} completed!")
     else:
         messages.warning(request, "Only 'Pending' orders can be completed.")
@@ -279,21 +366,17 @@ def complete_sale_order(request, order_id):
     return redirect("list_sale_orders")
 
 
+@routing.replica_reads
+@cache_page_versioned("saleorder", "product")
 def list_sale_orders(request):
     # Optional filter by status
     status_filter = request.GET.get("status", "All")
 
-    if status_filter == "All":
-        orders_list = SaleOrder.objects.select_related("product").all()
-    else:
-        orders_list = SaleOrder.objects.select_related("product").filter(
-            status=status_filter
-        )
-
-    # Paginate (10 orders per page, for example)
-    paginator = Paginator(orders_list, 10)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    # Paginate (10 orders per page), newest first
+    paginator = repository.sale_orders(
+        None if status_filter == "All" else status_filter, 10
+    )
+    page_obj = paginator.get_page(request.GET.get("cursor"))
 
     status_choices = ["All", "Pending", "Completed", "Cancelled"]
 
@@ -305,40 +388,101 @@ def list_sale_orders(request):
     return render(request, "core/list_sale_orders.html", context)
 
 
-def stock_level_check(request):
+@routing.replica_reads
+def export_sale_orders(request):
+    return _export(
+        request, "sale_orders", exporters.sale_order_rows, "status"
+    )
+
+
+def _export(request, basename, get_rows, list_filter):
     """
-    Displays a form to filter products by name, supplier, and/or minimum stock.
-    Shows a list of products that match the criteria, along with their current stock.
+    Stream an export as CSV or JSON lines. Accepts the list view's filters
+    (search or status) plus date_from/date_to.
     """
-    products = Product.objects.select_related("supplier").all()
+    form = LedgerExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text())
+
+    data = form.cleaned_data
+    header, rows = get_rows(
+        data[list_filter],
+        date_from=data["date_from"],
+        date_to=data["date_to"],
+    )
 
-    if request.method == "POST":
-        form = StockLevelFilterForm(request.POST)
+    encode, content_type = exporters.FORMATS[data["format"]]
+    response = StreamingHttpResponse(
+        encode(header, rows), content_type=content_type
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{basename}.{data["format"]}"'
+    )
+    return response
 
-        # Start with all products
 
-        if form.is_valid():
-            # Extract cleaned data
-            name = form.cleaned_data.get("name")
-            supplier = form.cleaned_data.get("supplier")
-            min_stock = form.cleaned_data.get("min_stock")
-
-            # Filter by name (case-insensitive partial match)
-            if name:
-                products = products.filter(name__icontains=name)
-
-            # Filter by supplier
-            if supplier:
-                products = products.filter(supplier=supplier)
-
-            # Filter by stock
-            if min_stock is not None:
-                products = products.filter(stock_quantity__gte=min_stock)
+# Products per page on the stock level check
+STOCK_LEVEL_PAGE_SIZE = 25
+STOCK_LEVEL_CACHE_TIMEOUT = 300
+# Tables the stock level check shows
+STOCK_LEVEL_VERSIONS = (
+    "product", "supplier", "categoryreorderdefault", "forecast", "location"
+)
+
+
+@routing.replica_reads
+def stock_level_check(request):
+    """
+    Filter products by name, supplier, stock range, reorder point, days of
+    cover and location. Filters come from the query string, so results can be
+    bookmarked and cached; the page is keyset-paginated by (stock_quantity,
+    id), lowest stock first, or by (days of cover, id) for ``sort=cover``.
+    With a location only that location's StockLevel rows are read. POSTed filters
+    are still accepted for old clients.
+    """
+    data = request.POST if request.method == "POST" else request.GET
+    filter_data = data.copy()
+    cursor = filter_data.pop("cursor", [None])[-1]
+    filter_data.pop("csrfmiddlewaretoken", None)
+    form = StockLevelFilterForm(filter_data or None)
+
+    if form.is_bound and not form.is_valid():
+        page_obj = None
     else:
-        form = StockLevelFilterForm()
+        filters = form.cache_key() if form.is_bound else ""
+        cache_key = "core:stock_level:{}:{}:{}".format(
+            routing.read_source(),
+            versioning.get_versions(*STOCK_LEVEL_VERSIONS),
+            hashlib.md5(f"{filters}|{cursor}".encode()).hexdigest(),
+        )
+        page_obj = cache.get(cache_key)
+        if page_obj is None:
+            page_obj = repository.stock_levels(
+                form.cleaned_data if form.is_bound else {}, STOCK_LEVEL_PAGE_SIZE
+            ).get_page(cursor)
+            if not routing.replica_may_lag(*STOCK_LEVEL_VERSIONS):
+                cache.set(cache_key, page_obj, STOCK_LEVEL_CACHE_TIMEOUT)
 
     context = {
         "form": form,
-        "products": products,
+        "page_obj": page_obj,
+        "products": page_obj or [],
+        "query": filter_data.urlencode(),
+        "no_demand_cover": forecasting.MAX_DAYS_OF_COVER,
     }
     return render(request, "core/stock_level_check.html", context)
+
+
+# ----- REORDER -----
+
+
+@routing.replica_reads
+@cache_page_versioned("reorderalert", "product", "supplier")
+def needs_reorder(request):
+    """
+    Products at or below reorder point + safety stock, oldest alert first.
+    Reads only the open ReorderAlert rows (see core/reorder.py).
+    """
+    paginator = CursorPaginator(reorder.needs_reorder(), 25, ordering=("id",))
+    page_obj = paginator.get_page(request.GET.get("cursor"))
+    return render(request, "core/needs_reorder.html", {"page_obj": page_obj})
@@ -2,6 +2,9 @@
 ASGI config for inventory_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests for the live stock event stream are answered by
+``core.events.stream_stock_events`` directly, so an open stream never ties up
+one of Django's sync worker threads; everything else goes to Django.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -13,4 +16,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.events import STREAM_PATH, stream_stock_events  # noqa: E402 (needs setup)
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == STREAM_PATH:
+        return await stream_stock_events(scope, receive, send)
+    return await django_application(scope, receive, send)
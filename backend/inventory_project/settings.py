@@ -42,15 +42,66 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it sees every query; inert unless SQL_INSTRUMENTATION is enabled
+    "core.middleware.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "core.routing.ReplicaRoutingMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Per-request SQL instrumentation: Server-Timing header plus a structured
+# log line (logger "core.sql") with query count, DB time, slowest statements
+# and likely N+1 patterns. Works without DEBUG.
+SQL_INSTRUMENTATION = {
+    "ENABLED": os.environ.get("SQL_INSTRUMENTATION") == "1",
+    "SLOW_QUERIES": 3,
+    "N_PLUS_ONE_THRESHOLD": 5,
+}
+
+# "default" holds small query caches; "pages" holds rendered list pages
+# (core/pagecache.py) and the version counters that key them and every other
+# cached result (core/versioning.py). Set PAGE_CACHE_BACKEND=file to keep
+# pages and counters on disk with LRU eviction, shared by every process on
+# the host; in a multi-host deployment point "pages" at memcached or redis.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "pages": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "pages",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+if os.environ.get("PAGE_CACHE_BACKEND") == "file":
+    CACHES["pages"] = {
+        "BACKEND": "core.cache_backends.LRUFileBasedCache",
+        "LOCATION": os.environ.get("PAGE_CACHE_DIR", BASE_DIR / "page_cache"),
+        "OPTIONS": {"MAX_ENTRIES": 5000, "CULL_FREQUENCY": 4},
+    }
+
+# Counters share the pages' backend, so they are exactly as shared as the pages.
+VERSIONS_CACHE_ALIAS = "pages"
+
+PAGE_CACHE = {
+    "ENABLED": os.environ.get("PAGE_CACHE", "1") == "1",
+    "ALIAS": "pages",
+    # Upper bound on staleness if a version bump is ever missed
+    "TIMEOUT": 300,
+}
+
+# Write-behind ingestion (core/stockqueue.py): with STOCK_QUEUE=1, 'In'
+# movements are queued and applied in batches by `manage.py drain_stock_queue`.
+STOCK_QUEUE = {
+    "ENABLED": os.environ.get("STOCK_QUEUE") == "1",
+    "BATCH_SIZE": 500,
+}
+
 ROOT_URLCONF = "inventory_project.urls"
 
 TEMPLATES = [
@@ -94,6 +145,28 @@ DATABASES = {
     	}
 }
 
+# Read replicas (core/routing.py): DB_REPLICAS is a comma-separated list of
+# SQLite files kept in sync with the primary. Read-only views read from one
+# of them; a browser that has just written reads from the primary instead.
+DB_REPLICAS = [path for path in os.environ.get("DB_REPLICAS", "").split(",") if path]
+for number, path in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f"replica{number}"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        # Tests read the replica through the test primary
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.routing.ReplicaRouter"]
+
+DATABASE_ROUTING = {
+    "REPLICAS": [f"replica{number}" for number in range(1, len(DB_REPLICAS) + 1)],
+    # Seconds a write pins the browser to the primary; None until it closes
+    "PIN_SECONDS": None,
+    # Replica reads are not cached this many seconds after a write
+    "MAX_LAG_SECONDS": 5,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators